@@ -0,0 +1,359 @@
+#!/usr/bin/python3
+#
+# Description:
+#   Benchmarks the MyPL toolchain. Each workload is lexed, parsed, type
+#   checked and run (by the interpreter, the VM and as generated Python)
+#   separately, and the time, throughput and peak memory of every phase
+#   is compared against a stored baseline.
+#----------------------------------------------------------------------
+import mypl_error as error
+import mypl_lexer as lexer
+import mypl_token as token
+import mypl_parser as parser
+import mypl_type_checker as type_checker
+import mypl_interpreter as interpreter
+import mypl_compiler as compiler
+import mypl_vm as vm
+import mypl_codegen as codegen
+import mypl_io
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'benchmarks')
+BASELINE = os.path.join(DIRECTORY, 'baseline.json')
+PHASES = ('lex', 'parse', 'typecheck', 'interpret', 'vm', 'python')
+# the phases that run the program
+RUN_PHASES = ('interpret', 'vm', 'python')
+# phases left out of a workload: the type checker rejects comparing an
+# int parameter with an int literal (e.g., n < 2), which every function
+# of recursion.mypl does, so it would only ever report that error
+SKIPPED = {'recursion': ('typecheck',)}
+# short phases are repeated until they have run for at least this long
+MIN_TIME = 0.1
+# slowdowns smaller than this (in seconds) are noise, not regressions
+NOISE = 0.001
+
+
+def generated_source(functions=200, stmts=20000):
+    """returns a large, deterministic MyPL program that exercises the
+    front end (and type checks cleanly)"""
+    lines = ['struct Pair', '    var left = 0;', '    var right = 0;', 'end']
+    for f in range(functions):
+        lines += ['fun int f%d(a: int, b: int)' % f,
+                  '    var t = %d * 2 + 1;' % (f % 13),
+                  '    var s = "f%d";' % f,
+                  '    return t;',
+                  'end']
+    lines += ['var total = 0;', 'var p = new Pair;', 'var name = "";']
+    for i in range(stmts):
+        kind = i % 5
+        if kind == 0:
+            lines.append('set total = total + %d * %d;' % (i % 97, i % 7))
+        elif kind == 1:
+            lines.append('set p.left = p.right + %d;' % (i % 31))
+        elif kind == 2:
+            lines.append('f%d(%d, %d);' % (i % functions, i, i % 11))
+        elif kind == 3:
+            lines += ['if total > %d then' % i,
+                      '    set total = total - %d;' % (i % 3),
+                      'elif total == %d then' % (i + 1),
+                      '    set name = "x%d";' % i,
+                      'end']
+        else:
+            lines += ['var v%d = %d.5;' % (i, i % 100),
+                      '# comment %d' % i]
+    lines.append('print(itos(total) + " " + itos(p.left) + "\\n");')
+    return '\n'.join(lines) + '\n'
+
+
+def workloads(names=None):
+    """returns [(name, source)] of the requested workloads"""
+    found = []
+    for filename in sorted(os.listdir(DIRECTORY)):
+        if filename.endswith('.mypl'):
+            found.append(filename[:-len('.mypl')])
+    found.append('generated')
+    result = []
+    for name in names or found:
+        if name == 'generated':
+            result.append((name, generated_source()))
+        elif name in found:
+            with open(os.path.join(DIRECTORY, name + '.mypl')) as f:
+                result.append((name, f.read()))
+        else:
+            # any other MyPL file
+            with open(name) as f:
+                result.append((os.path.basename(name), f.read()))
+    return result
+
+
+class TokenStream(object):
+    """Replays a list of tokens so the parser can be timed without the
+    lexer"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.index = 0
+
+    def next_token(self):
+        the_token = self.tokens[self.index]
+        if self.index < len(self.tokens) - 1:
+            self.index += 1
+        return the_token
+
+
+def lex(source):
+    the_lexer = lexer.Lexer(io.StringIO(source))
+    tokens = [the_lexer.next_token()]
+    while tokens[-1].tokentype != token.EOS:
+        tokens.append(the_lexer.next_token())
+    return tokens
+
+
+def parse(tokens):
+    return parser.Parser(TokenStream(tokens)).parse()
+
+
+def run(program, runner_class):
+    """runs a program, returning what it printed"""
+    sink = io.StringIO()
+    runner_class(output=mypl_io.Output(sink, line_buffered=False)).run(program)
+    return sink.getvalue()
+
+
+def phase_setup(phase, source, tokens):
+    """returns a function that performs one run of phase (anything it
+    needs is built here, outside of the measurement)"""
+    if phase == 'lex':
+        return lambda: lex(source)
+    elif phase == 'parse':
+        return lambda: parse(tokens)
+    tree = parse(tokens)
+    if phase == 'typecheck':
+        return lambda: tree.accept(type_checker.TypeChecker())
+    elif phase == 'interpret':
+        return lambda: run(tree, interpreter.Interpreter)
+    elif phase == 'vm':
+        return lambda: run(compiler.Compiler().compile(tree), vm.VM)
+    elif phase == 'python':
+        program = codegen.CodeGenerator().compile(tree)
+        program.code_object()
+        return lambda: run(program, codegen.Runner)
+
+
+def measure(phase, source, tokens, repeat, memory):
+    """returns {'time': best seconds, 'peak': peak bytes, 'output': str}
+    for one phase"""
+    result = {'time': None, 'peak': None, 'output': None}
+    best = None
+    runs = 0
+    spent = 0.0
+    while runs < repeat or (spent < MIN_TIME and runs < 1000):
+        fun = phase_setup(phase, source, tokens)
+        start = time.perf_counter()
+        value = fun()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        runs += 1
+        spent += elapsed
+    result['time'] = best
+    if phase in RUN_PHASES:
+        result['output'] = value
+    if memory:
+        fun = phase_setup(phase, source, tokens)
+        tracemalloc.start()
+        try:
+            fun()
+            result['peak'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def calibrate():
+    """returns the time of a fixed pure-Python loop, used to scale the
+    baseline to the speed of this machine"""
+    best = None
+    for i in range(5):
+        start = time.perf_counter()
+        table = {}
+        for j in range(1000000):
+            table[j % 1000] = table.get(j % 1000, 0) + j
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def throughput(phase, seconds, tokens):
+    """returns the front-end throughput of a phase in tokens/second"""
+    if phase in ('lex', 'parse', 'typecheck') and seconds:
+        return len(tokens) / seconds
+    return None
+
+
+def benchmark(names, phases, repeat, memory):
+    results = {}
+    for name, source in workloads(names):
+        tokens = lex(source)
+        results[name] = {}
+        for phase in phases:
+            if phase in SKIPPED.get(name, ()):
+                continue
+            try:
+                entry = measure(phase, source, tokens, repeat, memory)
+            except error.MyPLError as e:
+                results[name][phase] = {'error': str(e)}
+                continue
+            entry['throughput'] = throughput(phase, entry['time'], tokens)
+            results[name][phase] = entry
+        # all back ends must agree on what the program prints
+        run_phases = [p for p in phases if p in RUN_PHASES and
+                      p in results[name] and
+                      results[name][p].get('output') is not None]
+        for phase in run_phases[1:]:
+            if results[name][phase]['output'] != \
+               results[name][run_phases[0]]['output']:
+                results[name][phase] = {'error': 'output differs from %s'
+                                        % run_phases[0]}
+    return results
+
+
+def compare(entry, base, scale, tolerance):
+    """returns (time ratio, memory ratio, regressed) against a baseline
+    entry, where ratios above 1 are slower/larger"""
+    time_ratio = memory_ratio = None
+    regressed = False
+    if base.get('time') and entry.get('time'):
+        expected = base['time'] * scale
+        time_ratio = entry['time'] / expected
+        if time_ratio > 1 + tolerance and entry['time'] - expected > NOISE:
+            regressed = True
+    if base.get('peak') and entry.get('peak'):
+        memory_ratio = entry['peak'] / base['peak']
+        if memory_ratio > 1 + tolerance:
+            regressed = True
+    return time_ratio, memory_ratio, regressed
+
+
+def report(results, baseline, scale, tolerance):
+    """prints a table of the results; returns the number of regressions"""
+    regressions = 0
+    header = '%-12s %-10s %10s %14s %10s %8s %8s' % (
+        'workload', 'phase', 'time (ms)', 'tokens/s', 'peak (KB)',
+        'time x', 'mem x')
+    print(header)
+    print('-' * len(header))
+    for name in results:
+        for phase in results[name]:
+            entry = results[name][phase]
+            if 'error' in entry:
+                print('%-12s %-10s %s' % (name, phase, entry['error']))
+                continue
+            rate = '-'
+            if entry['throughput'] is not None:
+                rate = '%.0f' % entry['throughput']
+            peak = '-'
+            if entry['peak'] is not None:
+                peak = '%.0f' % (entry['peak'] / 1024)
+            time_x = mem_x = '-'
+            flag = ''
+            base = baseline.get(name, {}).get(phase)
+            if base:
+                time_ratio, memory_ratio, regressed = \
+                    compare(entry, base, scale, tolerance)
+                if time_ratio is not None:
+                    time_x = '%.2f' % time_ratio
+                if memory_ratio is not None:
+                    mem_x = '%.2f' % memory_ratio
+                if regressed:
+                    regressions += 1
+                    flag = '  REGRESSION'
+            print('%-12s %-10s %10.1f %14s %10s %8s %8s%s' % (
+                name, phase, entry['time'] * 1000, rate, peak, time_x,
+                mem_x, flag))
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, calibration):
+    saved = {'calibration': calibration, 'results': {}}
+    for name in results:
+        saved['results'][name] = {}
+        for phase, entry in results[name].items():
+            if 'error' not in entry:
+                saved['results'][name][phase] = {'time': entry['time'],
+                                                 'peak': entry['peak']}
+    with open(path, 'w') as f:
+        json.dump(saved, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Benchmark the MyPL lexer, parser, type checker, '
+        'interpreter and VM.')
+    arg_parser.add_argument('workloads', nargs='*',
+                            help='workload names (see benchmarks/) or '
+                            'MyPL files; default: all workloads')
+    arg_parser.add_argument('--phases', default=','.join(PHASES),
+                            help='comma separated phases to time '
+                            '(default: %(default)s)')
+    arg_parser.add_argument('--repeat', type=int, default=3,
+                            help='runs per phase; the best is reported')
+    arg_parser.add_argument('--no-memory', action='store_true',
+                            help='skip the (slower) peak memory runs')
+    arg_parser.add_argument('--baseline', default=BASELINE,
+                            help='baseline file (default: %(default)s)')
+    arg_parser.add_argument('--save-baseline', action='store_true',
+                            help='store these results as the baseline')
+    arg_parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='allowed slowdown or growth before a '
+                            'result counts as a regression')
+    arg_parser.add_argument('--check', action='store_true',
+                            help='exit with status 1 on any regression')
+    args = arg_parser.parse_args()
+    phases = [p for p in args.phases.split(',') if p]
+    for phase in phases:
+        if phase not in PHASES:
+            sys.exit('unknown phase %s' % phase)
+    sys.stdin = io.StringIO()       # workloads must not wait for input
+    calibration = calibrate()
+    results = benchmark(args.workloads, phases, args.repeat,
+                        not args.no_memory)
+    calibration = min(calibration, calibrate())
+    baseline = {}
+    scale = 1.0
+    stored = None if args.save_baseline else load_baseline(args.baseline)
+    if stored is not None:
+        baseline = stored['results']
+        scale = calibration / stored['calibration']
+    regressions = report(results, baseline, scale, args.tolerance)
+    if args.save_baseline:
+        save_baseline(args.baseline, results, calibration)
+        print('baseline saved to %s' % args.baseline)
+    elif stored is None:
+        print('no baseline at %s (use --save-baseline)' % args.baseline)
+    else:
+        print('%i regression(s) beyond %.0f%% of the baseline '
+              '(machine speed factor %.2f)' % (regressions,
+                                               args.tolerance * 100, scale))
+    if args.check and regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,39 +1,223 @@
-#!/usr/bin/python3
-#
-# Author: Thomas McDonald
-# Description:
-#   Simple scripts to execute the MyPL interpreter.
-#----------------------------------------------------------------------
-import mypl_error as error
-import mypl_lexer as lexer
-import mypl_token as token
-import mypl_parser as parser
-import mypl_ast as ast
-import mypl_type_checker as type_checker
-import mypl_interpreter as interpreter
-import sys
-
-def main(filename):
-    try:
-        file_stream = open(filename, 'r')
-        execute(file_stream)
-        file_stream.close()
-    except FileNotFoundError:
-        sys.exit('invalid filename %s' % filename)
-    except error.MyPLError as e:
-        file_stream.close()
-        sys.exit(e)
-        
-def execute(file_stream):
-    the_lexer = lexer.Lexer(file_stream)
-    the_parser = parser.Parser(the_lexer)
-    stmt_list = the_parser.parse()
-    the_type_checker = type_checker.TypeChecker()
-    #stmt_list.accept(the_type_checker)
-    the_interpreter = interpreter.Interpreter()
-    the_interpreter.run(stmt_list)
-
-if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        sys.exit('Usage: %s file' % sys.argv[0])
-    main(sys.argv[1])
\ No newline at end of file
+#!/usr/bin/python3
+#
+# Author: Thomas McDonald
+# Description:
+#   Simple scripts to execute the MyPL interpreter.
+#----------------------------------------------------------------------
+import mypl_error as error
+import mypl_lexer as lexer
+import mypl_token as token
+import mypl_parser as parser
+import mypl_ast as ast
+import mypl_type_checker as type_checker
+import mypl_interpreter as interpreter
+import mypl_compiler as compiler
+import mypl_vm as vm
+import mypl_codegen as codegen
+import mypl_cache as cache
+import mypl_profiler as profiler
+import mypl_memo
+import mypl_io
+import argparse
+import io
+import sys
+
+# the kind of cached artifact each back end runs
+KINDS = {'interpreter': 'ast', 'vm': 'bytecode', 'python': 'python'}
+
+def main(filename, backend='interpreter', heap_stats=False, use_cache=False,
+         output_file=None, input_file=None, profile=None,
+         profile_file=None, sample_interval=0.001,
+         max_depth=vm.DEFAULT_MAX_DEPTH, memo_size=mypl_memo.DEFAULT_SIZE,
+         memo_stats=False, programs=None):
+    output = the_input = None
+    if input_file is not None:
+        try:
+            the_input = mypl_io.Input(open(input_file, 'r'))
+        except OSError as e:
+            sys.exit('cannot read %s: %s' % (input_file, e.strerror))
+    if output_file is not None:
+        try:
+            output = mypl_io.Output(open(output_file, 'w'))
+        except OSError as e:
+            sys.exit('cannot write %s: %s' % (output_file, e.strerror))
+    try:
+        if programs is not None:
+            # compiled programs kept in memory (by mypl_server.py)
+            source, artifact = programs.load(filename, backend)
+        else:
+            with open(filename, 'r') as file_stream:
+                source = file_stream.read()
+            the_cache = cache.Cache() if use_cache else None
+            artifact = compile_source(source, backend, the_cache)
+        run(artifact, source, backend, heap_stats, output, the_input,
+            profile, profile_file, sample_interval, max_depth, memo_size,
+            memo_stats)
+    except FileNotFoundError:
+        sys.exit('invalid filename %s' % filename)
+    except error.MyPLError as e:
+        sys.exit(e)
+    finally:
+        if output is not None:
+            output.sink.close()
+        if the_input is not None:
+            the_input.source.close()
+
+def compile_source(source, backend='interpreter', the_cache=None):
+    """returns the parsed AST (or the program compiled for the VM or to
+    Python) of source, reusing a cached copy when there is one"""
+    kind = KINDS[backend]
+    if the_cache is not None:
+        artifact = the_cache.load(source, kind)
+        if artifact is not None:
+            return artifact
+    the_lexer = lexer.Lexer(io.StringIO(source))
+    the_parser = parser.Parser(the_lexer)
+    stmt_list = the_parser.parse()
+    the_type_checker = type_checker.TypeChecker()
+    #stmt_list.accept(the_type_checker)
+    artifact = stmt_list
+    if backend == 'vm':
+        artifact = compiler.Compiler().compile(stmt_list)
+    elif backend == 'python':
+        artifact = codegen.CodeGenerator().compile(stmt_list)
+        try:
+            artifact.code_object()
+        except (SyntaxError, RecursionError, MemoryError):
+            # nested too deeply for CPython's compiler; interpret it
+            artifact = stmt_list
+    if the_cache is not None:
+        the_cache.store(source, kind, artifact)
+    return artifact
+
+def execute(file_stream, backend='interpreter', heap_stats=False,
+            use_cache=False,
+            output=None, the_input=None, profile=None, profile_file=None,
+            sample_interval=0.001, max_depth=vm.DEFAULT_MAX_DEPTH,
+            memo_size=mypl_memo.DEFAULT_SIZE, memo_stats=False):
+    the_cache = cache.Cache() if use_cache else None
+    source = file_stream.read()
+    artifact = compile_source(source, backend, the_cache)
+    run(artifact, source, backend, heap_stats, output, the_input, profile,
+        profile_file, sample_interval, max_depth, memo_size, memo_stats)
+
+def run(artifact, source, backend='interpreter', heap_stats=False,
+        output=None, the_input=None, profile=None, profile_file=None,
+        sample_interval=0.001, max_depth=vm.DEFAULT_MAX_DEPTH,
+        memo_size=mypl_memo.DEFAULT_SIZE, memo_stats=False):
+    """runs a program compiled by compile_source() from source"""
+    if isinstance(artifact, codegen.Program):
+        the_interpreter = codegen.Runner(output=output, input=the_input,
+                                         memo_size=memo_size)
+    elif backend == 'vm':
+        the_interpreter = vm.VM(output=output, input=the_input,
+                                max_depth=max_depth, memo_size=memo_size)
+    elif profile == 'calls':
+        the_interpreter = profiler.ProfilingInterpreter(output=output,
+                                                        input=the_input,
+                                                        memo_size=memo_size)
+    else:
+        the_interpreter = interpreter.Interpreter(output=output,
+                                                  input=the_input,
+                                                  memo_size=memo_size)
+    sampler = None
+    if profile == 'sample':
+        sampler = profiler.Sampler(interval=sample_interval)
+        sampler.start()
+    try:
+        the_interpreter.run(artifact)
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if profile is not None:
+            write_profile(the_interpreter, sampler, source, profile_file)
+    if heap_stats:
+        the_interpreter.heap.collect()
+        print(the_interpreter.heap, file=sys.stderr)
+    if memo_stats:
+        for memo in the_interpreter.memos:
+            print(memo, file=sys.stderr)
+
+def write_profile(the_interpreter, sampler, source, profile_file=None):
+    """writes the statistics (or folded stacks) of a profiled run to
+    profile_file, or to stderr"""
+    stream = sys.stderr
+    if profile_file is not None:
+        try:
+            stream = open(profile_file, 'w')
+        except OSError as e:
+            print('cannot write %s: %s' % (profile_file, e.strerror),
+                  file=sys.stderr)
+            return
+    try:
+        if sampler is not None:
+            sampler.write_folded(stream)
+        else:
+            the_interpreter.report(stream, source.splitlines())
+    finally:
+        if stream is not sys.stderr:
+            stream.close()
+
+def cli(argv=None, programs=None, prog=None):
+    """runs the program named by the command line arguments argv (by
+    default sys.argv[1:]); exits on errors"""
+    arg_parser = argparse.ArgumentParser(prog=prog,
+                                         description='Run a MyPL program.')
+    arg_parser.add_argument('file', help='the MyPL source file')
+    arg_parser.add_argument('--vm', action='store_const', const='vm',
+                            dest='backend', default='interpreter',
+                            help='compile to bytecode and run it on the VM')
+    arg_parser.add_argument('--python', action='store_const',
+                            const='python', dest='backend',
+                            help='translate the program to Python and run '
+                            'the compiled result')
+    arg_parser.add_argument('--heap-stats', action='store_true',
+                            help='report struct heap statistics on exit')
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help='always lex and parse the source instead '
+                            'of using the artifact cache (or, when run by '
+                            'mypl_server.py, its compiled programs)')
+    arg_parser.add_argument('-o', '--output', metavar='FILE',
+                            help='write the program\'s output to FILE')
+    arg_parser.add_argument('-i', '--input', metavar='FILE',
+                            help='read the program\'s input from FILE')
+    arg_parser.add_argument('--profile', action='store_const',
+                            const='calls', help='report calls and time '
+                            'per function and statements run per line')
+    arg_parser.add_argument('--sample', action='store_const',
+                            const='sample', dest='profile',
+                            help='sample the call stack on a CPU timer and '
+                            'write folded stacks (for flame graphs)')
+    arg_parser.add_argument('--profile-file', metavar='FILE',
+                            help='write the profile to FILE instead of '
+                            'stderr')
+    arg_parser.add_argument('--sample-interval', type=float, default=1.0,
+                            metavar='MS', help='CPU time between samples '
+                            '(default: %(default)s ms)')
+    arg_parser.add_argument('--max-depth', type=int,
+                            default=vm.DEFAULT_MAX_DEPTH, metavar='N',
+                            help='most nested calls allowed on the VM '
+                            '(default: %(default)s)')
+    arg_parser.add_argument('--memo-size', type=int,
+                            default=mypl_memo.DEFAULT_SIZE, metavar='N',
+                            help='results cached per pure function, 0 to '
+                            'turn memoizing off (default: %(default)s)')
+    arg_parser.add_argument('--memo-stats', action='store_true',
+                            help='report hits and misses of memoized '
+                            'functions on exit')
+    args = arg_parser.parse_args(argv)
+    if args.profile == 'calls' and args.backend != 'interpreter':
+        arg_parser.error('--profile runs on the interpreter; use --sample '
+                         'with --%s' % args.backend)
+    if args.heap_stats and args.backend == 'python':
+        arg_parser.error('--heap-stats needs the interpreter or --vm (the '
+                         'Python back end uses Python objects for structs)')
+    if args.no_cache:
+        programs = None
+    main(args.file, args.backend, args.heap_stats, not args.no_cache,
+         args.output, args.input, args.profile, args.profile_file,
+         args.sample_interval / 1000, args.max_depth, args.memo_size,
+         args.memo_stats, programs)
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,61 @@
+import array
+import mypl_token as token
+
+# the array.array type code holding each element type: 64 bit signed
+# ints and doubles, stored contiguously
+TYPECODES = {token.INTTYPE: 'q', token.FLOATTYPE: 'd'}
+
+# the element type of each array type, and the other way round
+ELEMENT_TYPES = {token.INTARRAYTYPE: token.INTTYPE,
+                 token.FLOATARRAYTYPE: token.FLOATTYPE}
+ARRAY_TYPES = {token.INTTYPE: token.INTARRAYTYPE,
+               token.FLOATTYPE: token.FLOATARRAYTYPE}
+
+
+class ArrayError(Exception):
+    """Raised when an array is created or indexed wrongly; the caller
+    reports it at the line and column of the expression."""
+
+
+def new(elem_type, length):
+    """returns an array of length zeros of the element type"""
+    if length is None:
+        raise ArrayError('nil array length')
+    if length < 0:
+        raise ArrayError('negative array length')
+    return array.array(TYPECODES[elem_type], bytes(8 * length))
+
+def load(a, index):
+    """returns a[index]"""
+    if a is None:
+        raise ArrayError('nil array')
+    if index is None or not 0 <= index < len(a):
+        raise ArrayError('array index out of range')
+    return a[index]
+
+def store(a, index, value):
+    """sets a[index] to value"""
+    if a is None:
+        raise ArrayError('nil array')
+    if index is None or not 0 <= index < len(a):
+        raise ArrayError('array index out of range')
+    try:
+        a[index] = value
+    except TypeError:
+        raise ArrayError('bad value for an array element')
+    except OverflowError:
+        raise ArrayError('int out of range for an int array')
+
+def from_values(elem_type, values):
+    """returns an array of the element type holding the values (an
+    iterable)"""
+    try:
+        return array.array(TYPECODES[elem_type], values)
+    except TypeError:
+        raise ArrayError('bad value for an array element')
+    except OverflowError:
+        raise ArrayError('int out of range for an int array')
+
+def element_type(a):
+    """returns the element type of the array a"""
+    return token.INTTYPE if a.typecode == 'q' else token.FLOATTYPE
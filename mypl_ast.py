@@ -12,6 +12,8 @@ class StmtList(ASTNode):
     """A statement list consists of a list of statements."""
     def __init__(self):
         self.stmts = []         # list of Stmt
+        self.frame_size = 0     # slots declared in the block (resolver)
+        self.returns = False    # a return may end the block (resolver)
     def accept(self, visitor):
         visitor.visit_stmt_list(self)
 
@@ -34,6 +36,7 @@ class VarDeclStmt(Stmt):
         self.var_id = None      # Token (ID)
         self.var_type = None    # Token (STRINGTYPE, ..., ID)
         self.var_expr = None    # Expr node
+        self.slot = None        # frame slot of the variable (resolver)
     def accept(self, visitor):
         visitor.visit_var_decl_stmt(self)
 
@@ -53,6 +56,7 @@ class StructDeclStmt(Stmt):
     def __init__(self):
         self.struct_id = None   # Token (id)
         self.var_decls = []     # [VarDeclStmt]
+        self.slot = None        # global slot of the struct (resolver)
     def accept(self, visitor):
         visitor.visit_struct_decl_stmt(self)
 
@@ -66,6 +70,9 @@ class FunDeclStmt(Stmt):
         self.params = []              # List of FunParam
         self.return_type = None       # Token
         self.stmt_list = StmtList()   # StmtList
+        self.slot = None              # global slot of the fun (resolver)
+        self.frame_size = 0           # params + body variables (resolver)
+        self.memoize = False          # pure, primitive types (mypl_memo)
     def accept(self, visitor):
         visitor.visit_fun_decl_stmt(self)
 
@@ -140,10 +147,15 @@ class BoolExpr(ASTNode):
         visitor.visit_bool_expr(self)
 
 class LValue(ASTNode):
-    """A lvalue consist of a simple id or a path expression.
+    """A lvalue consist of a simple id or a path expression, possibly
+    followed by an array index.
     """
     def __init__(self):
         self.path = []          # [Token (ID)] ... one implies simple var
+        self.depth = None       # frames between use and declaration
+        self.slot = None        # frame slot of path[0] (resolver)
+        self.field_slots = []   # (StructLayout, slot) cache per field
+        self.index = None       # Expr, if an element of the array is set
     def accept(self, visitor):
         visitor.visit_lvalue(self)
 
@@ -173,6 +185,7 @@ class SimpleRValue(RValue):
     """
     def __init__(self):
         self.val = None   # Token
+        self.value = None # decoded value of val (optimizer)
     def accept(self, visitor):
         visitor.visit_simple_rvalue(self)
 
@@ -181,8 +194,28 @@ class NewRValue(RValue):
     """
     def __init__(self):
         self.struct_type = None # Token (id)
+        self.depth = None       # frames between use and declaration
+        self.slot = None        # frame slot of the struct (resolver)
     def accept(self, visitor):
         visitor.visit_new_rvalue(self)
+
+class NewArrayRValue(RValue):
+    """A new array rvalue consists of an element type (int or float) and
+    an expression for the number of elements
+    """
+    def __init__(self):
+        self.elem_type = None   # Token (INTTYPE or FLOATTYPE)
+        self.length = None      # Expr
+    def accept(self, visitor):
+        visitor.visit_new_array_rvalue(self)
+
+class NewMapRValue(RValue):
+    """A new map rvalue consists of the map type (an empty map)
+    """
+    def __init__(self):
+        self.map_type = None    # MapType token
+    def accept(self, visitor):
+        visitor.visit_new_map_rvalue(self)
         
 class CallRValue(RValue):
     """A function call rvalue consists of a function name (id) and a list
@@ -191,14 +224,23 @@ class CallRValue(RValue):
     def __init__(self):
         self.fun = None         # Token (id)
         self.args = []          # list of Expr
+        self.depth = None       # frames between use and declaration
+        self.slot = None        # frame slot of the fun (resolver)
+        self.built_in = None    # BuiltIn called, if any (resolver)
+        self.tail_call = False  # self-call in tail position (optimizer)
     def accept(self, visitor):
         visitor.visit_call_rvalue(self)
 
 class IDRvalue(RValue):
-    """An identifier rvalue consists of a path of one or more identifiers.
+    """An identifier rvalue consists of a path of one or more identifiers,
+    possibly followed by an array index.
     """
     def __init__(self):
         self.path = []          # List of Token (id)
+        self.depth = None       # frames between use and declaration
+        self.slot = None        # frame slot of path[0] (resolver)
+        self.field_slots = []   # (StructLayout, slot) cache per field
+        self.index = None       # Expr, if an element of the array is read
     def accept(self, visitor):
         visitor.visit_id_rvalue(self)
 
@@ -221,5 +263,7 @@ class Visitor(object):
     def visit_fun_param(self, fun_param): pass
     def visit_simple_rvalue(self, simple_rvalue): pass
     def visit_new_rvalue(self, new_rvalue): pass
+    def visit_new_array_rvalue(self, new_array_rvalue): pass
+    def visit_new_map_rvalue(self, new_map_rvalue): pass
     def visit_call_rvalue(self, call_rvalue): pass
     def visit_id_rvalue(self, id_rvalue): pass
\ No newline at end of file
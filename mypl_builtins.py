@@ -0,0 +1,365 @@
+import operator
+import mypl_token as token
+import mypl_rope
+import mypl_array
+
+
+# array parameters (of either element type)
+ARRAYS = (token.INTARRAYTYPE, token.FLOATARRAYTYPE)
+
+# types that depend on the first argument of a call: the element type
+# of an array, its own type, and the key and value types of a map
+ELEMENT = 'ELEMENT'
+ARGUMENT = 'ARGUMENT'
+KEY = 'KEY'
+VALUE = 'VALUE'
+
+
+class BuiltInError(Exception):
+    """Raised by a built-in function to report a MyPL error; the caller
+    reports it at the line and column of the call."""
+
+
+class BuiltIn(object):
+    """A built-in function: a Python callable plus the metadata used to
+    check calls to it. Types are token types (INTTYPE, FLOATTYPE,
+    BOOLTYPE, STRINGTYPE, INTARRAYTYPE, FLOATARRAYTYPE, MAPTYPE, or NIL
+    for a function without a result). A parameter may instead accept a
+    tuple of types, and ELEMENT, ARGUMENT, KEY and VALUE stand for the
+    types given by the first argument of a call.
+
+    A runtime built-in is also passed the interpreter (or VM) running
+    the program as its first argument, for its input and output
+    channels. A pure built-in's result depends only on its arguments and
+    calling it has no other effect, so calls of MyPL functions that use
+    it may be memoized. String arguments are passed as Python strings,
+    unless the built-in takes ropes (see mypl_rope) as they are.
+
+    A function the program declares takes the place of a built-in of
+    the same name, unless the built-in is reserved (one of the
+    language's original built-ins, which always shadowed functions).
+    """
+    __slots__ = ('name', 'function', 'param_types', 'return_type',
+                 'check_nil', 'runtime', 'pure', 'string_params',
+                 'reserved')
+
+    def __init__(self, name, function, param_types, return_type,
+                 check_nil=True, runtime=False, pure=False, ropes=False,
+                 reserved=False):
+        self.name = name
+        self.function = function            # called with the argument values
+        self.param_types = tuple(param_types)
+        self.return_type = return_type
+        self.check_nil = check_nil          # reject nil arguments
+        self.runtime = runtime              # pass the interpreter first
+        self.pure = pure                    # no effects (memoizable)
+        self.reserved = reserved            # not replaced by functions
+        # the arguments to turn from ropes into strings before a call
+        self.string_params = ()
+        if not ropes:
+            self.string_params = mypl_rope.string_params(self.param_types)
+
+    def arity(self):
+        return len(self.param_types)
+
+
+class Registry(object):
+    """The built-in functions visible to MyPL programs, by name.
+
+    Call sites are bound to a BuiltIn once (when the program is resolved
+    or compiled), so a registry should be complete before a program that
+    uses it starts running.
+    """
+
+    def __init__(self, built_ins=()):
+        self.built_ins = {}         # name -> BuiltIn
+        for built_in in built_ins:
+            self.built_ins[built_in.name] = built_in
+
+    def register(self, name, function, param_types, return_type,
+                 check_nil=True, runtime=False, pure=False, ropes=False,
+                 reserved=False):
+        """adds (or replaces) the built-in name and returns it"""
+        built_in = BuiltIn(name, function, param_types, return_type,
+                           check_nil, runtime, pure, ropes, reserved)
+        self.built_ins[name] = built_in
+        return built_in
+
+    def lookup(self, name, functions=()):
+        """returns the BuiltIn a call of name runs, or None; functions
+        holds the names of the functions the program declares, which
+        take precedence over built-ins that are not reserved"""
+        built_in = self.built_ins.get(name)
+        if built_in is not None and not built_in.reserved and \
+           name in functions:
+            return None
+        return built_in
+
+    def copy(self):
+        return Registry(self.built_ins.values())
+
+    def __contains__(self, name):
+        return name in self.built_ins
+
+    def __iter__(self):
+        return iter(self.built_ins.values())
+
+
+# the standard built-in functions
+
+def mypl_print(runtime, s):
+    # escapes in string literals are decoded by the lexer
+    runtime.output.write(s)
+
+def flush(runtime):
+    runtime.output.flush()
+
+def length(s):
+    return len(s)
+
+def get(index, s):
+    if 0 <= index < len(s):
+        return s[index]
+    raise BuiltInError('Out of range Error')
+
+# reading flushes the output first, so prompts appear before the input;
+# every read returns nil once the input is exhausted
+
+def parse_int(s):
+    if s is None:
+        return None
+    try:
+        return int(s)
+    except ValueError:
+        raise BuiltInError('bad int value')
+
+def parse_float(s):
+    if s is None:
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        raise BuiltInError('bad float value')
+
+def reads(runtime):
+    runtime.output.flush()
+    return runtime.input.readline()
+
+def readi(runtime):
+    runtime.output.flush()
+    return parse_int(runtime.input.readline())
+
+def readf(runtime):
+    runtime.output.flush()
+    return parse_float(runtime.input.readline())
+
+def readword(runtime):
+    runtime.output.flush()
+    return runtime.input.readfield()
+
+def readint(runtime):
+    runtime.output.flush()
+    return parse_int(runtime.input.readfield())
+
+def readfloat(runtime):
+    runtime.output.flush()
+    return parse_float(runtime.input.readfield())
+
+def eof(runtime):
+    runtime.output.flush()
+    return runtime.input.eof()
+
+def field(runtime, index, s):
+    fields = runtime.input.split(s)
+    if 0 <= index < len(fields):
+        return fields[index]
+    return None
+
+def fields(runtime, s):
+    return len(runtime.input.split(s))
+
+# arrays; element-wise operations make a new array of the same type
+
+def array_sum(a):
+    return sum(a)
+
+def array_min(a):
+    if not a:
+        raise BuiltInError('empty array')
+    return min(a)
+
+def array_max(a):
+    if not a:
+        raise BuiltInError('empty array')
+    return max(a)
+
+def fill(a, x):
+    # in place, without a Python loop
+    try:
+        value = mypl_array.from_values(mypl_array.element_type(a), [x])
+    except mypl_array.ArrayError as e:
+        raise BuiltInError(str(e))
+    a[:] = value * len(a)
+
+def copy(a):
+    return a[:]
+
+def array_slice(a, start, end):
+    if not 0 <= start <= end <= len(a):
+        raise BuiltInError('slice out of range')
+    return a[start:end]
+
+def element_wise(op):
+    def apply(a, b):
+        if len(a) != len(b):
+            raise BuiltInError('arrays of different lengths')
+        try:
+            return mypl_array.from_values(mypl_array.element_type(a),
+                                          map(op, a, b))
+        except mypl_array.ArrayError as e:
+            raise BuiltInError(str(e))
+        except ZeroDivisionError:
+            raise BuiltInError('division by zero')
+    return apply
+
+def array_divide(lhs, rhs):
+    # ints divide as with /
+    if lhs.__class__ is int:
+        return lhs // rhs
+    return lhs / rhs
+
+def read_array(runtime, elem_type, count):
+    runtime.output.flush()
+    if count < 0:
+        raise BuiltInError('negative array length')
+    parse = parse_int if elem_type == token.INTTYPE else parse_float
+    try:
+        return mypl_array.from_values(
+            elem_type, map(parse, runtime.input.readfields(count)))
+    except mypl_array.ArrayError as e:
+        raise BuiltInError(str(e))
+
+def readints(runtime, count):
+    return read_array(runtime, token.INTTYPE, count)
+
+def readfloats(runtime, count):
+    return read_array(runtime, token.FLOATTYPE, count)
+
+# maps are Python dicts from ints or strings to values
+
+def map_key(key):
+    # keys are checked, as bools and floats would match equal ints
+    if key.__class__ is int or key.__class__ is str:
+        return key
+    if key.__class__ is mypl_rope.Rope:
+        return str(key)
+    raise BuiltInError('map keys must be ints or strings')
+
+def put(m, key, value):
+    m[map_key(key)] = value
+
+def lookup(m, key):
+    # nil if the key is not in the map
+    return m.get(map_key(key))
+
+def contains(m, key):
+    return map_key(key) in m
+
+def remove(m, key):
+    m.pop(map_key(key), None)
+
+def size(m):
+    return len(m)
+
+def itof(i):
+    return float(i)
+
+def stof(s):
+    try:
+        return float(s)
+    except ValueError:
+        raise BuiltInError('bad float value')
+
+def itos(i):
+    return str(i)
+
+def ftos(f):
+    return str(f)
+
+def stoi(s):
+    try:
+        return int(s)
+    except ValueError:
+        raise BuiltInError('bad int value')
+
+
+STANDARD = (
+    BuiltIn('print', mypl_print, [token.STRINGTYPE], token.NIL,
+            runtime=True, reserved=True),
+    BuiltIn('flush', flush, [], token.NIL, runtime=True),
+    BuiltIn('length', length, [(token.STRINGTYPE,) + ARRAYS], token.INTTYPE,
+            pure=True, ropes=True, reserved=True),
+    BuiltIn('get', get, [token.INTTYPE, token.STRINGTYPE], token.STRINGTYPE,
+            pure=True, reserved=True),
+    BuiltIn('reads', reads, [], token.STRINGTYPE, runtime=True,
+            reserved=True),
+    BuiltIn('readi', readi, [], token.INTTYPE, runtime=True, reserved=True),
+    BuiltIn('readf', readf, [], token.FLOATTYPE, runtime=True,
+            reserved=True),
+    BuiltIn('readword', readword, [], token.STRINGTYPE, runtime=True),
+    BuiltIn('readint', readint, [], token.INTTYPE, runtime=True),
+    BuiltIn('readfloat', readfloat, [], token.FLOATTYPE, runtime=True),
+    BuiltIn('eof', eof, [], token.BOOLTYPE, runtime=True),
+    BuiltIn('field', field, [token.INTTYPE, token.STRINGTYPE],
+            token.STRINGTYPE, runtime=True, pure=True),
+    BuiltIn('fields', fields, [token.STRINGTYPE], token.INTTYPE,
+            runtime=True, pure=True),
+    BuiltIn('itof', itof, [token.INTTYPE], token.FLOATTYPE, pure=True,
+            reserved=True),
+    BuiltIn('stof', stof, [token.STRINGTYPE], token.FLOATTYPE, pure=True,
+            reserved=True),
+    BuiltIn('itos', itos, [token.INTTYPE], token.STRINGTYPE, pure=True,
+            reserved=True),
+    BuiltIn('ftos', ftos, [token.FLOATTYPE], token.STRINGTYPE, pure=True,
+            reserved=True),
+    BuiltIn('stoi', stoi, [token.STRINGTYPE], token.INTTYPE, pure=True,
+            reserved=True),
+    BuiltIn('sum', array_sum, [ARRAYS], ELEMENT, pure=True),
+    BuiltIn('min', array_min, [ARRAYS], ELEMENT, pure=True),
+    BuiltIn('max', array_max, [ARRAYS], ELEMENT, pure=True),
+    BuiltIn('fill', fill, [ARRAYS, ELEMENT], token.NIL),
+    BuiltIn('copy', copy, [ARRAYS], ARGUMENT, pure=True),
+    BuiltIn('slice', array_slice, [ARRAYS, token.INTTYPE, token.INTTYPE],
+            ARGUMENT, pure=True),
+    BuiltIn('vadd', element_wise(operator.add), [ARRAYS, ARGUMENT], ARGUMENT,
+            pure=True),
+    BuiltIn('vsub', element_wise(operator.sub), [ARRAYS, ARGUMENT], ARGUMENT,
+            pure=True),
+    BuiltIn('vmul', element_wise(operator.mul), [ARRAYS, ARGUMENT], ARGUMENT,
+            pure=True),
+    BuiltIn('vdiv', element_wise(array_divide), [ARRAYS, ARGUMENT], ARGUMENT,
+            pure=True),
+    BuiltIn('readints', readints, [token.INTTYPE], token.INTARRAYTYPE,
+            runtime=True),
+    BuiltIn('readfloats', readfloats, [token.INTTYPE], token.FLOATARRAYTYPE,
+            runtime=True),
+    BuiltIn('put', put, [token.MAPTYPE, KEY, VALUE], token.NIL, ropes=True),
+    BuiltIn('lookup', lookup, [token.MAPTYPE, KEY], VALUE, pure=True,
+            ropes=True),
+    BuiltIn('contains', contains, [token.MAPTYPE, KEY], token.BOOLTYPE,
+            pure=True, ropes=True),
+    BuiltIn('remove', remove, [token.MAPTYPE, KEY], token.NIL, ropes=True),
+    BuiltIn('size', size, [token.MAPTYPE], token.INTTYPE, pure=True),
+)
+
+# the registry used when none is given; host applications can add
+# native functions to it with register()
+default = Registry(STANDARD)
+
+def register(name, function, param_types, return_type, check_nil=True,
+             runtime=False, pure=False, ropes=False):
+    """adds a native Python function to the default registry, e.g.
+    register('sqrt', math.sqrt, [token.FLOATTYPE], token.FLOATTYPE,
+    pure=True)"""
+    return default.register(name, function, param_types, return_type,
+                            check_nil, runtime, pure, ropes)
@@ -0,0 +1,171 @@
+"""Instruction set and code objects for the MyPL bytecode compiler and
+virtual machine. Every instruction is two words long (an opcode and an
+integer argument) and is stored in a flat list, so the VM can fetch the
+next instruction with two list indexes and no decoding.
+"""
+
+import mypl_token as token
+
+# stack and variable access
+LOAD_CONST = 0          # push consts[arg]
+LOAD_LOCAL = 1          # push locals[arg]
+STORE_LOCAL = 2         # locals[arg] = pop
+LOAD_GLOBAL = 3         # push globals[arg]
+STORE_GLOBAL = 4        # globals[arg] = pop
+LOAD_FIELD = 5          # push field names[arg] of pop
+STORE_FIELD = 6         # obj = pop, set field names[arg] of obj to pop
+POP = 7                 # discard top of stack
+
+# arithmetic
+ADD = 10
+SUB = 11
+MUL = 12
+DIV = 13
+MOD = 14
+
+# relational and boolean operators
+EQ = 20
+NE = 21
+LT = 22
+LE = 23
+GT = 24
+GE = 25
+NOT = 28
+
+# control flow
+JUMP = 30               # pc = arg
+JUMP_IF_FALSE = 31      # if not pop: pc = arg
+JUMP_IF_FALSE_OR_POP = 41   # if not top: pc = arg, else pop (and)
+JUMP_IF_TRUE_OR_POP = 42    # if top: pc = arg, else pop (or)
+CALL = 32               # call functions[arg]
+CALL_BUILTIN = 33       # call built-in: consts[arg] = (index, argc, pos)
+RETURN = 34             # return pop to the caller
+NEW = 35                # push a new instance of structs[arg]
+MAKE_STRUCT = 36        # build structs[arg] from its computed fields
+
+# arrays (see mypl_array)
+NEW_ARRAY = 37          # push a new array of pop zeros (arg 0: int, 1: float)
+LOAD_INDEX = 38         # index = pop, push element index of pop
+STORE_INDEX = 39        # index = pop, array = pop, set element to pop
+
+# maps
+NEW_MAP = 40            # push a new empty map
+
+# the element types of NEW_ARRAY's argument
+ARRAY_ELEMENT_TYPES = (token.INTTYPE, token.FLOATTYPE)
+
+OPNAMES = {
+    LOAD_CONST: 'LOAD_CONST', LOAD_LOCAL: 'LOAD_LOCAL',
+    STORE_LOCAL: 'STORE_LOCAL', LOAD_GLOBAL: 'LOAD_GLOBAL',
+    STORE_GLOBAL: 'STORE_GLOBAL', LOAD_FIELD: 'LOAD_FIELD',
+    STORE_FIELD: 'STORE_FIELD', POP: 'POP',
+    ADD: 'ADD', SUB: 'SUB', MUL: 'MUL', DIV: 'DIV', MOD: 'MOD',
+    EQ: 'EQ', NE: 'NE', LT: 'LT', LE: 'LE', GT: 'GT', GE: 'GE',
+    NOT: 'NOT',
+    JUMP: 'JUMP', JUMP_IF_FALSE: 'JUMP_IF_FALSE',
+    JUMP_IF_FALSE_OR_POP: 'JUMP_IF_FALSE_OR_POP',
+    JUMP_IF_TRUE_OR_POP: 'JUMP_IF_TRUE_OR_POP', CALL: 'CALL',
+    CALL_BUILTIN: 'CALL_BUILTIN', RETURN: 'RETURN', NEW: 'NEW',
+    MAKE_STRUCT: 'MAKE_STRUCT', NEW_ARRAY: 'NEW_ARRAY',
+    LOAD_INDEX: 'LOAD_INDEX', STORE_INDEX: 'STORE_INDEX', NEW_MAP: 'NEW_MAP',
+}
+
+
+class Code(object):
+    """A compiled unit of MyPL code (the main program, a function body,
+    or a struct initializer). Parameters occupy the first local slots.
+    """
+    def __init__(self, name, nparams=0):
+        self.name = name
+        self.ops = []           # [opcode, arg, opcode, arg, ...]
+        self.consts = []        # constant pool
+        self.names = []         # field names used by LOAD/STORE_FIELD
+        self.field_slots = []   # (StructLayout, slot) cache per name
+        self.positions = []     # (line, column) of each instruction
+        self.nparams = nparams
+        self.nlocals = nparams
+        self.returns_nil = False    # nil functions discard return values
+        self.memoize = False        # results may be cached (mypl_memo)
+        self.__const_index = {}
+        self.__name_index = {}
+
+    def emit(self, opcode, arg=0, position=(0, 0)):
+        """appends an instruction and returns its address"""
+        address = len(self.ops)
+        self.ops.append(opcode)
+        self.ops.append(arg)
+        self.positions.append(position)
+        return address
+
+    def patch(self, address, arg):
+        """sets the argument of the instruction at address"""
+        self.ops[address + 1] = arg
+
+    def here(self):
+        """returns the address of the next instruction"""
+        return len(self.ops)
+
+    def add_const(self, value):
+        # key on the type too, otherwise True, 1 and 1.0 would be merged,
+        # and on a float's repr, otherwise 0.0 and -0.0 would be
+        key = (type(value), repr(value) if type(value) is float else value)
+        if key not in self.__const_index:
+            self.__const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return self.__const_index[key]
+
+    def add_name(self, name):
+        if name not in self.__name_index:
+            self.__name_index[name] = len(self.names)
+            self.names.append(name)
+            self.field_slots.append((None, 0))
+        return self.__name_index[name]
+
+    def position(self, address):
+        """returns the (line, column) of the instruction at address"""
+        return self.positions[address // 2]
+
+    def __str__(self):
+        s = '%s (params=%i, locals=%i)\n' % (self.name, self.nparams,
+                                             self.nlocals)
+        for address in range(0, len(self.ops), 2):
+            opcode = self.ops[address]
+            arg = self.ops[address + 1]
+            s += '  %4i %-14s %i' % (address, OPNAMES[opcode], arg)
+            if opcode in (LOAD_CONST, CALL_BUILTIN):
+                s += ' (' + repr(self.consts[arg]) + ')'
+            elif opcode in (LOAD_FIELD, STORE_FIELD):
+                s += ' (' + self.names[arg] + ')'
+            s += '\n'
+        return s
+
+
+class StructInfo(object):
+    """A compiled struct declaration: its field names (in declaration
+    order), a prototype instance holding the fields with literal
+    initializers, and the code that evaluates the other initializers.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.fields = []        # [field name]
+        self.prototype = []     # [value], copied by every NEW
+        self.computed = ()      # field indexes set by init, in order
+        self.init = None        # Code ending in MAKE_STRUCT, or None
+
+
+class Program(object):
+    """A compiled MyPL program."""
+    def __init__(self):
+        self.main = None        # Code for the top-level statements
+        self.functions = []     # [Code]
+        self.structs = []       # [StructInfo]
+        self.built_ins = []     # [name] of the built-ins called
+
+    def __str__(self):
+        s = str(self.main)
+        for fun in self.functions:
+            s += str(fun)
+        for struct in self.structs:
+            if struct.init is not None:
+                s += str(struct.init)
+        return s
@@ -0,0 +1,168 @@
+import gc
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+MAGIC = 'mypl-cache'
+
+# modules whose output is cached; editing any of them changes VERSION
+TOOLCHAIN = ('mypl_token', 'mypl_lexer', 'mypl_ast', 'mypl_parser',
+             'mypl_bytecode', 'mypl_compiler', 'mypl_optimizer',
+             'mypl_builtins', 'mypl_codegen', 'mypl_memo', 'mypl_array')
+
+def toolchain_version():
+    """returns a digest of the sources of the toolchain modules"""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in TOOLCHAIN:
+        with open(os.path.join(directory, name + '.py'), 'rb') as f:
+            digest.update(f.read())
+    digest.update(sys.version.encode())
+    return digest.hexdigest()[:16]
+
+VERSION = toolchain_version()
+
+def default_directory():
+    if os.environ.get('MYPL_CACHE_DIR'):
+        return os.environ['MYPL_CACHE_DIR']
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'mypl')
+
+
+class Cache(object):
+    """An on-disk cache of front-end artifacts (parsed ASTs or compiled
+    bytecode) keyed by a hash of the source, the kind of artifact and
+    the toolchain version. Entries are checked against their key and a
+    checksum when loaded, and the oldest entries are evicted once the
+    cache grows past max_bytes or an entry is older than max_age seconds.
+    Any problem reading or writing the cache is treated as a miss.
+    """
+
+    def __init__(self, directory=None, max_bytes=64 * 1024 * 1024,
+                 max_age=7 * 24 * 60 * 60):
+        self.directory = directory or default_directory()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source, kind):
+        digest = hashlib.sha256()
+        digest.update(('%s:%s:%s\0' % (MAGIC, VERSION, kind)).encode())
+        digest.update(source.encode())
+        return digest.hexdigest()
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + '.cache')
+
+    def load(self, source, kind):
+        """returns the cached artifact for source, or None"""
+        key = self.key(source, kind)
+        path = self.__path(key)
+        try:
+            with open(path, 'rb') as f:
+                magic, version, entry_key, checksum, payload = \
+                    pickle.load(f)
+            if magic != MAGIC or version != VERSION or entry_key != key or \
+               hashlib.sha256(payload).hexdigest() != checksum:
+                raise ValueError('invalid cache entry')
+            artifact = self.__unpickle(payload)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # corrupt, truncated or stale entry
+            self.__remove(path)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)      # keep recently used entries
+        except OSError:
+            # evicted meanwhile, or a read-only cache
+            pass
+        self.hits += 1
+        return artifact
+
+    def __unpickle(self, payload):
+        # an artifact is millions of small acyclic objects; running the
+        # cycle collector while they are created only wastes time
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return pickle.loads(payload)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def store(self, source, kind, artifact):
+        """caches artifact for source; returns True if it was written"""
+        key = self.key(source, kind)
+        try:
+            payload = pickle.dumps(artifact, pickle.HIGHEST_PROTOCOL)
+            entry = (MAGIC, VERSION, key,
+                     hashlib.sha256(payload).hexdigest(), payload)
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            # write to a temporary file first so readers never see a
+            # partially written entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory,
+                                            suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.__path(key))
+            except BaseException:
+                self.__remove(tmp_path)
+                raise
+        except (OSError, pickle.PicklingError, RecursionError, TypeError,
+                AttributeError):
+            # (objects pickle cannot handle raise TypeError or
+            # AttributeError)
+            return False
+        self.evict()
+        return True
+
+    def __entries(self):
+        """returns [(mtime, size, path)] of the entries, oldest first"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith('.cache'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+        entries.sort()
+        return entries
+
+    def __remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """removes expired entries, then the least recently used ones
+        until the cache fits in max_bytes"""
+        entries = self.__entries()
+        oldest = time.time() - self.max_age
+        total = 0
+        for mtime, size, path in entries:
+            total += size
+        for mtime, size, path in entries:
+            if mtime < oldest or total > self.max_bytes:
+                self.__remove(path)
+                total -= size
+
+    def clear(self):
+        for mtime, size, path in self.__entries():
+            self.__remove(path)
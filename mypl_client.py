@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+#
+# Description:
+#   Runs a MyPL program on a running mypl_server.py. Takes the same
+#   arguments as execute.py, and runs execute.py itself when no server
+#   is listening. Only imports what it needs to talk to the server, so
+#   it starts quickly.
+#----------------------------------------------------------------------
+import json
+import os
+import socket
+import sys
+
+# the longest reply (an exit status) the server sends
+MAX_REPLY = 64
+
+def default_socket():
+    """returns the path of the server's socket: $MYPL_SOCKET, or one per
+    user in the temporary directory"""
+    if os.environ.get('MYPL_SOCKET'):
+        return os.environ['MYPL_SOCKET']
+    directory = os.environ.get('TMPDIR') or '/tmp'
+    return os.path.join(directory, 'mypl-%d.sock' % os.getuid())
+
+def request(argv, path=None, prog=None):
+    """runs execute.py with the arguments argv on the server listening on
+    path, handing it this process's stdin, stdout and stderr; returns
+    the program's exit status, or None if no server is listening"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path or default_socket())
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    with sock:
+        message = json.dumps({'argv': argv, 'cwd': os.getcwd(),
+                              'prog': prog}).encode() + b'\n'
+        try:
+            sent = socket.send_fds(sock, [message], [0, 1, 2])
+            if sent < len(message):
+                sock.sendall(message[sent:])
+            reply = b''
+            while not reply.endswith(b'\n'):
+                chunk = sock.recv(MAX_REPLY)
+                if not chunk:
+                    print('mypl server stopped running the program',
+                          file=sys.stderr)
+                    return 1
+                reply += chunk
+        except KeyboardInterrupt:
+            # closing the connection stops the program on the server
+            return 130
+        return int(reply)
+
+if __name__ == '__main__':
+    prog = os.path.basename(sys.argv[0])
+    status = request(sys.argv[1:], prog=prog)
+    if status is None:
+        import execute
+        execute.cli(sys.argv[1:], prog=prog)
+        status = 0
+    sys.exit(status)
@@ -0,0 +1,701 @@
+import mypl_token as token
+import mypl_ast as ast
+import mypl_error as error
+import mypl_optimizer as optimizer
+import mypl_builtins as builtins
+import mypl_memo
+import mypl_rope
+import mypl_array
+import mypl_io
+import functools
+import marshal
+import math
+import re
+
+# the file name of generated code, in tracebacks and code objects
+FILENAME = '<mypl>'
+# the generated function holding the top-level statements
+MAIN = '_main'
+INDENT = '    '
+
+MISSING_ATTRIBUTE = re.compile(r"'(\w+)' object has no attribute 'm_(\w+)'")
+
+def literal(value):
+    """returns Python source for a constant value"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return "float('%r')" % value
+    return repr(value)
+
+def mypl_name(code_name):
+    """returns the MyPL function (or struct initializer) a generated
+    Python function implements, or None"""
+    if code_name.startswith('f_'):
+        return code_name[2:]
+    elif code_name.startswith('new_'):
+        return 'new ' + code_name[4:]
+    return None
+
+# run-time helpers shared by all generated programs
+
+def divide(lhs, rhs):
+    # integer division truncates, as in the interpreter
+    if isinstance(lhs, int):
+        return lhs // rhs
+    return lhs / rhs
+
+# array errors are reported at the position passed by the generated code
+
+def new_array(elem_type, length, line, column):
+    try:
+        return mypl_array.new(elem_type, length)
+    except mypl_array.ArrayError as e:
+        raise error.MyPLError(str(e), line, column)
+
+def load_index(array, index, line, column):
+    try:
+        return mypl_array.load(array, index)
+    except mypl_array.ArrayError as e:
+        raise error.MyPLError(str(e), line, column)
+
+def store_index(value, array, index, line, column):
+    # the value is passed first, so it is evaluated first
+    try:
+        mypl_array.store(array, index, value)
+    except mypl_array.ArrayError as e:
+        raise error.MyPLError(str(e), line, column)
+
+
+class Program(object):
+    """A MyPL program translated to Python: the generated source, the
+    built-in called at each call site, and the MyPL position of each
+    generated line (for reporting errors). The source is compiled once,
+    on first use; the code object is kept when the program is pickled."""
+
+    def __init__(self):
+        self.source = ''
+        self.call_sites = []    # (built-in name, line, column) per site
+        # (line, column, fields, calls) or None per line
+        self.positions = []
+        self.code = None        # compiled source
+
+    def code_object(self):
+        if self.code is None:
+            self.code = compile(self.source, FILENAME, 'exec')
+        return self.code
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['code'] = marshal.dumps(self.code_object())
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.code = marshal.loads(self.code)
+
+    def __str__(self):
+        return self.source
+
+
+class CodeGenerator(ast.Visitor):
+    """A MyPL visitor that translates a program into Python source.
+
+    The program becomes one Python function whose locals are the
+    top-level variables. MyPL functions become functions nested in it
+    (so they reach globals as closure variables) and structs become
+    slotted classes built by a factory that evaluates the field
+    initializers. Every variable gets its own Python name, so nested
+    declarations shadow outer ones as they do in MyPL. Variables,
+    functions and scoping are resolved as the bytecode compiler does,
+    and with the same errors. A function with tail calls to itself runs
+    in a 'while True' loop, and each of those calls rebinds the
+    parameters and starts the next iteration (breaking out of any while
+    loops around it first). A memoized function is rebound to a wrapper
+    that caches its results.
+
+    Behavior the interpreter has but Python lacks is kept with run-time
+    helpers: integer division truncates, built-ins are called through
+    per-call-site wrappers that check for nil arguments, and a long
+    string in a variable that is appended to becomes a rope. 'and' and
+    'or' are Python's own, which skip the right operand once the left
+    one decides the result, as the interpreter does.
+    """
+
+    def __init__(self, built_ins=None):
+        self.built_ins = built_ins or builtins.default
+        self.program = Program()
+        self.lines = []             # [(text, position)] being emitted
+        self.indent = 0
+        self.scopes = []            # stack of {var name: Python name}
+        self.global_scope = None    # {var name: Python name} of main
+        self.functions = {}         # fun name -> FunDeclStmt
+        self.structs = {}           # struct name -> StructDeclStmt
+        self.in_function = False    # in a function or struct factory
+        self.current_function = None    # FunDeclStmt being translated
+        self.nonlocals = set()      # globals assigned by the function
+        self.params = []            # Python names of the parameters
+        self.loops = 0              # while loops around the current line
+        self.tail_calls = 0         # tail calls turned into iterations
+        self.loop_tail_calls = 0    # ... of them inside while loops
+        self.names = 0              # Python variables named so far
+        self.fields = []            # field tokens of the current line
+        self.calls = []             # function call tokens of the line
+        self.expr = None            # Python source of the last expression
+
+    def compile(self, stmt_list):
+        """translates a parsed program and returns a codegen.Program"""
+        optimizer.Optimizer().optimize(stmt_list)
+        mypl_memo.PurityAnalyzer(self.built_ins).analyze(stmt_list)
+        for stmt in stmt_list.stmts:
+            if isinstance(stmt, ast.FunDeclStmt):
+                self.functions[stmt.fun_name.lexeme] = stmt
+            elif isinstance(stmt, ast.StructDeclStmt):
+                self.structs[stmt.struct_id.lexeme] = stmt
+        # the top-level statements
+        self.global_scope = {}
+        self.scopes = [self.global_scope]
+        self.indent = 1
+        main_lines = self.__generate(stmt_list.stmts)
+        # functions and structs, in the order the compiler compiles them
+        # (defined first, so any statement can use them)
+        decl_lines = []
+        for stmt in stmt_list.stmts:
+            if isinstance(stmt, ast.StructDeclStmt) and \
+               self.structs[stmt.struct_id.lexeme] is stmt:
+                decl_lines += self.__struct(stmt)
+            elif isinstance(stmt, ast.FunDeclStmt) and \
+                 self.functions[stmt.fun_name.lexeme] is stmt:
+                decl_lines += self.__function(stmt)
+        lines = [('def %s():' % MAIN, None)]
+        if self.global_scope:
+            # globals are nil until assigned, even inside functions
+            names = sorted(self.global_scope.values())
+            lines.append((INDENT + ' = '.join(names) + ' = None', None))
+        lines += decl_lines + main_lines
+        lines.append((INDENT + 'return None', None))
+        self.program.source = '\n'.join(text for text, position in lines) \
+            + '\n'
+        self.program.positions = [position for text, position in lines]
+        return self.program
+
+    def __error(self, msg, the_token):
+        raise error.MyPLError(msg, the_token.line, the_token.column)
+
+    def __generate(self, stmts):
+        """returns the lines of stmts at the current indentation"""
+        outer_lines = self.lines
+        self.lines = []
+        for stmt in stmts:
+            stmt.accept(self)
+        lines = self.lines
+        self.lines = outer_lines
+        return lines
+
+    def __emit(self, text, the_token):
+        """adds a line of code for the statement at the_token"""
+        position = (the_token.line, the_token.column, tuple(self.fields),
+                    tuple(self.calls))
+        self.lines.append((INDENT * self.indent + text, position))
+        self.fields = []
+        self.calls = []
+
+    def __expr(self, expr):
+        expr.accept(self)
+        return self.expr
+
+    def __block(self, stmt_list):
+        """emits the indented statements of stmt_list in a new scope"""
+        self.scopes.append({})
+        self.indent += 1
+        lines = self.__generate(stmt_list.stmts)
+        if not lines:
+            lines = [(INDENT * self.indent + 'pass', None)]
+        self.lines += lines
+        self.indent -= 1
+        self.scopes.pop()
+
+    def __declare(self, name):
+        """returns the Python name of the variable name in the innermost
+        scope"""
+        scope = self.scopes[-1]
+        if name not in scope:
+            self.names += 1
+            scope[name] = 'v%d_%s' % (self.names, name)
+        return scope[name]
+
+    def __resolve(self, the_token):
+        """returns the Python name of a variable"""
+        name = the_token.lexeme
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        if self.in_function and name in self.global_scope:
+            return self.global_scope[name]
+        self.__error('undeclared identifier "%s"' % name, the_token)
+
+    def __path(self, path):
+        """returns Python source for a variable or a path expression"""
+        parts = [self.__resolve(path[0])]
+        for field_id in path[1:]:
+            parts.append('m_' + field_id.lexeme)
+            self.fields.append((field_id.lexeme, field_id.line,
+                                field_id.column))
+        return '.'.join(parts)
+
+    def __struct(self, struct_decl):
+        name = struct_decl.struct_id.lexeme
+        fields = []
+        for var_decl in struct_decl.var_decls:
+            if var_decl.var_id.lexeme not in fields:
+                fields.append(var_decl.var_id.lexeme)
+        lines = []
+        the_token = struct_decl.struct_id
+        self.indent = 1
+        self.__emit('class S_%s(object):' % name, the_token)
+        self.indent = 2
+        slots = ''.join("'m_%s', " % field for field in fields)
+        self.__emit('__slots__ = (%s)' % slots, the_token)
+        # literal initializers are built into __init__; it takes the
+        # values of the others
+        prototype, computed = optimizer.struct_template(struct_decl)
+        params = dict((i, 'a%d' % i) for i, var_decl in computed)
+        if struct_decl.var_decls:
+            self.__emit('def __init__(self%s):' % ''.join(
+                ', ' + params[i] for i, var_decl in computed), the_token)
+            self.indent = 3
+            for i in range(len(struct_decl.var_decls)):
+                var_id = struct_decl.var_decls[i].var_id
+                value = params.get(i) or literal(prototype[i])
+                self.__emit('self.m_%s = %s' % (var_id.lexeme, value), var_id)
+        self.indent = 1
+        if not computed:
+            self.__emit('new_%s = S_%s' % (name, name), the_token)
+        else:
+            # the factory evaluates the initializers where the struct is
+            # declared
+            self.__emit('def new_%s():' % name, the_token)
+            self.in_function = True
+            self.scopes = [{}]
+            args = [self.__expr(var_decl.var_expr)
+                    for i, var_decl in computed]
+            self.indent = 2
+            self.__emit('return S_%s(%s)' % (name, ', '.join(args)),
+                        the_token)
+        lines, self.lines = self.lines, []
+        self.in_function = False
+        return lines
+
+    def __function(self, fun_decl):
+        self.in_function = True
+        self.nonlocals = set()
+        self.scopes = [{}]
+        self.params = [self.__declare(param.param_name.lexeme)
+                       for param in fun_decl.params]
+        self.indent = 1
+        params = [name + '=None' for name in self.params]
+        self.__emit('def f_%s(%s):' % (fun_decl.fun_name.lexeme,
+                                       ', '.join(params)),
+                    fun_decl.fun_name)
+        self.current_function = fun_decl
+        self.tail_calls = self.loop_tail_calls = 0
+        # the body is generated one level deeper, for the loop of any
+        # tail calls
+        self.indent = 2
+        self.__block(fun_decl.stmt_list)
+        lines, self.lines = self.lines, []
+        if self.tail_calls:
+            lines.insert(1, (INDENT * 2 + 'while True:', None))
+            if self.loop_tail_calls:
+                lines.insert(2, (INDENT * 3 + '_tail = False', None))
+            lines.append((INDENT * 3 + 'return None', None))
+        else:
+            lines[1:] = [(text[len(INDENT):], position)
+                         for text, position in lines[1:]]
+        if self.nonlocals:
+            text = INDENT * 2 + 'nonlocal ' + ', '.join(sorted(self.nonlocals))
+            lines.insert(1, (text, None))
+        if fun_decl.memoize:
+            name = fun_decl.fun_name.lexeme
+            lines.append((INDENT + 'f_%s = _memo(%r, f_%s)' % (name, name,
+                                                               name), None))
+        self.in_function = False
+        self.current_function = None
+        return lines
+
+    def visit_stmt_list(self, stmt_list):
+        self.lines += self.__generate(stmt_list.stmts)
+
+    def __tail_call(self, expr):
+        """returns expr if it is a tail call that can start the next
+        iteration of the current function, else None"""
+        if isinstance(expr, ast.SimpleExpr):
+            expr = expr.term
+        if not isinstance(expr, ast.CallRValue) or not expr.tail_call or \
+           self.current_function is None:
+            return None
+        name = expr.fun.lexeme
+        if name != self.current_function.fun_name.lexeme or \
+           self.built_ins.lookup(name, self.functions) is not None or \
+           len(expr.args) != len(self.params):
+            return None
+        return expr
+
+    def __emit_tail_call(self, call_rvalue, the_token):
+        args = [self.__expr(arg) for arg in call_rvalue.args]
+        if args:
+            # all arguments are evaluated before any parameter changes
+            self.__emit('%s = %s' % (', '.join(self.params),
+                                     ', '.join(args)), the_token)
+        self.tail_calls += 1
+        if self.loops:
+            # leave the while loops first (see visit_while_stmt)
+            self.__emit('_tail = True', the_token)
+            self.__emit('break', the_token)
+            self.loop_tail_calls += 1
+        else:
+            self.__emit('continue', the_token)
+
+    def visit_expr_stmt(self, expr_stmt):
+        call = self.__tail_call(expr_stmt.expr)
+        if call is not None:
+            self.__emit_tail_call(call, call.fun)
+            return
+        text = self.__expr(expr_stmt.expr)
+        self.__emit(text, self.__first_token(expr_stmt.expr))
+
+    def visit_var_decl_stmt(self, var_decl):
+        # the initializer is evaluated before the variable is in scope
+        value = self.__expr(var_decl.var_expr)
+        name = self.__declare(var_decl.var_id.lexeme)
+        self.__emit('%s = %s' % (name, value), var_decl.var_id)
+
+    def visit_assign_stmt(self, assign_stmt):
+        value = self.__expr(assign_stmt.rhs)
+        lval = assign_stmt.lhs
+        target = self.__path(lval.path)
+        if lval.index is not None:
+            index = self.__expr(lval.index)
+            first = lval.path[0]
+            self.__emit('_store(%s, %s, %s, %d, %d)' % (
+                value, target, index, first.line, first.column), first)
+            return
+        # Python names are unique, so this is the global itself
+        if self.in_function and \
+           target == self.global_scope.get(lval.path[0].lexeme):
+            self.nonlocals.add(target)
+        self.__emit('%s = %s' % (target, value), lval.path[0])
+
+    def visit_struct_decl_stmt(self, struct_decl): pass
+
+    def visit_fun_decl_stmt(self, fun_decl): pass
+
+    def visit_return_stmt(self, return_stmt):
+        the_token = return_stmt.return_token
+        expr = return_stmt.return_expr
+        call = self.__tail_call(expr)
+        if call is not None:
+            self.__emit_tail_call(call, the_token)
+        elif expr is None:
+            self.__emit('return None', the_token)
+        elif self.current_function is None or \
+             self.current_function.return_type.tokentype == token.NIL:
+            # the value is discarded (a top-level return ends the program)
+            self.__emit(self.__expr(expr), the_token)
+            self.__emit('return None', the_token)
+        else:
+            self.__emit('return ' + self.__expr(expr), the_token)
+
+    def visit_while_stmt(self, while_stmt):
+        cond = self.__expr(while_stmt.bool_expr)
+        the_token = self.__first_token(while_stmt.bool_expr)
+        self.__emit('while %s:' % cond, the_token)
+        loop_tail_calls = self.loop_tail_calls
+        self.loops += 1
+        self.__block(while_stmt.stmt_list)
+        self.loops -= 1
+        if self.loop_tail_calls > loop_tail_calls:
+            # a tail call left the loop: keep leaving, up to the
+            # function's own loop
+            self.__emit('if _tail:', the_token)
+            self.indent += 1
+            self.__emit('break' if self.loops else 'continue', the_token)
+            self.indent -= 1
+
+    def visit_if_stmt(self, if_stmt):
+        keyword = 'if'
+        for basic_if in [if_stmt.if_part] + if_stmt.elseifs:
+            cond = self.__expr(basic_if.bool_expr)
+            the_token = self.__first_token(basic_if.bool_expr)
+            self.__emit('%s %s:' % (keyword, cond), the_token)
+            self.__block(basic_if.stmt_list)
+            keyword = 'elif'
+        if if_stmt.has_else:
+            self.__emit('else:', the_token)
+            self.__block(if_stmt.else_stmts)
+
+    def visit_simple_expr(self, simple_expr):
+        simple_expr.term.accept(self)
+
+    def visit_complex_expr(self, complex_expr):
+        lhs = self.__expr(complex_expr.first_operand)
+        rhs = self.__expr(complex_expr.rest)
+        math_rel = complex_expr.math_rel.lexeme
+        if math_rel == '/':
+            self.expr = '_div(%s, %s)' % (lhs, rhs)
+        elif math_rel == '+' and self.__appendable(complex_expr):
+            self.expr = '((%s if %s.__class__ is not str else _rope(%s)) ' \
+                '+ %s)' % (lhs, lhs, lhs, rhs)
+        else:
+            self.expr = '(%s %s %s)' % (lhs, math_rel, rhs)
+
+    def __appendable(self, complex_expr):
+        """true if the + of complex_expr may append to a string held in
+        a variable"""
+        lhs = complex_expr.first_operand
+        if isinstance(lhs, ast.SimpleExpr):
+            lhs = lhs.term
+        if not isinstance(lhs, ast.IDRvalue) or len(lhs.path) > 1 or \
+           lhs.index is not None:
+            return False
+        return self.__maybe_string(complex_expr.rest)
+
+    def __maybe_string(self, expr):
+        """false if expr certainly does not evaluate to a string"""
+        if isinstance(expr, ast.SimpleExpr):
+            expr = expr.term
+        if isinstance(expr, ast.ComplexExpr):
+            return expr.math_rel.lexeme == '+' and \
+                self.__maybe_string(expr.first_operand) and \
+                self.__maybe_string(expr.rest)
+        elif isinstance(expr, ast.SimpleRValue):
+            return expr.val.tokentype == token.STRINGVAL
+        elif isinstance(expr, (ast.NewRValue, ast.NewArrayRValue,
+                               ast.NewMapRValue)):
+            return False
+        elif isinstance(expr, ast.IDRvalue):
+            # array elements are numbers
+            return expr.index is None
+        elif isinstance(expr, ast.CallRValue):
+            name = expr.fun.lexeme
+            built_in = self.built_ins.lookup(name, self.functions)
+            if built_in is not None:
+                # a map's values may be strings
+                return built_in.return_type in (token.STRINGTYPE,
+                                                builtins.VALUE)
+            if name in self.functions:
+                return self.functions[name].return_type.tokentype == \
+                    token.STRINGTYPE
+        return True
+
+    def visit_bool_expr(self, bool_expr):
+        text = self.__expr(bool_expr.first_expr)
+        if bool_expr.bool_rel is not None:
+            rhs = self.__expr(bool_expr.second_expr)
+            text = '(%s %s %s)' % (text, bool_expr.bool_rel.lexeme, rhs)
+        if bool_expr.bool_connector is not None:
+            rest = self.__expr(bool_expr.rest)
+            # Python's and/or short-circuit like MyPL's
+            text = '(%s %s %s)' % (text, bool_expr.bool_connector.lexeme,
+                                   rest)
+        if bool_expr.negated:
+            text = '(not %s)' % text
+        self.expr = text
+
+    def visit_simple_rvalue(self, simple_rvalue):
+        self.expr = literal(simple_rvalue.value)
+
+    def visit_new_rvalue(self, new_rvalue):
+        struct_id = new_rvalue.struct_type
+        if struct_id.lexeme not in self.structs:
+            self.__error('undeclared struct "%s"' % struct_id.lexeme,
+                         struct_id)
+        self.expr = 'new_%s()' % struct_id.lexeme
+
+    def visit_new_map_rvalue(self, new_rvalue):
+        self.expr = '{}'
+
+    def visit_new_array_rvalue(self, new_rvalue):
+        length = self.__expr(new_rvalue.length)
+        elem_type = new_rvalue.elem_type
+        self.expr = '_array(%r, %s, %d, %d)' % (
+            elem_type.tokentype, length, elem_type.line, elem_type.column)
+
+    def visit_call_rvalue(self, call_rvalue):
+        fun_id = call_rvalue.fun
+        args = ', '.join([self.__expr(arg) for arg in call_rvalue.args])
+        built_in = self.built_ins.lookup(fun_id.lexeme, self.functions)
+        if built_in is not None:
+            if len(call_rvalue.args) != built_in.arity():
+                self.__error('wrong number of arguments to "%s"' %
+                             fun_id.lexeme, fun_id)
+            site = len(self.program.call_sites)
+            self.program.call_sites.append((built_in.name, fun_id.line,
+                                            fun_id.column))
+            self.expr = '_c%d(%s)' % (site, args)
+        elif fun_id.lexeme in self.functions:
+            fun_decl = self.functions[fun_id.lexeme]
+            if len(call_rvalue.args) != len(fun_decl.params):
+                self.__error('wrong number of arguments to "%s"' %
+                             fun_id.lexeme, fun_id)
+            self.calls.append((fun_id.lexeme, fun_id.line, fun_id.column))
+            self.expr = 'f_%s(%s)' % (fun_id.lexeme, args)
+        else:
+            self.__error('undeclared function "%s"' % fun_id.lexeme, fun_id)
+
+    def visit_id_rvalue(self, id_rvalue):
+        array = self.__path(id_rvalue.path)
+        if id_rvalue.index is not None:
+            index = self.__expr(id_rvalue.index)
+            first = id_rvalue.path[0]
+            array = '_load(%s, %s, %d, %d)' % (array, index, first.line,
+                                               first.column)
+        self.expr = array
+
+    def __first_token(self, node):
+        """returns the first token of an expression"""
+        while True:
+            if isinstance(node, ast.BoolExpr):
+                node = node.first_expr
+            elif isinstance(node, ast.SimpleExpr):
+                node = node.term
+            elif isinstance(node, ast.ComplexExpr):
+                node = node.first_operand
+            elif isinstance(node, ast.SimpleRValue):
+                return node.val
+            elif isinstance(node, ast.NewRValue):
+                return node.struct_type
+            elif isinstance(node, ast.NewArrayRValue):
+                return node.elem_type
+            elif isinstance(node, ast.NewMapRValue):
+                return node.map_type
+            elif isinstance(node, ast.CallRValue):
+                return node.fun
+            else:
+                return node.path[0]
+
+
+class Runner(object):
+    """Runs programs translated by CodeGenerator"""
+
+    def __init__(self, built_ins=None, output=None, input=None,
+                 memo_size=mypl_memo.DEFAULT_SIZE):
+        self.built_ins = built_ins or builtins.default
+        self.output = output or mypl_io.Output()
+        self.input = input or mypl_io.Input()
+        self.memo_size = memo_size  # 0 turns memoizing off
+        self.memos = []
+
+    def run(self, program):
+        self.memos = []
+        namespace = {'__name__': 'mypl', '_div': divide,
+                     '_memo': self.__memo,
+                     '_rope': mypl_rope.rope, '_array': new_array,
+                     '_load': load_index, '_store': store_index}
+        # bind each call site to its built-in once, before the program runs
+        for i in range(len(program.call_sites)):
+            name, line, column = program.call_sites[i]
+            namespace['_c%d' % i] = self.__call_site(name, line, column)
+        exec(program.code_object(), namespace)
+        try:
+            namespace[MAIN]()
+        except AttributeError as e:
+            raise self.__path_error(program, e)
+        except RecursionError as e:
+            position = self.__overflow_position(program, e)
+            if position is None:
+                raise
+            raise error.MyPLError('call stack overflow', position[0],
+                                  position[1])
+        finally:
+            self.output.flush()
+
+    def __memo(self, name, function):
+        """returns the function a memoized MyPL function is bound to"""
+        if self.memo_size <= 0:
+            return function
+        memo = mypl_memo.Memo(name, self.memo_size)
+        self.memos.append(memo)
+        return mypl_memo.memoize(function, memo)
+
+    def __call_site(self, name, line, column):
+        """returns the function called by a built-in call site"""
+        built_in = self.built_ins.lookup(name)
+        if built_in is None:
+            def undeclared(*args):
+                raise error.MyPLError('undeclared function "%s"' % name,
+                                      line, column)
+            return undeclared
+        function = built_in.function
+        if built_in.runtime:
+            function = functools.partial(function, self)
+        check_nil = built_in.check_nil
+        string_params = built_in.string_params
+        def call(*args):
+            if check_nil and None in args:
+                raise error.MyPLError('NIL value found in argument', line,
+                                      column)
+            if string_params:
+                args = list(args)
+                mypl_rope.materialize(args, string_params)
+            try:
+                return function(*args)
+            except builtins.BuiltInError as e:
+                raise error.MyPLError(str(e), line, column)
+        return call
+
+    def __frames(self, e):
+        """returns the (line number, function name) of the frames of
+        generated code e was raised through, outermost first"""
+        frames = []
+        tb = e.__traceback__
+        while tb is not None:
+            code = tb.tb_frame.f_code
+            if code.co_filename == FILENAME:
+                frames.append((tb.tb_lineno, code.co_name))
+            tb = tb.tb_next
+        return frames
+
+    def __position(self, program, e):
+        """returns the (line, column, fields, calls) of the innermost
+        line of generated code e was raised in, or None"""
+        frames = self.__frames(e)
+        if not frames:
+            return None
+        return program.positions[frames[-1][0] - 1]
+
+    def __overflow_position(self, program, e):
+        """returns the (line, column) of the call of the innermost MyPL
+        function running when the RecursionError e was raised (where
+        the interpreter and VM report it), or None"""
+        frames = self.__frames(e)
+        for i in range(len(frames) - 1, 0, -1):
+            name = mypl_name(frames[i][1])
+            if name is None or name.startswith('new '):
+                continue
+            line, column, fields, calls = \
+                program.positions[frames[i - 1][0] - 1]
+            for lexeme, call_line, call_column in calls:
+                if lexeme == name:
+                    return call_line, call_column
+            return line, column
+        return None
+
+    def __path_error(self, program, e):
+        """returns the MyPLError for an AttributeError raised by a path
+        expression (or e itself, if it was raised by something else)"""
+        match = MISSING_ATTRIBUTE.search(str(e))
+        position = self.__position(program, e)
+        if match is None or position is None:
+            return e
+        type_name, field = match.groups()
+        line, column, fields, calls = position
+        for lexeme, field_line, field_column in fields:
+            if lexeme == field:
+                line, column = field_line, field_column
+                break
+        if type_name == 'NoneType':
+            msg = 'nil reference in path expression'
+        elif type_name.startswith('S_'):
+            msg = 'struct %s has no field %s' % (type_name[2:], field)
+        else:
+            return e
+        return error.MyPLError(msg, line, column)
@@ -0,0 +1,314 @@
+import mypl_token as token
+import mypl_ast as ast
+import mypl_error as error
+import mypl_bytecode as bytecode
+import mypl_optimizer as optimizer
+import mypl_builtins as builtins
+import mypl_memo
+from mypl_bytecode import *
+
+MATH_OPS = {token.PLUS: ADD, token.MINUS: SUB, token.MULTIPLY: MUL,
+            token.DIVIDE: DIV, token.MODULO: MOD}
+
+BOOL_OPS = {token.EQUAL: EQ, token.NOT_EQUAL: NE, token.LESS_THAN: LT,
+            token.LESS_THAN_EQUAL: LE, token.GREATER_THAN: GT,
+            token.GREATER_THAN_EQUAL: GE}
+
+
+class Compiler(ast.Visitor):
+    """A MyPL visitor that compiles a program into bytecode for the VM.
+
+    Variables are resolved to slots at compile time. Top-level variables
+    live in the global frame; every other variable is a slot in the frame
+    of the function (or struct initializer) that declares it. Function
+    bodies and struct initializers are compiled after the top-level
+    statements so they can refer to any global, function or struct.
+    """
+
+    def __init__(self, built_ins=None):
+        self.built_ins = built_ins or builtins.default
+        self.program = bytecode.Program()
+        self.code = None            # Code currently being emitted
+        self.scopes = []            # stack of {var name: slot}
+        self.global_scope = None    # {var name: slot} of the main program
+        self.functions = {}         # fun name -> (index, FunDeclStmt)
+        self.structs = {}           # struct name -> index
+        self.built_in_index = {}    # built-in name -> index
+        self.position = (0, 0)      # (line, column) for emitted code
+        self.fun_decl = None        # function being compiled, if any
+
+    def compile(self, stmt_list):
+        """compiles a parsed program and returns a bytecode.Program"""
+        optimizer.Optimizer().optimize(stmt_list)
+        mypl_memo.PurityAnalyzer(self.built_ins).analyze(stmt_list)
+        deferred = []
+        for stmt in stmt_list.stmts:
+            if isinstance(stmt, ast.FunDeclStmt):
+                self.functions[stmt.fun_name.lexeme] = \
+                    (len(self.program.functions), stmt)
+                self.program.functions.append(None)
+                deferred.append(stmt)
+            elif isinstance(stmt, ast.StructDeclStmt):
+                self.structs[stmt.struct_id.lexeme] = \
+                    len(self.program.structs)
+                self.program.structs.append(None)
+                deferred.append(stmt)
+        # the main program (top-level statements share the global frame)
+        self.program.main = self.code = bytecode.Code('<main>')
+        self.global_scope = {}
+        self.scopes = [self.global_scope]
+        for stmt in stmt_list.stmts:
+            stmt.accept(self)
+        self.__emit(LOAD_CONST, self.code.add_const(None))
+        self.__emit(RETURN)
+        # function bodies and struct initializers
+        for decl in deferred:
+            if isinstance(decl, ast.FunDeclStmt):
+                self.__compile_fun(decl)
+            else:
+                self.__compile_struct(decl)
+        return self.program
+
+    def __error(self, msg, the_token):
+        raise error.MyPLError(msg, the_token.line, the_token.column)
+
+    def __emit(self, opcode, arg=0):
+        return self.code.emit(opcode, arg, self.position)
+
+    def __locate(self, the_token):
+        self.position = (the_token.line, the_token.column)
+
+    def __declare(self, name):
+        """returns the slot of name in the innermost scope"""
+        scope = self.scopes[-1]
+        if name not in scope:
+            scope[name] = self.code.nlocals
+            self.code.nlocals += 1
+        return scope[name]
+
+    def __resolve(self, the_token):
+        """returns the (load, store) opcodes and slot for a variable"""
+        name = the_token.lexeme
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return LOAD_LOCAL, STORE_LOCAL, scope[name]
+        if self.code is not self.program.main and name in self.global_scope:
+            return LOAD_GLOBAL, STORE_GLOBAL, self.global_scope[name]
+        self.__error('undeclared identifier "%s"' % name, the_token)
+
+    def __block(self, stmt_list):
+        self.scopes.append({})
+        for stmt in stmt_list.stmts:
+            stmt.accept(self)
+        self.scopes.pop()
+
+    def __compile_fun(self, fun_decl):
+        index = self.functions[fun_decl.fun_name.lexeme][0]
+        self.code = bytecode.Code(fun_decl.fun_name.lexeme,
+                                  len(fun_decl.params))
+        self.code.returns_nil = fun_decl.return_type.tokentype == token.NIL
+        self.code.memoize = fun_decl.memoize
+        self.scopes = [{}]
+        for param in fun_decl.params:
+            # params already own the first slots
+            self.scopes[0][param.param_name.lexeme] = len(self.scopes[0])
+        self.__locate(fun_decl.fun_name)
+        self.fun_decl = fun_decl
+        self.__block(fun_decl.stmt_list)
+        self.fun_decl = None
+        self.__emit(LOAD_CONST, self.code.add_const(None))
+        self.__emit(RETURN)
+        self.program.functions[index] = self.code
+
+    def __compile_struct(self, struct_decl):
+        index = self.structs[struct_decl.struct_id.lexeme]
+        struct_info = bytecode.StructInfo(struct_decl.struct_id.lexeme)
+        self.code = bytecode.Code(struct_decl.struct_id.lexeme)
+        self.scopes = [{}]
+        self.__locate(struct_decl.struct_id)
+        for var_decl in struct_decl.var_decls:
+            struct_info.fields.append(var_decl.var_id.lexeme)
+        # only initializers that are not literals run per instance
+        struct_info.prototype, computed = \
+            optimizer.struct_template(struct_decl)
+        struct_info.computed = tuple(i for i, var_decl in computed)
+        if computed:
+            for i, var_decl in computed:
+                var_decl.var_expr.accept(self)
+            self.__emit(MAKE_STRUCT, index)
+            self.__emit(RETURN)
+            struct_info.init = self.code
+        self.program.structs[index] = struct_info
+
+    def visit_stmt_list(self, stmt_list):
+        self.__block(stmt_list)
+
+    def visit_expr_stmt(self, expr_stmt):
+        expr_stmt.expr.accept(self)
+        self.__emit(POP)
+
+    def visit_var_decl_stmt(self, var_decl):
+        # the initializer is evaluated before the variable is in scope
+        var_decl.var_expr.accept(self)
+        self.__locate(var_decl.var_id)
+        slot = self.__declare(var_decl.var_id.lexeme)
+        self.__emit(STORE_LOCAL, slot)
+
+    def visit_assign_stmt(self, assign_stmt):
+        assign_stmt.rhs.accept(self)
+        assign_stmt.lhs.accept(self)
+
+    def visit_struct_decl_stmt(self, struct_decl): pass
+
+    def visit_fun_decl_stmt(self, fun_decl): pass
+
+    def visit_return_stmt(self, return_stmt):
+        self.__locate(return_stmt.return_token)
+        if return_stmt.return_expr is not None:
+            return_stmt.return_expr.accept(self)
+            if self.code.returns_nil:
+                self.__emit(POP)
+                self.__emit(LOAD_CONST, self.code.add_const(None))
+        else:
+            self.__emit(LOAD_CONST, self.code.add_const(None))
+        self.__emit(RETURN)
+
+    def visit_while_stmt(self, while_stmt):
+        top = self.code.here()
+        while_stmt.bool_expr.accept(self)
+        exit_jump = self.__emit(JUMP_IF_FALSE)
+        self.__block(while_stmt.stmt_list)
+        self.__emit(JUMP, top)
+        self.code.patch(exit_jump, self.code.here())
+
+    def visit_if_stmt(self, if_stmt):
+        # a chain of tests: each condition that fails jumps to the next
+        # one, and a branch that runs jumps past the rest
+        end_jumps = []
+        basic_ifs = [if_stmt.if_part] + if_stmt.elseifs
+        for basic_if in basic_ifs:
+            basic_if.bool_expr.accept(self)
+            next_jump = self.__emit(JUMP_IF_FALSE)
+            self.__block(basic_if.stmt_list)
+            if if_stmt.has_else or basic_if is not basic_ifs[-1]:
+                end_jumps.append(self.__emit(JUMP))
+            self.code.patch(next_jump, self.code.here())
+        if if_stmt.has_else:
+            self.__block(if_stmt.else_stmts)
+        for address in end_jumps:
+            self.code.patch(address, self.code.here())
+
+    def visit_simple_expr(self, simple_expr):
+        simple_expr.term.accept(self)
+
+    def visit_complex_expr(self, complex_expr):
+        complex_expr.first_operand.accept(self)
+        complex_expr.rest.accept(self)
+        self.__locate(complex_expr.math_rel)
+        self.__emit(MATH_OPS[complex_expr.math_rel.tokentype])
+
+    def visit_bool_expr(self, bool_expr):
+        bool_expr.first_expr.accept(self)
+        if bool_expr.bool_rel != None:
+            bool_expr.second_expr.accept(self)
+            self.__locate(bool_expr.bool_rel)
+            self.__emit(BOOL_OPS[bool_expr.bool_rel.tokentype])
+        if bool_expr.bool_connector != None:
+            # the left side is the result if it decides it
+            if bool_expr.bool_connector.tokentype == token.AND:
+                skip_jump = self.__emit(JUMP_IF_FALSE_OR_POP)
+            else:
+                skip_jump = self.__emit(JUMP_IF_TRUE_OR_POP)
+            bool_expr.rest.accept(self)
+            self.code.patch(skip_jump, self.code.here())
+        if bool_expr.negated:
+            self.__emit(NOT)
+
+    def visit_lvalue(self, lval):
+        self.__locate(lval.path[0])
+        load, store, slot = self.__resolve(lval.path[0])
+        if lval.index is not None:
+            # the value is on the stack; the array and index go on top
+            self.__emit(load, slot)
+            for path_id in lval.path[1:]:
+                self.__locate(path_id)
+                self.__emit(LOAD_FIELD, self.code.add_name(path_id.lexeme))
+            lval.index.accept(self)
+            self.__locate(lval.path[0])
+            self.__emit(STORE_INDEX)
+        elif len(lval.path) == 1:
+            self.__emit(store, slot)
+        else:
+            self.__emit(load, slot)
+            for path_id in lval.path[1:-1]:
+                self.__locate(path_id)
+                self.__emit(LOAD_FIELD, self.code.add_name(path_id.lexeme))
+            self.__locate(lval.path[-1])
+            self.__emit(STORE_FIELD, self.code.add_name(lval.path[-1].lexeme))
+
+    def visit_simple_rvalue(self, simple_rvalue):
+        self.__emit(LOAD_CONST, self.code.add_const(simple_rvalue.value))
+
+    def visit_new_rvalue(self, new_rvalue):
+        struct_id = new_rvalue.struct_type
+        if struct_id.lexeme not in self.structs:
+            self.__error('undeclared struct "%s"' % struct_id.lexeme,
+                         struct_id)
+        self.__locate(struct_id)
+        self.__emit(NEW, self.structs[struct_id.lexeme])
+
+    def visit_new_map_rvalue(self, new_rvalue):
+        self.__locate(new_rvalue.map_type)
+        self.__emit(NEW_MAP)
+
+    def visit_new_array_rvalue(self, new_rvalue):
+        new_rvalue.length.accept(self)
+        elem_type = new_rvalue.elem_type
+        self.__locate(elem_type)
+        self.__emit(NEW_ARRAY,
+                    ARRAY_ELEMENT_TYPES.index(elem_type.tokentype))
+
+    def visit_call_rvalue(self, call_rvalue):
+        fun_id = call_rvalue.fun
+        for arg in call_rvalue.args:
+            arg.accept(self)
+        self.__locate(fun_id)
+        built_in = self.built_ins.lookup(fun_id.lexeme, self.functions)
+        if built_in is not None:
+            if len(call_rvalue.args) != built_in.arity():
+                self.__error('wrong number of arguments to "%s"' %
+                             fun_id.lexeme, fun_id)
+            if built_in.name not in self.built_in_index:
+                self.built_in_index[built_in.name] = \
+                    len(self.program.built_ins)
+                self.program.built_ins.append(built_in.name)
+            call_site = (self.built_in_index[built_in.name],
+                         len(call_rvalue.args), fun_id.line, fun_id.column)
+            self.__emit(CALL_BUILTIN, self.code.add_const(call_site))
+        elif fun_id.lexeme in self.functions:
+            index, fun_decl = self.functions[fun_id.lexeme]
+            if len(call_rvalue.args) != len(fun_decl.params):
+                self.__error('wrong number of arguments to "%s"' %
+                             fun_id.lexeme, fun_id)
+            if call_rvalue.tail_call and fun_decl is self.fun_decl:
+                # reuse the frame: the arguments replace the parameters
+                # and the function starts over (what follows is not run)
+                for slot in reversed(range(len(call_rvalue.args))):
+                    self.__emit(STORE_LOCAL, slot)
+                self.__emit(JUMP, 0)
+            else:
+                self.__emit(CALL, index)
+        else:
+            self.__error('undeclared function "%s"' % fun_id.lexeme, fun_id)
+
+    def visit_id_rvalue(self, id_rvalue):
+        self.__locate(id_rvalue.path[0])
+        load, store, slot = self.__resolve(id_rvalue.path[0])
+        self.__emit(load, slot)
+        for path_id in id_rvalue.path[1:]:
+            self.__locate(path_id)
+            self.__emit(LOAD_FIELD, self.code.add_name(path_id.lexeme))
+        if id_rvalue.index is not None:
+            id_rvalue.index.accept(self)
+            self.__locate(id_rvalue.path[0])
+            self.__emit(LOAD_INDEX)
@@ -0,0 +1,86 @@
+import gc
+import sys
+import weakref
+
+
+class StructLayout(object):
+    """The field layout shared by every instance of a struct type: the
+    field names in declaration order and the slot index of each field.
+    """
+    __slots__ = ('name', 'fields', 'index')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = tuple(fields)
+        self.index = {}                 # field name -> slot
+        for i, field in enumerate(self.fields):
+            self.index[field] = i
+
+
+class StructObject(object):
+    """A struct instance. MyPL variables and fields hold references to
+    these objects directly, so an instance is reclaimed as soon as no
+    frame or other struct refers to it. Two references are equal only
+    if they refer to the same instance.
+    """
+    __slots__ = ('oid', 'layout', 'values', '__weakref__')
+
+    def __init__(self, oid, layout, values):
+        self.oid = oid                  # unique, never reused
+        self.layout = layout            # StructLayout
+        self.values = values            # [value], one per layout slot
+
+    def __str__(self):
+        return '%s@%i' % (self.layout.name, self.oid)
+
+
+class Heap(object):
+    """Allocates struct instances and keeps statistics about them.
+
+    Instances are reference counted: one that becomes unreachable is
+    freed immediately, and unreachable cycles of instances are freed by
+    collect() (or by Python's own cycle collector). The heap only keeps
+    weak references, so it never extends the lifetime of an instance.
+    """
+
+    def __init__(self):
+        self.live = weakref.WeakValueDictionary()   # oid -> StructObject
+        self.allocated = 0          # instances ever allocated
+        self.peak = 0               # largest number of live instances
+        self.collections = 0        # calls to collect()
+
+    def allocate(self, layout, values):
+        """creates a struct instance and returns a reference to it"""
+        self.allocated += 1
+        obj = StructObject(self.allocated, layout, values)
+        self.live[obj.oid] = obj
+        if len(self.live) > self.peak:
+            self.peak = len(self.live)
+        return obj
+
+    def size(self):
+        """returns the number of live struct instances"""
+        return len(self.live)
+
+    def collect(self):
+        """frees unreachable cycles and returns the number of instances
+        freed by the collection
+        """
+        before = len(self.live)
+        gc.collect()
+        self.collections += 1
+        return before - len(self.live)
+
+    def stats(self):
+        live = len(self.live)
+        nbytes = 0
+        for obj in self.live.values():
+            nbytes += sys.getsizeof(obj) + sys.getsizeof(obj.values)
+        return {'live': live, 'bytes': nbytes, 'allocated': self.allocated,
+                'freed': self.allocated - live, 'peak': self.peak,
+                'collections': self.collections}
+
+    def __str__(self):
+        return ('heap: %(live)i live structs (%(bytes)i bytes), '
+                '%(allocated)i allocated, %(freed)i freed, peak %(peak)i, '
+                '%(collections)i collections' % self.stats())
@@ -1,85 +1,182 @@
 import mypl_token as token
 import mypl_ast as ast
 import mypl_error as error
-import mypl_symbol_table as sym_tbl
+import mypl_resolver as resolver
+import mypl_optimizer as optimizer
+import mypl_heap as heap
+import mypl_builtins as builtins
+import mypl_memo
+import mypl_rope
+import mypl_array
+import mypl_io
 
-class ReturnException(Exception): pass
+class Frame(object):
+    """The values of the variables declared in one environment, plus a
+    link to the frame of the enclosing environment"""
+    __slots__ = ('values', 'parent')
+
+    def __init__(self, size, parent):
+        self.values = [None] * size
+        self.parent = parent
 
 class Interpreter(ast.Visitor):
     """A MyPL interpret visitor implementation"""
     
-    def __init__(self):
-        # initialize the symbol table (for ids -> values)
-        self.sym_table = sym_tbl.SymbolTable()
+    def __init__(self, built_ins=None, output=None, input=None,
+                 memo_size=mypl_memo.DEFAULT_SIZE):
+        # built-in functions available to the program
+        self.built_ins = built_ins or builtins.default
+        # buffered output channel of print
+        self.output = output or mypl_io.Output()
+        # buffered input channel of the read functions
+        self.input = input or mypl_io.Input()
+        # frame of the current environment (for slots -> values)
+        self.frame = None
         # holds the type of last expression type
         self.current_value = None
-        self.heap = {}
+        # set by a return statement until its function call completes
+        self.returning = False
+        # arguments of a pending tail call, for the running call to reuse
+        self.tail_args = None
+        # struct instances (reclaimed once unreachable)
+        self.heap = heap.Heap()
+        # results cached per memoized function (0 turns memoizing off)
+        self.memo_size = memo_size
+        self.memos = []
     
     def run(self, stmt_list):
+        optimizer.Optimizer().optimize(stmt_list)
+        mypl_memo.PurityAnalyzer(self.built_ins).analyze(stmt_list)
+        resolver.Resolver(self.built_ins).resolve(stmt_list)
+        self.memos = []
+        self.frame = Frame(stmt_list.frame_size, None)
         try:
-            stmt_list.accept(self)
-        except ReturnException:
-            pass
+            # functions and structs can be used before their declarations
+            for stmt in stmt_list.stmts:
+                if isinstance(stmt, ast.FunDeclStmt):
+                    self.__bind_fun(stmt)
+                elif isinstance(stmt, ast.StructDeclStmt):
+                    self.__bind_struct(stmt)
+            # a top-level return ends the program
+            for stmt in stmt_list.stmts:
+                stmt.accept(self)
+                if self.returning:
+                    break
+        finally:
+            self.frame = None
+            self.returning = False
+            self.tail_args = None
+            self.output.flush()
 
     def __error(self, msg, the_token):
         raise error.MyPLError(msg, the_token.line, the_token.column)
+
+    def __field_slot(self, struct_obj, field_id, field_slots, i):
+        """looks up the slot of a path field when field_slots[i] was
+        cached for a different struct layout (or not cached yet)"""
+        if struct_obj is None:
+            self.__error('nil reference in path expression', field_id)
+        layout = struct_obj.layout
+        if field_id.lexeme not in layout.index:
+            msg = 'struct %s has no field %s' % (layout.name, field_id.lexeme)
+            self.__error(msg, field_id)
+        field_slots[i] = (layout, layout.index[field_id.lexeme])
+        return field_slots[i][1]
+
+    def __path_value(self, var_val, path, field_slots):
+        """returns the value of the path starting at the struct var_val"""
+        for i in range(len(field_slots)):
+            layout, index = field_slots[i]
+            if var_val is None or var_val.layout is not layout:
+                index = self.__field_slot(var_val, path[i + 1],
+                                          field_slots, i)
+            var_val = var_val.values[index]
+        return var_val
+
+    def __frame(self, depth):
+        """returns the frame depth levels out from the current one"""
+        frame = self.frame
+        while depth:
+            frame = frame.parent
+            depth -= 1
+        return frame
     
     def visit_stmt_list(self, stmt_list):
-        self.sym_table.push_environment()
-        for stmt in stmt_list.stmts:
-            stmt.accept(self)
-        self.sym_table.pop_environment()
+        # blocks without declarations run in the enclosing frame
+        if stmt_list.frame_size:
+            self.frame = Frame(stmt_list.frame_size, self.frame)
+        if stmt_list.returns:
+            for stmt in stmt_list.stmts:
+                stmt.accept(self)
+                if self.returning:
+                    break
+        else:
+            for stmt in stmt_list.stmts:
+                stmt.accept(self)
+        if stmt_list.frame_size:
+            self.frame = self.frame.parent
         
     def visit_expr_stmt(self, expr_stmt):
         expr_stmt.expr.accept(self)
 
     def visit_var_decl_stmt(self, var_decl):
         var_decl.var_expr.accept(self)
-        exp_value = self.current_value
-        var_name = var_decl.var_id.lexeme
-        self.sym_table.add_id(var_name)
-        self.sym_table.set_info(var_name, exp_value)
+        self.frame.values[var_decl.slot] = self.current_value
 
     def visit_assign_stmt(self, assign_stmt):
         assign_stmt.rhs.accept(self)
         assign_stmt.lhs.accept(self)#sets the lval to currentval
 
-    def visit_struct_decl_stmt(self, struct_decl):
-        new_id = struct_decl.struct_id.lexeme
-        env_id = self.sym_table.get_env_id()
-        self.sym_table.add_id(new_id)
-        self.sym_table.set_info(new_id, [env_id, struct_decl])
+    # declarations are bound by run(), before the top-level statements
+    def visit_struct_decl_stmt(self, struct_decl): pass
 
-    def visit_fun_decl_stmt(self, fun_decl):
-        new_id = fun_decl.fun_name.lexeme
-        env_id = self.sym_table.get_env_id()
-        self.sym_table.add_id(new_id)
-        self.sym_table.set_info(new_id, [env_id, fun_decl])
+    def visit_fun_decl_stmt(self, fun_decl): pass
+
+    def __bind_struct(self, struct_decl):
+        fields = [var_decl.var_id.lexeme for var_decl in struct_decl.var_decls]
+        layout = heap.StructLayout(struct_decl.struct_id.lexeme, fields)
+        # literal initializers are evaluated once, into the prototype
+        prototype, computed = optimizer.struct_template(struct_decl)
+        computed = [(i, var_decl.var_expr) for i, var_decl in computed]
+        self.frame.values[struct_decl.slot] = [self.frame, struct_decl, layout,
+                                               prototype, computed]
+
+    def __bind_fun(self, fun_decl):
+        memo = None
+        if fun_decl.memoize and self.memo_size > 0:
+            memo = mypl_memo.Memo(fun_decl.fun_name.lexeme, self.memo_size)
+            self.memos.append(memo)
+        self.frame.values[fun_decl.slot] = [self.frame, fun_decl, memo]
 
     def visit_return_stmt(self, return_stmt):
-        return_stmt.return_expr.accept(self)
-        #print(self.current_value)
-        raise ReturnException()
+        if return_stmt.return_expr is None:
+            self.current_value = None
+        else:
+            return_stmt.return_expr.accept(self)
+        # unwinds the enclosing statement lists up to the call
+        self.returning = True
 
     def visit_while_stmt(self, while_stmt):
-        while_stmt.bool_expr.accept(self)
-        if(self.current_value):
+        while True:
+            while_stmt.bool_expr.accept(self)
+            if not self.current_value:
+                break
             while_stmt.stmt_list.accept(self)
-            while_stmt.accept(self)#recursive loop
+            if self.returning:
+                break
 
     def visit_if_stmt(self, if_stmt):
-        canElse = True #has a conditional been passed yet
+        # conditions after the first one that holds are not evaluated
         if_stmt.if_part.bool_expr.accept(self)
         if self.current_value:
-            canElse = False
             if_stmt.if_part.stmt_list.accept(self)
-        elif(canElse):
-            for stmt in if_stmt.elseifs:
-                    stmt.bool_expr.accept(self)
-                    if self.current_value and canElse:
-                        canElse = False
-                        stmt.stmt_list.accept(self)
-        if if_stmt.has_else and canElse:
+            return
+        for basic_if in if_stmt.elseifs:
+            basic_if.bool_expr.accept(self)
+            if self.current_value:
+                basic_if.stmt_list.accept(self)
+                return
+        if if_stmt.has_else:
             if_stmt.else_stmts.accept(self)
 
     def visit_simple_expr(self, simple_expr):
@@ -92,7 +189,11 @@ class Interpreter(ast.Visitor):
         rhs = self.current_value
         math_rel = complex_expr.math_rel.lexeme
         if math_rel == '+':
-            self.current_value = lhs + rhs
+            # appending to a long string builds a rope instead
+            if lhs.__class__ is str and len(lhs) >= mypl_rope.MIN_LENGTH:
+                self.current_value = mypl_rope.rope(lhs) + rhs
+            else:
+                self.current_value = lhs + rhs
         elif math_rel == '-':
             self.current_value = lhs - rhs
         elif math_rel == '*':
@@ -124,169 +225,160 @@ class Interpreter(ast.Visitor):
             elif bool_rel == '!=':
                 self.current_value = lhs != rhs
         if bool_expr.bool_connector != None:#if connected by 'and', 'or'
-            lhs = self.current_value
-            bool_expr.rest.accept(self)
-            if bool_expr.bool_connector.lexeme == 'and':
-                self.current_value = lhs and self.current_value
-            elif bool_expr.bool_connector.lexeme == 'or':
-                self.current_value = lhs or self.current_value
+            # the rest is skipped once the left side decides the result
+            if bool_expr.bool_connector.tokentype == token.AND:
+                if self.current_value:
+                    bool_expr.rest.accept(self)
+            elif not self.current_value:
+                bool_expr.rest.accept(self)
         if bool_expr.negated:
             self.current_value = not self.current_value
 
     def visit_lvalue(self, lval):
-        identifier = lval.path[0].lexeme
-        if len(lval.path) == 1:
-            self.sym_table.set_info(identifier, self.current_value)
+        frame = self.__frame(lval.depth)
+        if lval.index is not None:
+            # an array element: the array, then the index
+            value = self.current_value
+            array = self.__path_value(frame.values[lval.slot], lval.path,
+                                      lval.field_slots)
+            lval.index.accept(self)
+            try:
+                mypl_array.store(array, self.current_value, value)
+            except mypl_array.ArrayError as e:
+                self.__error(str(e), lval.path[0])
+        elif len(lval.path) == 1:
+            frame.values[lval.slot] = self.current_value
         else:
             '''... handle path expressions ...'''
-            oid = self.sym_table.get_info(identifier)
-            struct_obj = self.heap[oid]
-            for path_id in lval.path[1:-1]:
-                identifier = path_id.lexeme
-                oid = struct_obj[identifier]
-                struct_obj = self.heap[oid]
-            identifier = lval.path[-1].lexeme
-            struct_obj[identifier] = self.current_value
+            struct_obj = frame.values[lval.slot]
+            path = lval.path
+            field_slots = lval.field_slots
+            last = len(field_slots) - 1
+            for i in range(last + 1):
+                layout, index = field_slots[i]
+                if struct_obj is None or struct_obj.layout is not layout:
+                    index = self.__field_slot(struct_obj, path[i + 1],
+                                              field_slots, i)
+                if i == last:
+                    struct_obj.values[index] = self.current_value
+                else:
+                    struct_obj = struct_obj.values[index]
             
 
     def visit_fun_param(self, fun_param): pass
 
     def visit_simple_rvalue(self, simple_rvalue):
-        if simple_rvalue.val.tokentype == token.INTVAL:
-            self.current_value = int(simple_rvalue.val.lexeme)
-        elif simple_rvalue.val.tokentype == token.FLOATVAL:
-            self.current_value = float(simple_rvalue.val.lexeme)
-        elif simple_rvalue.val.tokentype == token.BOOLVAL:
-            self.current_value = True
-            if simple_rvalue.val.lexeme == 'false':
-                self.current_value = False
-        elif simple_rvalue.val.tokentype == token.STRINGVAL:
-            self.current_value = simple_rvalue.val.lexeme
-        elif simple_rvalue.val.tokentype == token.NIL:
-            self.current_value = None
+        # decoded once by the optimizer
+        self.current_value = simple_rvalue.value
 
     def visit_new_rvalue(self, new_rvalue):
-        struct_id = new_rvalue.struct_type.lexeme
-        curr_env = self.sym_table.get_env_id()
-        struct_info = self.sym_table.get_info(struct_id)
-        self.sym_table.set_env_id(struct_info[0])
-        struct_obj = {}
-        self.sym_table.push_environment()
-        for decl_stmt in struct_info[1].var_decls:
-            var_id = decl_stmt.var_id.lexeme
-            decl_stmt.var_expr.accept(self)
-            val = self.current_value
-            struct_obj[var_id] = val
-        self.sym_table.pop_environment()
-        self.sym_table.set_env_id(curr_env)
-        oid = id(struct_obj)
-        self.heap[oid] = struct_obj
-        self.current_value = oid
+        struct_info = self.__frame(new_rvalue.depth).values[new_rvalue.slot]
+        values = struct_info[3][:]
+        computed = struct_info[4]
+        if computed:
+            curr_frame = self.frame
+            # field initializers are evaluated where the struct was declared
+            self.frame = struct_info[0]
+            for i, var_expr in computed:
+                var_expr.accept(self)
+                values[i] = self.current_value
+            self.frame = curr_frame
+        self.current_value = self.heap.allocate(struct_info[2], values)
+
+    def visit_new_map_rvalue(self, new_rvalue):
+        self.current_value = {}
+
+    def visit_new_array_rvalue(self, new_rvalue):
+        new_rvalue.length.accept(self)
+        try:
+            self.current_value = mypl_array.new(
+                new_rvalue.elem_type.tokentype, self.current_value)
+        except mypl_array.ArrayError as e:
+            self.__error(str(e), new_rvalue.elem_type)
 
     def visit_call_rvalue(self, call_rvalue):
-        # handle built in functions first
-        built_ins = ['print', 'length', 'get', 'readi', 'reads','readf', 'itof', 'itos', 'ftos', 'stoi', 'stof']
-        if call_rvalue.fun.lexeme in built_ins:
-            self.__built_in_fun_helper(call_rvalue)
-        else:
-            ''' handle user-defined function calls '''
-            fun_id = call_rvalue.fun.lexeme
-            curr_env = self.sym_table.get_env_id()
+        # handle built in functions first (bound by the resolver)
+        built_in = call_rvalue.built_in
+        if built_in is not None:
             arg_vals = []
             for arg in call_rvalue.args:
                 arg.accept(self)
                 arg_vals.append(self.current_value)
-            fun_info = self.sym_table.get_info(fun_id)
-            self.sym_table.set_env_id(fun_info[0])
-            self.sym_table.push_environment()
-            for i, val in enumerate(arg_vals):
-                param_id = fun_info[1].params[i].param_name.lexeme
-                self.sym_table.add_id(param_id)
-                self.sym_table.set_info(param_id, val)
+            if built_in.check_nil and None in arg_vals:
+                self.__error('NIL value found in argument', call_rvalue.fun)
+            if built_in.string_params:
+                mypl_rope.materialize(arg_vals, built_in.string_params)
             try:
-                fun_info[1].stmt_list.accept(self)
-            except ReturnException:
-                pass
-            if(fun_info[1].return_type.tokentype == token.NIL):
+                if built_in.runtime:
+                    self.current_value = built_in.function(self, *arg_vals)
+                else:
+                    self.current_value = built_in.function(*arg_vals)
+            except builtins.BuiltInError as e:
+                self.__error(str(e), call_rvalue.fun)
+        elif call_rvalue.tail_call:
+            # the running call starts over with these arguments (in its
+            # own frame) once the return unwinds to it
+            args = []
+            for arg in call_rvalue.args:
+                arg.accept(self)
+                args.append(self.current_value)
+            self.tail_args = args
+            self.returning = True
+        else:
+            ''' handle user-defined function calls '''
+            decl_frame, fun_decl, memo = \
+                self.__frame(call_rvalue.depth).values[call_rvalue.slot]
+            # one frame per call, on top of the declaring frame; the
+            # arguments go straight into the parameter slots
+            frame = Frame(fun_decl.frame_size, decl_frame)
+            values = frame.values
+            i = 0
+            for arg in call_rvalue.args:
+                arg.accept(self)
+                values[i] = self.current_value
+                i += 1
+            if memo is not None:
+                args_key = mypl_memo.key(values[:i])
+                value = memo.get(args_key)
+                if value is not mypl_memo.MISSING:
+                    self.current_value = value
+                    return
+            curr_frame = self.frame
+            self.frame = frame
+            try:
+                while True:
+                    fun_decl.stmt_list.accept(self)
+                    args = self.tail_args
+                    if args is None:
+                        break
+                    # every other slot is assigned before it is read again
+                    values[:len(args)] = args
+                    self.tail_args = None
+                    self.returning = False
+            except RecursionError:
+                # MyPL calls nest Python calls (the VM does not)
+                self.__error('call stack overflow', call_rvalue.fun)
+            self.frame = curr_frame
+            self.returning = False
+            if fun_decl.return_type.tokentype == token.NIL:
                 self.current_value = None
-            self.sym_table.pop_environment()
-            self.sym_table.set_env_id(curr_env)
+            elif memo is not None:
+                memo.put(args_key, self.current_value)
 
 
     def visit_id_rvalue(self, id_rvalue): 
-        identifier = id_rvalue.path[0].lexeme
-        var_val = self.sym_table.get_info(identifier)
+        var_val = self.__frame(id_rvalue.depth).values[id_rvalue.slot]
         if len(id_rvalue.path) == 1:
             self.current_value = var_val
         else:
             '''... handle path expressions ...'''
-            oid = self.sym_table.get_info(identifier)
-            struct_obj = self.heap[oid]
-            for path_id in id_rvalue.path[1:-1]:
-                identifier = path_id.lexeme
-                oid = struct_obj[identifier]
-                struct_obj = self.heap[oid]
-            identifier = id_rvalue.path[-1].lexeme
-            #print(struct_obj)
-            var_val = struct_obj[identifier]
-            self.current_value = var_val
-
-    def __built_in_fun_helper(self, call_rvalue):
-        fun_name = call_rvalue.fun.lexeme
-        arg_vals = []
-        '''... evaluate each call argument and store in arg_vals ...'''
-        for expr in call_rvalue.args:
-            expr.accept(self)
-            arg_vals.append(self.current_value)
-        # check for nil values
-        for i, arg in enumerate(arg_vals):
-            if arg is None:
-                self.__error('NIL value found in argument', call_rvalue.fun)
-        # perform each function
-        if fun_name == 'print':
-            arg_vals[0] = arg_vals[0].replace(r'\n','\n')
-            print(arg_vals[0], end='')
-        elif fun_name == 'length':
-            self.current_value = len(arg_vals[0])
-        elif fun_name == 'get':
-            if 0 <= arg_vals[0] < len(arg_vals[1]):
-                self.current_value = arg_vals[1][arg_vals[0]]
-            else:
-                self.__error('Out of range Error', call_rvalue.fun)
-        elif fun_name == 'reads':
-            self.current_value = input()
-        elif fun_name == 'readi':
-            try:
-                self.current_value = int(input())
-            except ValueError:
-                self.__error('bad int value', call_rvalue.fun)
-        elif fun_name == 'readf':
-            try:
-                self.current_value = float(input())
-            except ValueError:
-                self.__error('bad float value', call_rvalue.fun)
-        elif fun_name == 'itof':
-            try:
-                self.current_value = float(arg_vals[0])
-            except ValueError:
-                self.__error('bad float value', call_rvalue.fun)   
-        elif fun_name == 'stof':
-            try:
-                self.current_value = float(arg_vals[0])
-            except ValueError:
-                self.__error('bad float value', call_rvalue.fun) 
-        elif fun_name == 'itos':
-            try:
-                self.current_value = str(arg_vals[0])
-            except ValueError:
-                self.__error('bad string value', call_rvalue.fun)
-        elif fun_name == 'ftos':
-            try:
-                self.current_value = str(arg_vals[0])
-            except ValueError:
-                self.__error('bad string value', call_rvalue.fun)
-        elif fun_name == 'stoi':
+            self.current_value = self.__path_value(var_val, id_rvalue.path,
+                                                   id_rvalue.field_slots)
+        if id_rvalue.index is not None:
+            array = self.current_value
+            id_rvalue.index.accept(self)
             try:
-                self.current_value = int(arg_vals[0])
-            except ValueError:
-                self.__error('bad int value', call_rvalue.fun) 
\ No newline at end of file
+                self.current_value = mypl_array.load(array,
+                                                     self.current_value)
+            except mypl_array.ArrayError as e:
+                self.__error(str(e), id_rvalue.path[0])
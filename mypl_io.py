@@ -0,0 +1,156 @@
+import codecs
+import re
+import sys
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+FIELD_RE = re.compile(r'\s*(\S*)')
+
+
+class Output(object):
+    """The output channel of a running MyPL program.
+
+    Writes are collected in a buffer that is written to the sink in one
+    piece once it holds buffer_size characters, when flush() is called
+    (the program's flush() built-in, or before reading input), and when
+    the program finishes. The sink is any object with write() (a file,
+    io.StringIO, ...); by default it is whatever sys.stdout is when the
+    buffer is flushed. A line buffered channel also flushes after every
+    write that contains a newline, which is the default when stdout is
+    a terminal.
+    """
+
+    def __init__(self, sink=None, buffer_size=DEFAULT_BUFFER_SIZE,
+                 line_buffered=None):
+        self.sink = sink
+        self.buffer_size = buffer_size
+        if line_buffered is None:
+            target = sys.stdout if sink is None else sink
+            try:
+                line_buffered = target.isatty()
+            except (AttributeError, ValueError):
+                line_buffered = False
+        self.line_buffered = line_buffered
+        self.parts = []             # pending strings
+        self.size = 0               # characters in parts
+        self.written = 0            # characters flushed so far
+
+    def write(self, s):
+        self.parts.append(s)
+        self.size += len(s)
+        if self.size >= self.buffer_size or \
+           (self.line_buffered and '\n' in s):
+            self.flush()
+
+    def flush(self):
+        """writes out the buffered output"""
+        sink = sys.stdout if self.sink is None else self.sink
+        if self.parts:
+            sink.write(''.join(self.parts))
+            self.written += self.size
+            self.parts = []
+            self.size = 0
+        if hasattr(sink, 'flush'):
+            sink.flush()
+
+
+class Input(object):
+    """The input channel of a running MyPL program.
+
+    Input is read from the source in chunks of up to chunk_size bytes
+    and handed out a line or a whitespace separated field at a time. The
+    source is any file-like object (by default, whatever sys.stdin is at
+    the first read). A chunk read never waits for more than is available,
+    so interactive input still works a line at a time. Reading past the
+    end of the input returns None instead of raising.
+    """
+
+    def __init__(self, source=None, chunk_size=DEFAULT_BUFFER_SIZE):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.buffer = ''            # text read but not yet consumed
+        self.pos = 0                # start of the unconsumed text
+        self.at_eof = False         # the source is exhausted
+        self.decoder = None         # for sources read as bytes
+        self.last_split = (None, [])    # (string, fields) of split()
+
+    def __fill(self):
+        """reads the next chunk of the source; returns False at EOF"""
+        if self.at_eof:
+            return False
+        source = sys.stdin if self.source is None else self.source
+        raw = getattr(source, 'buffer', None)
+        if raw is not None and hasattr(raw, 'read1'):
+            if self.decoder is None:
+                encoding = getattr(source, 'encoding', None) or 'utf-8'
+                self.decoder = codecs.getincrementaldecoder(encoding)()
+            data = raw.read1(self.chunk_size)
+            text = self.decoder.decode(data, not data)
+        else:
+            data = text = source.read(self.chunk_size)
+        if not data:
+            self.at_eof = True
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return not self.at_eof or text != ''
+
+    def eof(self):
+        """true if there is nothing left to read"""
+        while self.pos >= len(self.buffer):
+            if not self.__fill():
+                return True
+        return False
+
+    def readline(self):
+        """returns the next line (without its line ending), or None"""
+        end = self.buffer.find('\n', self.pos)
+        while end == -1:
+            searched = len(self.buffer) - self.pos
+            if not self.__fill():
+                break
+            end = self.buffer.find('\n', searched)
+        if end == -1:
+            # the last line, if it has no line ending
+            if self.pos >= len(self.buffer):
+                return None
+            line = self.buffer[self.pos:]
+            self.pos = len(self.buffer)
+        else:
+            line = self.buffer[self.pos:end]
+            self.pos = end + 1
+        if line.endswith('\r'):
+            line = line[:-1]
+        return line
+
+    def readfield(self):
+        """returns the next whitespace separated field, or None"""
+        while True:
+            match = FIELD_RE.match(self.buffer, self.pos)
+            # a field that reaches the end of the buffer may continue in
+            # the next chunk
+            if match.end() < len(self.buffer) or self.at_eof:
+                break
+            if not self.__fill():
+                match = FIELD_RE.match(self.buffer, self.pos)
+                break
+        self.pos = match.end()
+        field = match.group(1)
+        return field if field else None
+
+    def readfields(self, count):
+        """returns a list of the next count fields (fewer at the end of
+        the input)"""
+        fields = []
+        while len(fields) < count:
+            field = self.readfield()
+            if field is None:
+                break
+            fields.append(field)
+        return fields
+
+    def split(self, s):
+        """returns the whitespace separated fields of s (the fields of
+        the last string split are kept, for repeated field lookups)"""
+        if self.last_split[0] is not s:
+            self.last_split = (s, s.split())
+        return self.last_split[1]
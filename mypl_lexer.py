@@ -1,191 +1,118 @@
+import re
 import mypl_token as token
 import mypl_error as error
 
+# characters that end an identifier or a number
+DELIMITERS = '=:,/.><!()[]-%*+;'
+
+KEYWORDS = {
+    'bool': token.BOOLTYPE, 'int': token.INTTYPE,
+    'float': token.FLOATTYPE, 'string': token.STRINGTYPE,
+    'struct': token.STRUCTTYPE,
+    'and': token.AND, 'or': token.OR,
+    'not': token.NOT, 'while': token.WHILE, 'do': token.DO,
+    'if': token.IF, 'then': token.THEN, 'else': token.ELSE,
+    'elif': token.ELIF, 'end': token.END, 'fun': token.FUN,
+    'var': token.VAR, 'set': token.SET, 'return': token.RETURN,
+    'new': token.NEW, 'nil': token.NIL, 'true': token.BOOLVAL,
+    'false': token.BOOLVAL,
+}
+
+SYMBOLS = {
+    '=': token.ASSIGN, ':': token.COLON, ',': token.COMMA,
+    '/': token.DIVIDE, '.': token.DOT, '>': token.GREATER_THAN,
+    '<': token.LESS_THAN, '(': token.LPAREN, ')': token.RPAREN,
+    '-': token.MINUS, '%': token.MODULO, '*': token.MULTIPLY,
+    '+': token.PLUS, ';': token.SEMICOLON, '[': token.LBRACKET,
+    ']': token.RBRACKET,
+}
+
+DOUBLE_SYMBOLS = {
+    '==': token.EQUAL, '!=': token.NOT_EQUAL,
+    '<=': token.LESS_THAN_EQUAL, '>=': token.GREATER_THAN_EQUAL,
+}
+
+# characters allowed right after a number
+NUMBER_FOLLOW = frozenset(DELIMITERS + ' \n')
+
+SKIP_RE = re.compile(r'(?:\s+|#[^\n]*)*')
+WORD_RE = re.compile(r'[^\s' + re.escape(DELIMITERS) + r']*')
+DIGITS_RE = re.compile(r'\d*')
+
 class Lexer(object):
     def __init__(self, input_stream):
-        """initializes line and column number and input stream"""
+        """reads the whole input stream and initializes line and column"""
+        self.text = input_stream.read()
+        self.pos = 0            # index of the next unread char
         self.line = 1
+        self.line_start = 0     # index of the first char of the line
         self.column = 0
-        self.input_stream = input_stream
-
-    def __peek(self):
-        """returns the next char in the file while keeping place in stream"""
-        pos = self.input_stream.tell()
-        symbol = self.input_stream.read(1)
-        self.input_stream.seek(pos)
-        return symbol
-
-    def __read(self):
-        """reads a single char from input file"""
-        self.column += 1
-        return self.input_stream.read(1)
-
-    def __parse_space(self):
-        """ Reads space whie counting newline char"""
-        while self.__peek().isspace():
-            if(self.__peek()  == '\n'):
-                self.line += 1
-                self.column = -1
-            self.__read()
 
-    def __parse_command(self):
-        """Reads and returns a sequence of alpha characters"""
-        command = ''
-        while self.__peek().isalpha():
-            command += self.__read()
-        return command
+    def __skip(self):
+        """skips spaces and comments while counting newline chars"""
+        text = self.text
+        start = self.pos
+        end = SKIP_RE.match(text, start).end()
+        newlines = text.count('\n', start, end)
+        if newlines:
+            self.line += newlines
+            self.line_start = text.rfind('\n', start, end) + 1
+        self.pos = end
 
-    def __parse_num(self):
-        """Reads and returns a sequence of digit characters"""
-        number = ''
-        while self.__peek().isdigit():
-            number += self.__read()
-        return number
-        
     def next_token(self):
         """ Creates  and returns token while checking for formatting errors"""
-        #tokenType = ''
-        #lexeme = ''
-        self.__parse_space()#ignore spaces
-        currCol = self.column + 1
-        currLine = self.line
-        if(not self.__peek()):#handles eos
-            return token.Token(token.EOS, "", self.line, self.column)
-        elif(self.__peek() == '#'):#handles comments by reading entire line
-            self.input_stream.readline()
-            self.column = 0
-            self.line += 1
-            return self.next_token()
-        elif(self.__peek().isalpha()):#handles all symbols with letters
-            lexeme = self.__parse_command() 
-            while(self.__peek() not in {'=',':',',','/','.','=','>','<','!','(',')','-','%','*','+',';'}):
-                if(not self.__peek().isspace()):
-                    lexeme += self.__read()
-                else:
-                    break
-            if(lexeme == 'bool'):
-                tokenType = token.BOOLTYPE
-            elif(lexeme == 'int'):
-                tokenType = token.INTTYPE
-            elif(lexeme == 'float'):
-                tokenType = token.FLOATTYPE
-            elif(lexeme == 'string'):
-                tokenType = token.STRINGTYPE
-            elif(lexeme == 'struct'):
-                tokenType = token.STRUCTTYPE
-            elif(lexeme == 'and'):
-                tokenType = token.AND
-            elif(lexeme == 'or'):
-                tokenType = token.OR
-            elif(lexeme == 'not'):
-                tokenType = token.NOT
-            elif(lexeme == 'while'):
-                tokenType = token.WHILE
-            elif(lexeme == 'do'):
-                tokenType = token.DO
-            elif(lexeme == 'if'):
-                tokenType = token.IF
-            elif(lexeme == 'then'):
-                tokenType = token.THEN
-            elif(lexeme == 'else'):
-                tokenType = token.ELSE
-            elif(lexeme == 'elif'):
-                tokenType = token.ELIF
-            elif(lexeme == 'end'):
-                tokenType = token.END
-            elif(lexeme == 'fun'):
-                tokenType = token.FUN
-            elif(lexeme == 'var'):
-                tokenType = token.VAR
-            elif(lexeme == 'set'):
-                tokenType = token.SET
-            elif(lexeme == 'return'):
-                tokenType = token.RETURN
-            elif(lexeme == 'new'):
-                tokenType = token.NEW
-            elif(lexeme == 'nil'):
-                tokenType = token.NIL
-            elif(lexeme == 'true' or lexeme == 'false'):
-                tokenType = token.BOOLVAL
-            else:#check if variable ID has more non-alpha chars
-                tokenType = token.ID
-                while(self.__peek() not in {'=',':',',','/','.','=','>','<','!','(',')','-','%','*','+',';'}):
-                    if(not self.__peek().isspace()):
-                        lexeme += self.__read()
-                    else:
-                        break
-        elif(self.__peek().isdigit()): #Handles int and float values
-            lexeme = self.__parse_num()
-            if(len(lexeme) > 1 and lexeme[0:1] == '0'):
-                raise error.MyPLError("invalid number value", currLine, currCol)
-            if(self.__peek() == '.'):#Indicating float value
-                lexeme += self.__read()
-                floatVal = self.__parse_num()
-                if(floatVal == "" or (len(floatVal) > 1 and floatVal[len(floatVal) - 1] == '0')):#test this
-                    raise error.MyPLError("invalid float value", currLine, currCol)
-                else:
-                    lexeme = lexeme + floatVal
-                    tokenType = token.FLOATVAL
-            else:#int val
-                tokenType = token.INTVAL
-            if(self.__peek() not in {'=',':',',','/','.','=','>','<','!','(',')','-','%','*','+',';',' ','\n'}):
-                raise error.MyPLError("invalid number value", currLine, currCol)
-        elif(self.__peek() == '"'):#handles strings with " only (not ')
-            self.__read()#read symbol '"'
-            lexeme = ''
-            tokenType = token.STRINGVAL
-            while(self.__peek() != '"'):
-                if(self.__peek() == '\n'):
-                    raise error.MyPLError("invalid string", currLine, currCol) 
-                else:
-                    lexeme += self.__read()   
-            self.__read()#read end string symbol '"' 
-        elif(self.__peek() in {'=',':',',','/','.','=','>','<','!','(',')','-','%','*','+',';'}):#hendles symbols
-            lexeme = self.__read()
-            if(lexeme == '='):
-                if (self.__peek() == '='):
-                    lexeme += self.__read()
-                    tokenType = token.EQUAL
-                else:
-                    tokenType = token.ASSIGN
-            elif(lexeme == '!'): #handles not equal
-                if(self.__peek() != '='):
-                    raise error.MyPLError("invalid symbol", currLine, currCol)
-                else:
-                    lexeme += self.__read()
-                    tokenType = token.NOT_EQUAL
-            elif(lexeme == '<' or lexeme == '>'):#Handles conditionals
-                if(self.__peek() != '='):
-                    if(lexeme == '<'):
-                        tokenType = token.LESS_THAN
-                    else:
-                        tokenType = token.GREATER_THAN
-                else:
-                    lexeme += self.__read()
-                    if(lexeme == '<='):
-                        tokenType = token.LESS_THAN_EQUAL
-                    else:
-                        tokenType = token.GREATER_THAN_EQUAL
-            elif(lexeme == ':'):
-                tokenType = token.COLON
-            elif(lexeme == ','):
-                tokenType = token.COMMA
-            elif(lexeme == '/'):
-                tokenType = token.DIVIDE
-            elif(lexeme == '.'):
-                tokenType = token.DOT
-            elif(lexeme == '('):
-                tokenType = token.LPAREN
-            elif(lexeme == ')'):
-                tokenType = token.RPAREN
-            elif(lexeme == '-'):
-                tokenType = token.MINUS
-            elif(lexeme == '%'):
-                tokenType = token.MODULO
-            elif(lexeme == '*'):
-                tokenType = token.MULTIPLY
-            elif(lexeme == '+'):
-                tokenType = token.PLUS
-            elif(lexeme == ';'):
-                tokenType = token.SEMICOLON
-        return token.Token(tokenType, lexeme, currLine, currCol)
\ No newline at end of file
+        self.__skip()
+        text = self.text
+        pos = self.pos
+        curr_line = self.line
+        curr_col = pos - self.line_start + 1
+        if pos >= len(text):#handles eos
+            self.column = curr_col - 1
+            return token.Token(token.EOS, '', curr_line, self.column)
+        symbol = text[pos]
+        if symbol.isalpha():#keywords and identifiers
+            end = WORD_RE.match(text, pos + 1).end()
+            lexeme = text[pos:end]
+            tokentype = KEYWORDS.get(lexeme, token.ID)
+        elif symbol.isdigit():#int and float values
+            end = DIGITS_RE.match(text, pos).end()
+            if end - pos > 1 and symbol == '0':
+                raise error.MyPLError('invalid number value', curr_line,
+                                      curr_col)
+            tokentype = token.INTVAL
+            if text.startswith('.', end):#indicating float value
+                frac_end = DIGITS_RE.match(text, end + 1).end()
+                frac = text[end + 1:frac_end]
+                if frac == '' or (len(frac) > 1 and frac[-1] == '0'):
+                    raise error.MyPLError('invalid float value', curr_line,
+                                          curr_col)
+                end = frac_end
+                tokentype = token.FLOATVAL
+            if text[end:end + 1] not in NUMBER_FOLLOW:
+                raise error.MyPLError('invalid number value', curr_line,
+                                      curr_col)
+            lexeme = text[pos:end]
+        elif symbol == '"':#strings with " only (not ')
+            end = text.find('"', pos + 1)
+            newline = text.find('\n', pos + 1, end if end != -1 else len(text))
+            if end == -1 or newline != -1:
+                raise error.MyPLError('invalid string', curr_line, curr_col)
+            lexeme = text[pos + 1:end]
+            if '\\' in lexeme:
+                # decoded once here rather than each time it is printed
+                lexeme = lexeme.replace('\\n', '\n')
+            end += 1
+            tokentype = token.STRINGVAL
+        elif text[pos:pos + 2] in DOUBLE_SYMBOLS:
+            end = pos + 2
+            lexeme = text[pos:end]
+            tokentype = DOUBLE_SYMBOLS[lexeme]
+        elif symbol in SYMBOLS:
+            end = pos + 1
+            lexeme = symbol
+            tokentype = SYMBOLS[symbol]
+        else:
+            raise error.MyPLError('invalid symbol', curr_line, curr_col)
+        self.pos = end
+        self.column = end - self.line_start
+        return token.Token(tokentype, lexeme, curr_line, curr_col)
@@ -0,0 +1,226 @@
+import collections
+import mypl_ast as ast
+import mypl_token as token
+import mypl_builtins as builtins
+
+# results cached per memoized function, unless configured otherwise
+DEFAULT_SIZE = 1024
+
+# the only parameter and result types of memoized functions
+PRIMITIVE_TYPES = (token.INTTYPE, token.FLOATTYPE, token.BOOLTYPE,
+                   token.STRINGTYPE)
+
+# returned by Memo.get() for arguments without a cached result
+MISSING = object()
+
+def key(args):
+    """returns the cache key of a sequence of argument values (their
+    types are part of it, so 1, 1.0 and true are different arguments,
+    and floats are keyed on their repr, so 0.0 and -0.0 are too)"""
+    return tuple([repr(arg) if type(arg) is float else arg
+                  for arg in args]) + tuple(map(type, args))
+
+def memoize(function, memo):
+    """returns a function that caches the results of function in memo"""
+    def memoized(*args):
+        args_key = key(args)
+        value = memo.get(args_key)
+        if value is MISSING:
+            value = function(*args)
+            memo.put(args_key, value)
+        return value
+    return memoized
+
+
+class Memo(object):
+    """The cached results of one pure function, by argument values. Once
+    it holds size results, storing another evicts the least recently
+    used one."""
+    __slots__ = ('name', 'size', 'results', 'hits', 'misses', 'evictions')
+
+    def __init__(self, name, size=DEFAULT_SIZE):
+        self.name = name
+        self.size = size
+        self.results = collections.OrderedDict()    # key -> result
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, args_key):
+        """returns the result cached for args_key, or MISSING"""
+        value = self.results.get(args_key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(args_key)
+        return value
+
+    def put(self, args_key, value):
+        results = self.results
+        results[args_key] = value
+        if len(results) > self.size:
+            results.popitem(last=False)
+            self.evictions += 1
+
+    def __str__(self):
+        return ('memo %s: %i hits, %i misses, %i evictions, %i cached' %
+                (self.name, self.hits, self.misses, self.evictions,
+                 len(self.results)))
+
+
+class PurityAnalyzer(ast.Visitor):
+    """A MyPL visitor that finds the functions whose calls can be
+    memoized and sets FunDeclStmt.memoize on them.
+
+    A function is pure if its result depends only on its arguments and
+    a call has no other effect: it only uses its own parameters and
+    variables, assigns no struct fields, and calls only pure built-ins
+    and pure functions (creating a struct calls its field initializers,
+    which must be pure as well). Functions that call each other are pure
+    unless one of them is shown not to be. A pure function is memoized
+    if its parameters and result all have primitive types.
+    """
+
+    def __init__(self, built_ins=None):
+        self.built_ins = built_ins or builtins.default
+        self.scopes = []        # stack of {names declared}, of one unit
+        self.pure = True        # no effects found in the unit so far
+        self.callees = set()    # ('fun' or 'new', name) used by the unit
+        self.functions = set()  # names of the functions declared
+
+    def analyze(self, stmt_list):
+        names = collections.Counter()
+        for stmt in stmt_list.stmts:
+            if isinstance(stmt, ast.FunDeclStmt):
+                names[stmt.fun_name.lexeme] += 1
+                self.functions.add(stmt.fun_name.lexeme)
+            elif isinstance(stmt, ast.StructDeclStmt):
+                names[stmt.struct_id.lexeme] += 1
+            elif isinstance(stmt, ast.VarDeclStmt):
+                names[stmt.var_id.lexeme] += 1
+        # the callees of each function and struct, or None if it has
+        # effects of its own (or its name is declared more than once)
+        units = {}
+        for stmt in stmt_list.stmts:
+            if isinstance(stmt, ast.FunDeclStmt):
+                name = stmt.fun_name.lexeme
+                params = [param.param_name.lexeme for param in stmt.params]
+                units['fun', name] = self.__unit(names[name], params,
+                                                 [stmt.stmt_list])
+            elif isinstance(stmt, ast.StructDeclStmt):
+                name = stmt.struct_id.lexeme
+                exprs = [var_decl.var_expr for var_decl in stmt.var_decls]
+                units['new', name] = self.__unit(names[name], [], exprs)
+        pure = set(unit for unit in units if units[unit] is not None)
+        changed = True
+        while changed:
+            changed = False
+            for unit in list(pure):
+                if not units[unit] <= pure:
+                    pure.discard(unit)
+                    changed = True
+        for stmt in stmt_list.stmts:
+            if isinstance(stmt, ast.FunDeclStmt):
+                stmt.memoize = ('fun', stmt.fun_name.lexeme) in pure and \
+                    self.__primitive(stmt)
+
+    def __unit(self, declarations, params, nodes):
+        """returns the callees of a function body or struct initializers
+        (nodes), or None if they have effects"""
+        if declarations != 1:
+            return None
+        self.scopes = [set(params)]
+        self.pure = True
+        self.callees = set()
+        for node in nodes:
+            node.accept(self)
+        self.scopes = []
+        return self.callees if self.pure else None
+
+    def __primitive(self, fun_decl):
+        for param in fun_decl.params:
+            if param.param_type.tokentype not in PRIMITIVE_TYPES:
+                return False
+        return fun_decl.return_type.tokentype in PRIMITIVE_TYPES
+
+    def __local(self, name):
+        for scope in self.scopes:
+            if name in scope:
+                return True
+        return False
+
+    def visit_stmt_list(self, stmt_list):
+        self.scopes.append(set())
+        for stmt in stmt_list.stmts:
+            stmt.accept(self)
+        self.scopes.pop()
+
+    def visit_expr_stmt(self, expr_stmt):
+        expr_stmt.expr.accept(self)
+
+    def visit_var_decl_stmt(self, var_decl):
+        # the initializer is evaluated before the variable is in scope
+        var_decl.var_expr.accept(self)
+        self.scopes[-1].add(var_decl.var_id.lexeme)
+
+    def visit_assign_stmt(self, assign_stmt):
+        assign_stmt.rhs.accept(self)
+        assign_stmt.lhs.accept(self)
+
+    def visit_return_stmt(self, return_stmt):
+        if return_stmt.return_expr is not None:
+            return_stmt.return_expr.accept(self)
+
+    def visit_while_stmt(self, while_stmt):
+        while_stmt.bool_expr.accept(self)
+        while_stmt.stmt_list.accept(self)
+
+    def visit_if_stmt(self, if_stmt):
+        for basic_if in [if_stmt.if_part] + if_stmt.elseifs:
+            basic_if.bool_expr.accept(self)
+            basic_if.stmt_list.accept(self)
+        if if_stmt.has_else:
+            if_stmt.else_stmts.accept(self)
+
+    def visit_simple_expr(self, simple_expr):
+        simple_expr.term.accept(self)
+
+    def visit_complex_expr(self, complex_expr):
+        complex_expr.first_operand.accept(self)
+        complex_expr.rest.accept(self)
+
+    def visit_bool_expr(self, bool_expr):
+        bool_expr.first_expr.accept(self)
+        if bool_expr.second_expr is not None:
+            bool_expr.second_expr.accept(self)
+        if bool_expr.rest is not None:
+            bool_expr.rest.accept(self)
+
+    def visit_lvalue(self, lval):
+        # struct fields and arrays may be shared with the caller
+        if len(lval.path) > 1 or lval.index is not None or \
+           not self.__local(lval.path[0].lexeme):
+            self.pure = False
+
+    def visit_new_rvalue(self, new_rvalue):
+        self.callees.add(('new', new_rvalue.struct_type.lexeme))
+
+    def visit_new_array_rvalue(self, new_rvalue):
+        new_rvalue.length.accept(self)
+
+    def visit_call_rvalue(self, call_rvalue):
+        for arg in call_rvalue.args:
+            arg.accept(self)
+        name = call_rvalue.fun.lexeme
+        built_in = self.built_ins.lookup(name, self.functions)
+        if built_in is None:
+            self.callees.add(('fun', name))
+        elif not built_in.pure:
+            self.pure = False
+
+    def visit_id_rvalue(self, id_rvalue):
+        if not self.__local(id_rvalue.path[0].lexeme):
+            self.pure = False
+        if id_rvalue.index is not None:
+            id_rvalue.index.accept(self)
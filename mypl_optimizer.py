@@ -0,0 +1,313 @@
+import mypl_token as token
+import mypl_ast as ast
+
+# strings longer than this (e.g., "ab" * 100000000) are not folded
+MAX_FOLDED_STRING = 4096
+
+def literal_value(the_token):
+    """returns the Python value of a literal token"""
+    if the_token.tokentype == token.INTVAL:
+        return int(the_token.lexeme)
+    elif the_token.tokentype == token.FLOATVAL:
+        return float(the_token.lexeme)
+    elif the_token.tokentype == token.BOOLVAL:
+        return the_token.lexeme == 'true'
+    elif the_token.tokentype == token.STRINGVAL:
+        return the_token.lexeme
+    return None
+
+def literal_token(value, position):
+    """returns a literal token for value, located at the token position"""
+    if isinstance(value, bool):
+        tokentype, lexeme = token.BOOLVAL, 'true' if value else 'false'
+    elif isinstance(value, int):
+        tokentype, lexeme = token.INTVAL, str(value)
+    elif isinstance(value, float):
+        tokentype, lexeme = token.FLOATVAL, repr(value)
+    elif isinstance(value, str):
+        tokentype, lexeme = token.STRINGVAL, value
+    else:
+        tokentype, lexeme = token.NIL, 'nil'
+    return token.Token(tokentype, lexeme, position.line, position.column)
+
+def constant_expr(value, position):
+    """returns a SimpleExpr node holding the constant value"""
+    rvalue = ast.SimpleRValue()
+    rvalue.val = literal_token(value, position)
+    rvalue.value = value
+    expr = ast.SimpleExpr()
+    expr.term = rvalue
+    return expr
+
+def constant(expr):
+    """returns (True, value) if expr is a literal, else (False, None)"""
+    if isinstance(expr, ast.SimpleExpr) and \
+       isinstance(expr.term, ast.SimpleRValue):
+        return True, expr.term.value
+    return False, None
+
+def struct_template(struct_decl):
+    """returns the prototype of an optimized struct declaration's
+    instances, a list with the value of each field whose initializer is
+    a literal (None for the others), and the (index, VarDeclStmt) of
+    every field that must be initialized per instance"""
+    prototype = []
+    computed = []
+    for i, var_decl in enumerate(struct_decl.var_decls):
+        is_const, value = constant(var_decl.var_expr)
+        prototype.append(value)
+        if not is_const:
+            computed.append((i, var_decl))
+    return prototype, computed
+
+def math_op(math_rel, lhs, rhs):
+    """applies a math operator exactly as the interpreter does"""
+    if math_rel == '+':
+        return lhs + rhs
+    elif math_rel == '-':
+        return lhs - rhs
+    elif math_rel == '*':
+        return lhs * rhs
+    elif math_rel == '/':
+        if isinstance(lhs, int):
+            return lhs // rhs
+        return lhs / rhs
+    elif math_rel == '%':
+        return lhs % rhs
+
+def string_length(math_rel, lhs, rhs):
+    """returns the length of the string a math operator would build from
+    lhs and rhs, or 0 if it builds no string (without building it); a
+    format (%) may be any length"""
+    if math_rel == '%' and isinstance(lhs, str):
+        return float('inf')
+    elif math_rel == '+' and isinstance(lhs, str) and isinstance(rhs, str):
+        return len(lhs) + len(rhs)
+    elif math_rel == '*':
+        if isinstance(lhs, str) and type(rhs) is int:
+            return len(lhs) * max(rhs, 0)
+        elif type(lhs) is int and isinstance(rhs, str):
+            return max(lhs, 0) * len(rhs)
+    return 0
+
+def bool_rel_op(bool_rel, lhs, rhs):
+    """applies a Boolean relation exactly as the interpreter does"""
+    if bool_rel == '==':
+        return lhs == rhs
+    elif bool_rel == '<=':
+        return lhs <= rhs
+    elif bool_rel == '<':
+        return lhs < rhs
+    elif bool_rel == '>=':
+        return lhs >= rhs
+    elif bool_rel == '>':
+        return lhs > rhs
+    elif bool_rel == '!=':
+        return lhs != rhs
+
+
+class Optimizer(ast.Visitor):
+    """A MyPL visitor that rewrites a parsed program before it runs.
+
+    Every literal is decoded once into SimpleRValue.value, so evaluating
+    it no longer parses its lexeme. Complex and Boolean expressions whose
+    operands are all literals are folded into a single literal, as is an
+    and/or whose left side is a literal that decides the result. A
+    subexpression is left alone if evaluating it would fail (e.g., a
+    division by zero or a nil operand), so the error is still reported
+    when and where the program reaches it. Running the pass more than
+    once is harmless.
+
+    Calls of a function to itself in tail position (the value of a
+    return statement, or the last statement of a function without a
+    result) are marked, so back ends can run them without a new frame.
+    """
+
+    def __init__(self):
+        # replacement for the last expression visited
+        self.current_expr = None
+
+    def optimize(self, stmt_list):
+        stmt_list.accept(self)
+
+    def __fold(self, expr):
+        """returns expr with its constant subexpressions folded"""
+        expr.accept(self)
+        return self.current_expr
+
+    def visit_stmt_list(self, stmt_list):
+        for stmt in stmt_list.stmts:
+            stmt.accept(self)
+
+    def visit_expr_stmt(self, expr_stmt):
+        expr_stmt.expr = self.__fold(expr_stmt.expr)
+
+    def visit_var_decl_stmt(self, var_decl):
+        var_decl.var_expr = self.__fold(var_decl.var_expr)
+
+    def visit_assign_stmt(self, assign_stmt):
+        assign_stmt.rhs = self.__fold(assign_stmt.rhs)
+        assign_stmt.lhs.accept(self)
+
+    def visit_struct_decl_stmt(self, struct_decl):
+        for var_decl in struct_decl.var_decls:
+            var_decl.accept(self)
+
+    def visit_fun_decl_stmt(self, fun_decl):
+        fun_decl.stmt_list.accept(self)
+        name = fun_decl.fun_name.lexeme
+        self.__mark_tail_returns(fun_decl.stmt_list, name)
+        if fun_decl.return_type.tokentype == token.NIL:
+            self.__mark_tail_stmt(fun_decl.stmt_list, name)
+
+    def __self_call(self, expr, name):
+        """returns expr if it is a call of the function name, else None"""
+        if isinstance(expr, ast.SimpleExpr):
+            expr = expr.term
+        if isinstance(expr, ast.CallRValue) and expr.fun.lexeme == name:
+            return expr
+        return None
+
+    def __mark_tail_returns(self, stmt_list, name):
+        """marks 'return name(...)' anywhere in stmt_list"""
+        for stmt in stmt_list.stmts:
+            if isinstance(stmt, ast.ReturnStmt):
+                call = self.__self_call(stmt.return_expr, name)
+                if call is not None:
+                    call.tail_call = True
+            elif isinstance(stmt, ast.WhileStmt):
+                self.__mark_tail_returns(stmt.stmt_list, name)
+            elif isinstance(stmt, ast.IfStmt):
+                for basic_if in [stmt.if_part] + stmt.elseifs:
+                    self.__mark_tail_returns(basic_if.stmt_list, name)
+                self.__mark_tail_returns(stmt.else_stmts, name)
+
+    def __mark_tail_stmt(self, stmt_list, name):
+        """marks a call of name that is the last statement run in
+        stmt_list (the body of a function without a result)"""
+        if not stmt_list.stmts:
+            return
+        stmt = stmt_list.stmts[-1]
+        if isinstance(stmt, ast.ExprStmt):
+            call = self.__self_call(stmt.expr, name)
+            if call is not None:
+                call.tail_call = True
+        elif isinstance(stmt, ast.IfStmt):
+            for basic_if in [stmt.if_part] + stmt.elseifs:
+                self.__mark_tail_stmt(basic_if.stmt_list, name)
+            self.__mark_tail_stmt(stmt.else_stmts, name)
+
+    def visit_return_stmt(self, return_stmt):
+        if return_stmt.return_expr is not None:
+            return_stmt.return_expr = self.__fold(return_stmt.return_expr)
+
+    def visit_while_stmt(self, while_stmt):
+        while_stmt.bool_expr.accept(self)
+        while_stmt.stmt_list.accept(self)
+
+    def visit_if_stmt(self, if_stmt):
+        if_stmt.if_part.bool_expr.accept(self)
+        if_stmt.if_part.stmt_list.accept(self)
+        for elif_stmt in if_stmt.elseifs:
+            elif_stmt.bool_expr.accept(self)
+            elif_stmt.stmt_list.accept(self)
+        if if_stmt.has_else:
+            if_stmt.else_stmts.accept(self)
+
+    def visit_simple_expr(self, simple_expr):
+        simple_expr.term.accept(self)
+        self.current_expr = simple_expr
+
+    def visit_complex_expr(self, complex_expr):
+        complex_expr.first_operand = self.__fold(complex_expr.first_operand)
+        complex_expr.rest = self.__fold(complex_expr.rest)
+        self.current_expr = complex_expr
+        lhs_const, lhs = constant(complex_expr.first_operand)
+        rhs_const, rhs = constant(complex_expr.rest)
+        if not (lhs_const and rhs_const):
+            return
+        math_rel = complex_expr.math_rel
+        if string_length(math_rel.lexeme, lhs, rhs) > MAX_FOLDED_STRING:
+            return
+        try:
+            value = math_op(math_rel.lexeme, lhs, rhs)
+        except (TypeError, ZeroDivisionError, OverflowError):
+            return
+        if isinstance(value, str) and len(value) > MAX_FOLDED_STRING:
+            return
+        self.current_expr = constant_expr(value, math_rel)
+
+    def visit_bool_expr(self, bool_expr):
+        # folded in place: a constant expression becomes a BoolExpr whose
+        # first_expr is the literal result
+        bool_expr.first_expr = self.__fold(bool_expr.first_expr)
+        is_const, value = constant(bool_expr.first_expr)
+        if bool_expr.bool_rel is not None:
+            bool_expr.second_expr = self.__fold(bool_expr.second_expr)
+            rhs_const, rhs = constant(bool_expr.second_expr)
+            if is_const and rhs_const:
+                try:
+                    value = bool_rel_op(bool_expr.bool_rel.lexeme, value,
+                                        rhs)
+                except TypeError:
+                    is_const = False
+            else:
+                is_const = False
+        if bool_expr.bool_connector is not None:
+            bool_expr.rest.accept(self)
+            rest = bool_expr.rest
+            rest_const = rest.bool_rel is None and \
+                rest.bool_connector is None and not rest.negated
+            rest_const, rest_value = constant(rest.first_expr) \
+                if rest_const else (False, None)
+            is_and = bool_expr.bool_connector.lexeme == 'and'
+            if is_const and (not value if is_and else value):
+                # decided by the left side: the rest is never evaluated
+                pass
+            elif is_const and rest_const:
+                value = rest_value
+            else:
+                is_const = False
+        if not is_const:
+            return
+        if bool_expr.negated:
+            value = not value
+        position = bool_expr.first_expr.term.val
+        bool_expr.first_expr = constant_expr(value, position)
+        bool_expr.bool_rel = None
+        bool_expr.second_expr = None
+        bool_expr.bool_connector = None
+        bool_expr.rest = None
+        bool_expr.negated = False
+
+    def visit_lvalue(self, lval):
+        if lval.index is not None:
+            lval.index = self.__fold(lval.index)
+
+    # the parser uses id and call rvalues directly as expressions, so
+    # every rvalue is its own replacement
+
+    def visit_simple_rvalue(self, simple_rvalue):
+        simple_rvalue.value = literal_value(simple_rvalue.val)
+        self.current_expr = simple_rvalue
+
+    def visit_new_rvalue(self, new_rvalue):
+        self.current_expr = new_rvalue
+
+    def visit_new_map_rvalue(self, new_rvalue):
+        self.current_expr = new_rvalue
+
+    def visit_new_array_rvalue(self, new_rvalue):
+        new_rvalue.length = self.__fold(new_rvalue.length)
+        self.current_expr = new_rvalue
+
+    def visit_call_rvalue(self, call_rvalue):
+        args = call_rvalue.args
+        for i in range(len(args)):
+            args[i] = self.__fold(args[i])
+        self.current_expr = call_rvalue
+
+    def visit_id_rvalue(self, id_rvalue):
+        if id_rvalue.index is not None:
+            id_rvalue.index = self.__fold(id_rvalue.index)
+        self.current_expr = id_rvalue
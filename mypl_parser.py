@@ -2,6 +2,26 @@ import mypl_error as error
 import mypl_lexer as lexer
 import mypl_token as token
 import mypl_ast as ast
+import mypl_array
+
+# token types that can begin each construct
+RVALUE_START = frozenset([token.STRINGVAL, token.INTVAL, token.BOOLVAL,
+                          token.FLOATVAL, token.NIL, token.NEW, token.ID])
+EXPR_START = RVALUE_START | frozenset([token.LPAREN])
+BSTMT_START = EXPR_START | frozenset([token.VAR, token.SET, token.IF,
+                                      token.WHILE, token.RETURN])
+STMT_START = BSTMT_START | frozenset([token.STRUCTTYPE, token.FUN])
+TYPES = frozenset([token.ID, token.STRINGVAL, token.INTTYPE,
+                   token.FLOATTYPE, token.BOOLTYPE, token.STRINGTYPE])
+# begins a map type when followed by '[' (elsewhere, it is an ID)
+MAP = 'map'
+MAP_KEY_TYPES = frozenset([token.INTTYPE, token.STRINGTYPE])
+MATH_RELS = frozenset([token.PLUS, token.MINUS, token.DIVIDE,
+                       token.MULTIPLY, token.MODULO])
+BOOL_RELS = frozenset([token.EQUAL, token.LESS_THAN, token.GREATER_THAN,
+                       token.LESS_THAN_EQUAL, token.GREATER_THAN_EQUAL,
+                       token.NOT_EQUAL])
+BOOL_CONNECTORS = frozenset([token.AND, token.OR])
 
 class Parser(object):
     def __init__(self, lexer):
@@ -34,70 +54,46 @@ class Parser(object):
 
     # Beginning of recursive descent functions
     def __stmts(self, stmt_list_node):
-        """<stmts> ::= <stmt> <stmts>  or  e"""
-        if self.current_token.tokentype != token.EOS:      
-            self.__stmt(stmt_list_node)
-            self.__stmts(stmt_list_node)
-        
+        """<stmts> ::= <stmt> <stmts>  or  e
+
+        parsed with a loop so programs of any length parse in constant
+        stack depth; a token that cannot start a statement is left for
+        the caller to report"""
+        stmts = stmt_list_node.stmts
+        while self.current_token.tokentype in STMT_START:
+            stmts.append(self.__stmt())
+
     def __bstmts(self):
         """returns a list of bstmts"""
         bstmts_node = ast.StmtList()
-        while self.current_token.tokentype == token.VAR or \
-        self.current_token.tokentype == token.SET or \
-        self.current_token.tokentype == token.IF or \
-        self.current_token.tokentype == token.WHILE or \
-        self.current_token.tokentype == token.RETURN or \
-        self.current_token.tokentype == token.INTVAL or \
-        self.current_token.tokentype == token.BOOLVAL or \
-        self.current_token.tokentype == token.FLOATVAL or \
-        self.current_token.tokentype == token.NIL or \
-        self.current_token.tokentype == token.NEW or \
-        self.current_token.tokentype == token.LPAREN or \
-        self.current_token.tokentype == token.ID:
-            bstmts_node.stmts.append(self.__bstmt())
+        stmts = bstmts_node.stmts
+        while self.current_token.tokentype in BSTMT_START:
+            stmts.append(self.__bstmt())
         return bstmts_node
 
-    def __stmt(self, stmt_list_node):
+    def __stmt(self):
         """<stmt> ::= <sdecl>  or  <fdecl>  or <bstmt>"""
-        if self.current_token.tokentype == token.STRUCTTYPE:
-            self.__sdecl(stmt_list_node)
-        elif self.current_token.tokentype == token.FUN:
-            self.__fdecl(stmt_list_node)
-        elif self.current_token.tokentype == token.VAR or \
-        self.current_token.tokentype == token.SET or \
-        self.current_token.tokentype == token.IF or \
-        self.current_token.tokentype == token.WHILE or \
-        self.current_token.tokentype == token.RETURN or \
-        self.current_token.tokentype == token.STRINGVAL or \
-        self.current_token.tokentype == token.INTVAL or \
-        self.current_token.tokentype == token.BOOLVAL or \
-        self.current_token.tokentype == token.FLOATVAL or \
-        self.current_token.tokentype == token.NIL or \
-        self.current_token.tokentype == token.NEW or \
-        self.current_token.tokentype == token.LPAREN or \
-        self.current_token.tokentype == token.ID:
-            stmt_list_node.stmts.append(self.__bstmt())
+        tokentype = self.current_token.tokentype
+        if tokentype == token.STRUCTTYPE:
+            return self.__sdecl()
+        elif tokentype == token.FUN:
+            return self.__fdecl()
+        return self.__bstmt()
 
     def __bstmt(self):
         """return a statement"""
-        if self.current_token.tokentype == token.VAR:
+        tokentype = self.current_token.tokentype
+        if tokentype == token.VAR:
             return self.__vdecl()
-        elif self.current_token.tokentype == token.SET:
+        elif tokentype == token.SET:
             return self.__assign()
-        elif self.current_token.tokentype == token.IF:
+        elif tokentype == token.IF:
             return self.__cond()
-        elif self.current_token.tokentype == token.WHILE:
+        elif tokentype == token.WHILE:
             return self.__while()
-        elif self.current_token.tokentype == token.RETURN:
+        elif tokentype == token.RETURN:
             return self.__exit()
-        elif self.current_token.tokentype == token.STRINGVAL or \
-        self.current_token.tokentype == token.INTVAL or \
-        self.current_token.tokentype == token.BOOLVAL or \
-        self.current_token.tokentype == token.FLOATVAL or \
-        self.current_token.tokentype == token.NIL or \
-        self.current_token.tokentype == token.NEW or \
-        self.current_token.tokentype == token.LPAREN or \
-        self.current_token.tokentype == token.ID:
+        elif tokentype in EXPR_START:
             expr_node = ast.ExprStmt()
             expr_node.expr = self.__expr()
             self.__eat(token.SEMICOLON, "Invalid Syntax: expected SEMICOLON")
@@ -105,21 +101,21 @@ class Parser(object):
         else:
             self.__error("Invalid Syntax: <bstmt>")
 
-    def __sdecl(self, stmt_list_node):
+    def __sdecl(self):
         sdecl_node = ast.StructDeclStmt()
         self.__eat(token.STRUCTTYPE, "Invalid Syntax: expected STRUCT")
         sdecl_node.struct_id = self.current_token
         self.__eat(token.ID, "Invalid Syntax: expected ID")
         self.__vdecls(sdecl_node)
         self.__eat(token.END, "Invalid Syntax: expected END")
-        stmt_list_node.stmts.append(sdecl_node)
-   
+        return sdecl_node
+
     def __vdecls(self, sdecl_node):
-        if self.current_token.tokentype == token.VAR:
-            sdecl_node.var_decls.append(self.__vdecl())
-            self.__vdecls(sdecl_node)
+        var_decls = sdecl_node.var_decls
+        while self.current_token.tokentype == token.VAR:
+            var_decls.append(self.__vdecl())
 
-    def __fdecl(self, stmt_list_node):
+    def __fdecl(self):
         fdecl_node = ast.FunDeclStmt() 
         self.__eat(token.FUN, "Invalid Syntax: expected FUN")
         if self.current_token.tokentype == token.NIL:
@@ -134,8 +130,8 @@ class Parser(object):
         self.__eat(token.RPAREN, "Invalid Syntax: expected RPAREN")
         fdecl_node.stmt_list = self.__bstmts()
         self.__eat(token.END, "Invalid Syntax: expected END")
-        stmt_list_node.stmts.append(fdecl_node)
-        
+        return fdecl_node
+
     def __params(self):
         params_list = []
         if self.current_token.tokentype == token.ID:
@@ -157,29 +153,28 @@ class Parser(object):
             
     def __type(self):
         theType = self.current_token
-        if self.current_token.tokentype == token.ID or \
-        self.current_token.tokentype == token.STRINGVAL or \
-        self.current_token.tokentype == token.INTTYPE or \
-        self.current_token.tokentype == token.FLOATTYPE or \
-        self.current_token.tokentype == token.BOOLTYPE or \
-        self.current_token.tokentype == token.STRINGTYPE:
+        if theType.tokentype in TYPES:
             self.__advance()
         else:
             self.__error("Invalid Syntax: <type>")
+        if self.__is_map(theType):
+            return self.__map_type(theType)
+        if self.current_token.tokentype == token.LBRACKET:
+            # an array type, e.g. int[]
+            if theType.tokentype not in mypl_array.ARRAY_TYPES:
+                self.__error("Invalid Syntax: only int and float arrays")
+            self.__advance()
+            self.__eat(token.RBRACKET, "Invalid Syntax: expected RBRACKET")
+            theType = token.Token(mypl_array.ARRAY_TYPES[theType.tokentype],
+                                  theType.lexeme + '[]', theType.line,
+                                  theType.column)
         return theType
 
     def __exit(self):
         exit_node = ast.ReturnStmt()
         exit_node.return_token = self.current_token
         self.__eat(token.RETURN, "Invalid Syntax: expected RETURN")
-        if self.current_token.tokentype == token.STRINGVAL or \
-        self.current_token.tokentype == token.INTVAL or \
-        self.current_token.tokentype == token.BOOLVAL or \
-        self.current_token.tokentype == token.FLOATVAL or \
-        self.current_token.tokentype == token.NIL or \
-        self.current_token.tokentype == token.NEW or \
-        self.current_token.tokentype == token.LPAREN or \
-        self.current_token.tokentype == token.ID:
+        if self.current_token.tokentype in EXPR_START:
             exit_node.return_expr = self.__expr()
         self.__eat(token.SEMICOLON, "Invalid Syntax: expected SEMICOLON")
         return exit_node
@@ -209,6 +204,24 @@ class Parser(object):
         self.__eat(token.SEMICOLON, "Invalid Syntax: expected SEMICOLON")
         return assign_node
 
+    def __is_map(self, the_token):
+        """returns True if the_token, just eaten, begins a map type"""
+        return the_token.tokentype == token.ID and the_token.lexeme == MAP \
+            and self.current_token.tokentype == token.LBRACKET
+
+    def __map_type(self, map_token):
+        """returns the type map[key, value] after the map keyword"""
+        self.__eat(token.LBRACKET, "Invalid Syntax: expected LBRACKET")
+        key_type = self.current_token
+        if key_type.tokentype not in MAP_KEY_TYPES:
+            self.__error("Invalid Syntax: map keys must be int or string")
+        self.__advance()
+        self.__eat(token.COMMA, "Invalid Syntax: expected COMMA")
+        value_type = self.__type()
+        self.__eat(token.RBRACKET, "Invalid Syntax: expected RBRACKET")
+        return token.MapType(key_type, value_type, map_token.line,
+                             map_token.column)
+
     def __lvalue(self):
         val = ast.LValue()
         val.path.append(self.current_token)
@@ -217,8 +230,18 @@ class Parser(object):
             self.__advance()
             val.path.append(self.current_token)
             self.__eat(token.ID, "Invalid Syntax: expected ID")
+        val.index = self.__index()
         return val
 
+    def __index(self):
+        """returns the expression of an optional array index, [expr]"""
+        if self.current_token.tokentype != token.LBRACKET:
+            return None
+        self.__advance()
+        index = self.__expr()
+        self.__eat(token.RBRACKET, "Invalid Syntax: expected RBRACKET")
+        return index
+
     def __cond(self):
         cond_node = ast.BasicIf()
         if_state_node = ast.IfStmt()
@@ -227,26 +250,23 @@ class Parser(object):
         self.__eat(token.THEN, "Invalid Syntax: expected THEN")
         cond_node.stmt_list = self.__bstmts()
         if_state_node.if_part = cond_node
-        if self.current_token.tokentype == token.ELIF or \
-        self.current_token.tokentype == token.ELSE:          
-            self.__condt(if_state_node)
+        self.__condt(if_state_node)
         self.__eat(token.END, "Invalid Syntax: expected END")
         return if_state_node
 
     def __condt(self, if_state_node):
-        if self.current_token.tokentype == token.ELIF:
+        while self.current_token.tokentype == token.ELIF:
             self.__advance()
             new_elif = ast.BasicIf()
             new_elif.bool_expr = self.__bexpr()
             self.__eat(token.THEN, "Invalid Syntax: expected THEN")
             new_elif.stmt_list = self.__bstmts()
             if_state_node.elseifs.append(new_elif)
-            self.__condt(if_state_node)
-        elif self.current_token.tokentype == token.ELSE:
+        if self.current_token.tokentype == token.ELSE:
             if_state_node.has_else = True
             self.__advance()
             if_state_node.else_stmts = self.__bstmts()
-        
+
     def __while(self):
         while_node = ast.WhileStmt()
         self.__eat(token.WHILE, "Invalid Syntax: expected WHILE")
@@ -263,58 +283,53 @@ class Parser(object):
             self.__advance()#what to do with (expr) "(" ")"
             expr_node = self.__expr()
             self.__eat(token.RPAREN, "Invalid Syntax: expected RPAREN")
-        elif self.current_token.tokentype == token.STRINGVAL or \
-        self.current_token.tokentype == token.INTVAL or \
-        self.current_token.tokentype == token.BOOLVAL or \
-        self.current_token.tokentype == token.FLOATVAL or \
-        self.current_token.tokentype == token.NIL or \
-        self.current_token.tokentype == token.NEW or \
-        self.current_token.tokentype == token.ID:
+        elif self.current_token.tokentype in RVALUE_START:
             expr_node = self.__rvalue()
         else:
             self.__error("Invalid Syntax: <expr>")
-        if self.current_token.tokentype == token.PLUS or \
-        self.current_token.tokentype == token.MINUS or \
-        self.current_token.tokentype == token.DIVIDE or \
-        self.current_token.tokentype == token.MULTIPLY or \
-        self.current_token.tokentype == token.MODULO:
+        if self.current_token.tokentype in MATH_RELS:
             complx_expr_node.first_operand = expr_node
             complx_expr_node.math_rel = self.current_token
-            self.__mathrel()
+            self.__advance()
             complx_expr_node.rest = self.__expr()
             return complx_expr_node
         return expr_node
 
-    def __mathrel(self):
-        if self.current_token.tokentype == token.PLUS or \
-        self.current_token.tokentype == token.MINUS or \
-        self.current_token.tokentype == token.DIVIDE or \
-        self.current_token.tokentype == token.MULTIPLY or \
-        self.current_token.tokentype == token.MODULO:
-            self.__advance()
-
     def __rvalue(self):
         """Returns a simple EXPR statement"""
         simple_expr_node = ast.SimpleExpr()
-        if self.current_token.tokentype == token.STRINGVAL or \
-        self.current_token.tokentype == token.INTVAL or \
-        self.current_token.tokentype == token.BOOLVAL or \
-        self.current_token.tokentype == token.FLOATVAL or \
-        self.current_token.tokentype == token.NIL:
-            a = ast.SimpleRValue()
-            a.val = self.current_token
+        tokentype = self.current_token.tokentype
+        if tokentype == token.NEW:
             self.__advance()
+            if self.current_token.tokentype in mypl_array.ARRAY_TYPES:
+                # new int[n] or new float[n]
+                a = ast.NewArrayRValue()
+                a.elem_type = self.current_token
+                self.__advance()
+                self.__eat(token.LBRACKET, "Invalid Syntax: expected LBRACKET")
+                a.length = self.__expr()
+                self.__eat(token.RBRACKET, "Invalid Syntax: expected RBRACKET")
+                simple_expr_node.term = a
+                return simple_expr_node
+            type_id = self.current_token
+            self.__eat(token.ID, "Invalid Syntax: expected ID")
+            if self.__is_map(type_id):
+                # new map[key, value]
+                a = ast.NewMapRValue()
+                a.map_type = self.__map_type(type_id)
+            else:
+                a = ast.NewRValue()
+                a.struct_type = type_id
             simple_expr_node.term = a
             return simple_expr_node
-        elif self.current_token.tokentype == token.NEW:
+        elif tokentype == token.ID:
+            return self.__idrval()
+        elif tokentype in RVALUE_START:
+            a = ast.SimpleRValue()
+            a.val = self.current_token
             self.__advance()
-            a = ast.NewRValue()
-            a.struct_type = self.current_token
             simple_expr_node.term = a
-            self.__eat(token.ID, "Invalid Syntax: expected ID")
             return simple_expr_node
-        elif self.current_token.tokentype == token.ID:
-            return self.__idrval()
         else:
             self.__error("Invalid Syntax: <rvalue>")
         
@@ -329,6 +344,7 @@ class Parser(object):
                 self.__advance()
                 a.path.append(self.current_token)
                 self.__eat(token.ID, "Invalid Syntax: expected ID")
+            a.index = self.__index()
             return a
         elif self.current_token.tokentype == token.LPAREN:
             self.__advance()
@@ -339,20 +355,14 @@ class Parser(object):
         else:
             a = ast.IDRvalue()
             a.path.append(initial_id)
+            a.index = self.__index()
             return a
         #return None
 
     def __exprlist(self):
         """returns CALLRValue for function call"""
         a = ast.CallRValue()
-        if self.current_token.tokentype == token.STRINGVAL or \
-        self.current_token.tokentype == token.INTVAL or \
-        self.current_token.tokentype == token.BOOLVAL or \
-        self.current_token.tokentype == token.FLOATVAL or \
-        self.current_token.tokentype == token.NIL or \
-        self.current_token.tokentype == token.NEW or \
-        self.current_token.tokentype == token.LPAREN or \
-        self.current_token.tokentype == token.ID:
+        if self.current_token.tokentype in EXPR_START:
             a.args.append(self.__expr())
             while(self.current_token.tokentype == token.COMMA):
                 self.__advance()
@@ -367,13 +377,7 @@ class Parser(object):
             self.__eat(token.RPAREN, "Invalid Syntax: expected RPAREN")
             self.__bconnct(bexpr_node)
             return bexpr_node
-        elif self.current_token.tokentype == token.STRINGVAL or \
-        self.current_token.tokentype == token.INTVAL or \
-        self.current_token.tokentype == token.BOOLVAL or \
-        self.current_token.tokentype == token.FLOATVAL or \
-        self.current_token.tokentype == token.NIL or \
-        self.current_token.tokentype == token.NEW or \
-        self.current_token.tokentype == token.ID:
+        elif self.current_token.tokentype in RVALUE_START:
             bexpr_node.first_expr = self.__expr()
             self.__bexprt(bexpr_node)
             return bexpr_node
@@ -387,33 +391,19 @@ class Parser(object):
             self.__error("Invalid Syntax: <bexpr>")
 
     def __bexprt(self, bexpr_node):
-        if self.current_token.tokentype == token.EQUAL or \
-        self.current_token.tokentype == token.LESS_THAN or \
-        self.current_token.tokentype == token.GREATER_THAN or \
-        self.current_token.tokentype == token.LESS_THAN_EQUAL or \
-        self.current_token.tokentype == token.GREATER_THAN_EQUAL or \
-        self.current_token.tokentype == token.NOT_EQUAL:
+        if self.current_token.tokentype in BOOL_RELS:
             bexpr_node.bool_rel = self.__boolrel()
             bexpr_node.second_expr = self.__expr()
-            self.__bconnct(bexpr_node)
-        elif self.current_token.tokentype == token.AND or \
-        self.current_token.tokentype == token.OR:
-            self.__bconnct(bexpr_node)
+        self.__bconnct(bexpr_node)
 
     def __bconnct(self, bexpr_node):
-        if self.current_token.tokentype == token.AND or \
-        self.current_token.tokentype == token.OR:
+        if self.current_token.tokentype in BOOL_CONNECTORS:
             bexpr_node.bool_connector = self.current_token
             self.__advance()
             bexpr_node.rest = self.__bexpr()
 
     def __boolrel(self):
-        if self.current_token.tokentype == token.EQUAL or \
-        self.current_token.tokentype == token.LESS_THAN or \
-        self.current_token.tokentype == token.GREATER_THAN or \
-        self.current_token.tokentype == token.LESS_THAN_EQUAL or \
-        self.current_token.tokentype == token.GREATER_THAN_EQUAL or \
-        self.current_token.tokentype == token.NOT_EQUAL:
+        if self.current_token.tokentype in BOOL_RELS:
             curr = self.current_token
             self.__advance()
             return curr
@@ -0,0 +1,272 @@
+import mypl_ast as ast
+import mypl_interpreter as interpreter
+import mypl_vm as vm
+import mypl_builtins as builtins
+import mypl_codegen as codegen
+import mypl_memo
+import collections
+import signal
+import time
+
+MAIN = '<main>'
+
+def stmt_line(stmt):
+    """returns the source line a statement starts on"""
+    node = stmt
+    while True:
+        if isinstance(node, ast.ExprStmt):
+            node = node.expr
+        elif isinstance(node, ast.VarDeclStmt):
+            return node.var_id.line
+        elif isinstance(node, ast.AssignStmt):
+            return node.lhs.path[0].line
+        elif isinstance(node, ast.StructDeclStmt):
+            return node.struct_id.line
+        elif isinstance(node, ast.FunDeclStmt):
+            return node.fun_name.line
+        elif isinstance(node, ast.ReturnStmt):
+            return node.return_token.line
+        elif isinstance(node, ast.WhileStmt):
+            node = node.bool_expr
+        elif isinstance(node, ast.IfStmt):
+            node = node.if_part.bool_expr
+        elif isinstance(node, ast.BoolExpr):
+            node = node.first_expr
+        elif isinstance(node, ast.SimpleExpr):
+            node = node.term
+        elif isinstance(node, ast.ComplexExpr):
+            node = node.first_operand
+        elif isinstance(node, ast.SimpleRValue):
+            return node.val.line
+        elif isinstance(node, ast.NewRValue):
+            return node.struct_type.line
+        elif isinstance(node, ast.NewArrayRValue):
+            return node.elem_type.line
+        elif isinstance(node, ast.NewMapRValue):
+            return node.map_type.line
+        elif isinstance(node, ast.CallRValue):
+            return node.fun.line
+        elif isinstance(node, ast.IDRvalue):
+            return node.path[0].line
+        else:
+            return 0
+
+
+class FunctionStats(object):
+    """The calls to one function and the time spent in them. Inclusive
+    time counts callees (once, for recursive calls); exclusive time does
+    not."""
+    __slots__ = ('calls', 'inclusive', 'exclusive')
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+
+
+class ProfilingInterpreter(interpreter.Interpreter):
+    """An interpreter that records, while it runs a program, the calls
+    to and time spent in every function (built-ins included) and how
+    often the statements on each source line are executed."""
+
+    def __init__(self, built_ins=None, output=None, input=None,
+                 memo_size=mypl_memo.DEFAULT_SIZE):
+        # built-ins are timed through wrappers in a private registry
+        registry = builtins.Registry()
+        for built_in in built_ins or builtins.default:
+            registry.register(built_in.name, self.__timed(built_in),
+                              built_in.param_types, built_in.return_type,
+                              built_in.check_nil, built_in.runtime,
+                              built_in.pure, not built_in.string_params,
+                              built_in.reserved)
+        interpreter.Interpreter.__init__(self, registry, output, input,
+                                         memo_size)
+        self.functions = collections.defaultdict(FunctionStats)
+        self.lines = collections.Counter()      # line -> statements run
+        self.bodies = {}        # function body StmtList -> function name
+        self.stmt_lines = {}    # statement -> line (computed on first run)
+        self.calls = []         # [name, start, callee time] per active call
+        self.active = collections.Counter()     # name -> active calls
+
+    def __timed(self, built_in):
+        function = built_in.function
+        name = built_in.name
+        def timed(*args):
+            self.__enter(name)
+            try:
+                return function(*args)
+            finally:
+                self.__exit()
+        return timed
+
+    def __enter(self, name):
+        self.functions[name].calls += 1
+        self.active[name] += 1
+        self.calls.append([name, time.perf_counter(), 0.0])
+
+    def __exit(self):
+        name, start, callees = self.calls.pop()
+        elapsed = time.perf_counter() - start
+        stats = self.functions[name]
+        stats.exclusive += elapsed - callees
+        self.active[name] -= 1
+        if not self.active[name]:
+            stats.inclusive += elapsed
+        if self.calls:
+            self.calls[-1][2] += elapsed
+
+    def __hit(self, stmt):
+        line = self.stmt_lines.get(stmt)
+        if line is None:
+            line = self.stmt_lines[stmt] = stmt_line(stmt)
+        self.lines[line] += 1
+
+    def run(self, stmt_list):
+        for stmt in stmt_list.stmts:
+            if isinstance(stmt, ast.FunDeclStmt):
+                self.bodies[stmt.stmt_list] = stmt.fun_name.lexeme
+        self.__enter(MAIN)
+        try:
+            interpreter.Interpreter.run(self, stmt_list)
+        finally:
+            while self.calls:
+                self.__exit()
+
+    def visit_stmt_list(self, stmt_list):
+        # a function's time starts once its arguments are evaluated
+        name = self.bodies.get(stmt_list)
+        if name is None:
+            interpreter.Interpreter.visit_stmt_list(self, stmt_list)
+            return
+        self.__enter(name)
+        try:
+            interpreter.Interpreter.visit_stmt_list(self, stmt_list)
+        finally:
+            self.__exit()
+
+    def visit_expr_stmt(self, expr_stmt):
+        self.__hit(expr_stmt)
+        interpreter.Interpreter.visit_expr_stmt(self, expr_stmt)
+
+    def visit_var_decl_stmt(self, var_decl):
+        self.__hit(var_decl)
+        interpreter.Interpreter.visit_var_decl_stmt(self, var_decl)
+
+    def visit_assign_stmt(self, assign_stmt):
+        self.__hit(assign_stmt)
+        interpreter.Interpreter.visit_assign_stmt(self, assign_stmt)
+
+    def visit_return_stmt(self, return_stmt):
+        self.__hit(return_stmt)
+        interpreter.Interpreter.visit_return_stmt(self, return_stmt)
+
+    def visit_while_stmt(self, while_stmt):
+        self.__hit(while_stmt)
+        interpreter.Interpreter.visit_while_stmt(self, while_stmt)
+
+    def visit_if_stmt(self, if_stmt):
+        self.__hit(if_stmt)
+        interpreter.Interpreter.visit_if_stmt(self, if_stmt)
+
+    def report(self, stream, source_lines=None):
+        """writes the function and line statistics to stream"""
+        header = '%-20s %10s %12s %12s' % ('function', 'calls',
+                                           'incl (ms)', 'excl (ms)')
+        stream.write(header + '\n' + '-' * len(header) + '\n')
+        by_time = sorted(self.functions.items(),
+                         key=lambda item: -item[1].exclusive)
+        for name, stats in by_time:
+            stream.write('%-20s %10d %12.3f %12.3f\n' % (
+                name, stats.calls, stats.inclusive * 1000,
+                stats.exclusive * 1000))
+        stream.write('\n%6s %12s\n' % ('line', 'hits'))
+        for line in sorted(self.lines):
+            text = ''
+            if source_lines and 0 < line <= len(source_lines):
+                text = '  ' + source_lines[line - 1].rstrip()
+            stream.write('%6d %12d%s\n' % (line, self.lines[line], text))
+
+
+# the Python functions whose frames stand for MyPL calls
+CALL_CODE = interpreter.Interpreter.visit_call_rvalue.__code__
+NEW_CODE = interpreter.Interpreter.visit_new_rvalue.__code__
+EXECUTE_CODE = vm.VM._VM__execute.__code__
+
+
+class Sampler(object):
+    """A statistical profiler for all three back ends. Every
+    interval seconds of CPU time the running program is interrupted and
+    its MyPL call stack (recovered from the Python stack, so the program
+    runs unchanged in between) is counted. The counts are written as
+    folded stacks ("<main>;f;g 12"), the input of flame graph tools.
+    """
+
+    def __init__(self, built_ins=None, interval=0.001):
+        self.interval = interval
+        self.stacks = collections.Counter()     # folded stack -> samples
+        self.samples = 0
+        self.previous = None    # the SIGPROF handler replaced by start()
+        # the frames of built-in functions, by code object
+        self.built_ins = {}
+        for built_in in built_ins or builtins.default:
+            code = getattr(built_in.function, '__code__', None)
+            if code is not None:
+                self.built_ins[code] = built_in.name
+
+    def start(self):
+        self.previous = signal.signal(signal.SIGPROF, self.__sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self.previous or signal.SIG_DFL)
+
+    def __sample(self, signum, frame):
+        self.samples += 1
+        names = []
+        leaf = True         # no MyPL frame seen yet
+        while frame is not None:
+            code = frame.f_code
+            if code is CALL_CODE:
+                # the callee only runs once the caller's frame is saved
+                if 'curr_frame' in frame.f_locals:
+                    names.append(frame.f_locals['fun_decl'].fun_name.lexeme)
+                leaf = False
+            elif code is NEW_CODE:
+                struct_type = frame.f_locals['new_rvalue'].struct_type
+                names.append('new ' + struct_type.lexeme)
+                leaf = False
+            elif code is EXECUTE_CODE:
+                # the VM keeps its own call stack of suspended callers
+                names.extend(reversed(self.__vm_stack(frame.f_locals)))
+                leaf = False
+            elif code.co_filename == codegen.FILENAME:
+                name = codegen.mypl_name(code.co_name)
+                if name is not None:
+                    names.append(name)
+                leaf = False
+            elif leaf and code in self.built_ins:
+                names.append(self.built_ins[code])
+                leaf = False
+            frame = frame.f_back
+        names.append(MAIN)
+        names.reverse()
+        self.stacks[';'.join(names)] += 1
+
+    @staticmethod
+    def __vm_stack(f_locals):
+        """returns the MyPL calls active in a VM frame, outermost first"""
+        inits = set(id(struct.init)
+                    for struct in f_locals['self'].program.structs)
+        names = []
+        for code in [call[0] for call in f_locals['calls']] + \
+                    [f_locals['code']]:
+            if id(code) in inits:
+                names.append('new ' + code.name)
+            elif code.name != MAIN:
+                names.append(code.name)
+        return names
+
+    def write_folded(self, stream):
+        for stack in sorted(self.stacks):
+            stream.write('%s %d\n' % (stack, self.stacks[stack]))
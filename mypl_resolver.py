@@ -0,0 +1,231 @@
+import mypl_ast as ast
+import mypl_error as error
+import mypl_builtins as builtins
+
+# the kinds of global slots that are not variables
+FUNCTION = 'function'
+STRUCT = 'struct'
+
+
+class Resolver(ast.Visitor):
+    """A MyPL visitor that binds every identifier to a (depth, slot) pair
+    before the program runs. The depth is the number of frames between
+    the use and the frame of its declaration, and the slot is the index
+    of the variable within that frame.
+
+    Frames mirror the interpreter's environments: one for the program,
+    one for each call (holding the parameters followed by the variables
+    declared in the function body), and one for each nested statement
+    list that declares variables. Statement lists without declarations
+    share the enclosing frame. Names are resolved as the bytecode
+    compiler resolves them, with the same errors: functions and structs
+    have their own global slots and can be used anywhere, top-level
+    statements see the variables declared before them, and function
+    bodies and struct initializers (resolved after the top-level
+    statements) see every top-level variable.
+
+    The resolver also marks the statement lists that may execute a
+    return, so only those need to check for one after each statement,
+    and binds each call of a built-in function to its BuiltIn.
+    """
+
+    def __init__(self, built_ins=None):
+        self.scopes = []        # stack of {id name: slot}, one per frame
+        self.built_ins = built_ins or builtins.default
+        self.functions = {}     # fun name -> FunDeclStmt
+        self.global_scope = None
+
+    def resolve(self, stmt_list):
+        # functions and structs take global slots (apart from variables
+        # of the same names) before any statement is resolved
+        self.global_scope = {}
+        deferred = []
+        for stmt in stmt_list.stmts:
+            if isinstance(stmt, ast.FunDeclStmt):
+                self.functions[stmt.fun_name.lexeme] = stmt
+                stmt.slot = self.__global(FUNCTION, stmt.fun_name.lexeme)
+                deferred.append(stmt)
+            elif isinstance(stmt, ast.StructDeclStmt):
+                stmt.slot = self.__global(STRUCT, stmt.struct_id.lexeme)
+                deferred.append(stmt)
+        self.scopes = [self.global_scope]
+        self.__stmts(stmt_list)
+        for decl in deferred:
+            if isinstance(decl, ast.FunDeclStmt):
+                self.__resolve_fun(decl)
+            else:
+                self.__resolve_struct(decl)
+        stmt_list.frame_size = len(self.global_scope)
+        self.scopes = []
+
+    def __error(self, msg, the_token):
+        raise error.MyPLError(msg, the_token.line, the_token.column)
+
+    def __global(self, kind, name):
+        """returns the global slot of a function or struct"""
+        key = (kind, name)
+        if key not in self.global_scope:
+            self.global_scope[key] = len(self.global_scope)
+        return self.global_scope[key]
+
+    def __bind_global(self, node, kind, the_token):
+        """sets node.depth and node.slot for a function or struct"""
+        key = (kind, the_token.lexeme)
+        if key not in self.global_scope:
+            self.__error('undeclared %s "%s"' % (kind, the_token.lexeme),
+                         the_token)
+        node.depth = len(self.scopes) - 1
+        node.slot = self.global_scope[key]
+
+    def __declare(self, name):
+        scope = self.scopes[-1]
+        if name not in scope:
+            scope[name] = len(scope)
+        return scope[name]
+
+    def __resolve(self, node, the_token):
+        """sets node.depth and node.slot for the identifier the_token"""
+        name = the_token.lexeme
+        depth = 0
+        for scope in reversed(self.scopes):
+            if name in scope:
+                node.depth = depth
+                node.slot = scope[name]
+                return
+            depth += 1
+        self.__error('undeclared identifier "%s"' % name, the_token)
+
+    def __stmts(self, stmt_list):
+        """resolves the statements of stmt_list in the current scope"""
+        stmt_list.returns = False
+        for stmt in stmt_list.stmts:
+            stmt.accept(self)
+            if self.__returns(stmt):
+                stmt_list.returns = True
+
+    def __returns(self, stmt):
+        """true if executing stmt may execute a return statement"""
+        if isinstance(stmt, ast.ReturnStmt):
+            return True
+        elif isinstance(stmt, ast.WhileStmt):
+            return stmt.stmt_list.returns
+        elif isinstance(stmt, ast.IfStmt):
+            if stmt.if_part.stmt_list.returns or stmt.else_stmts.returns:
+                return True
+            for elif_stmt in stmt.elseifs:
+                if elif_stmt.stmt_list.returns:
+                    return True
+        return False
+
+    def visit_stmt_list(self, stmt_list):
+        has_decls = False
+        for stmt in stmt_list.stmts:
+            if isinstance(stmt, ast.VarDeclStmt):
+                has_decls = True
+                break
+        if has_decls:
+            self.scopes.append({})
+        self.__stmts(stmt_list)
+        if has_decls:
+            stmt_list.frame_size = len(self.scopes.pop())
+        else:
+            stmt_list.frame_size = 0
+
+    def visit_expr_stmt(self, expr_stmt):
+        expr_stmt.expr.accept(self)
+
+    def visit_var_decl_stmt(self, var_decl):
+        # the initializer is resolved before the variable is in scope
+        var_decl.var_expr.accept(self)
+        var_decl.slot = self.__declare(var_decl.var_id.lexeme)
+
+    def visit_assign_stmt(self, assign_stmt):
+        assign_stmt.rhs.accept(self)
+        assign_stmt.lhs.accept(self)
+
+    # declarations are resolved by resolve(), after the top-level
+    # statements
+    def visit_struct_decl_stmt(self, struct_decl): pass
+
+    def visit_fun_decl_stmt(self, fun_decl): pass
+
+    def __resolve_struct(self, struct_decl):
+        # field initializers run in the (global) declaring frame
+        self.scopes = [self.global_scope]
+        for var_decl in struct_decl.var_decls:
+            var_decl.var_expr.accept(self)
+
+    def __resolve_fun(self, fun_decl):
+        # the body sees the declaring frame, then the call's frame, which
+        # holds the parameters and then the body's own variables
+        self.scopes = [self.global_scope, {}]
+        for param in fun_decl.params:
+            self.__declare(param.param_name.lexeme)
+        self.__stmts(fun_decl.stmt_list)
+        fun_decl.stmt_list.frame_size = 0
+        fun_decl.frame_size = len(self.scopes[-1])
+
+    def visit_return_stmt(self, return_stmt):
+        if return_stmt.return_expr is not None:
+            return_stmt.return_expr.accept(self)
+
+    def visit_while_stmt(self, while_stmt):
+        while_stmt.bool_expr.accept(self)
+        while_stmt.stmt_list.accept(self)
+
+    def visit_if_stmt(self, if_stmt):
+        if_stmt.if_part.bool_expr.accept(self)
+        if_stmt.if_part.stmt_list.accept(self)
+        for elif_stmt in if_stmt.elseifs:
+            elif_stmt.bool_expr.accept(self)
+            elif_stmt.stmt_list.accept(self)
+        if if_stmt.has_else:
+            if_stmt.else_stmts.accept(self)
+
+    def visit_simple_expr(self, simple_expr):
+        simple_expr.term.accept(self)
+
+    def visit_complex_expr(self, complex_expr):
+        complex_expr.first_operand.accept(self)
+        complex_expr.rest.accept(self)
+
+    def visit_bool_expr(self, bool_expr):
+        bool_expr.first_expr.accept(self)
+        if bool_expr.second_expr is not None:
+            bool_expr.second_expr.accept(self)
+        if bool_expr.rest is not None:
+            bool_expr.rest.accept(self)
+
+    def visit_lvalue(self, lval):
+        self.__resolve(lval, lval.path[0])
+        lval.field_slots = [(None, 0)] * (len(lval.path) - 1)
+        if lval.index is not None:
+            lval.index.accept(self)
+
+    def visit_new_rvalue(self, new_rvalue):
+        self.__bind_global(new_rvalue, STRUCT, new_rvalue.struct_type)
+
+    def visit_new_array_rvalue(self, new_rvalue):
+        new_rvalue.length.accept(self)
+
+    def visit_call_rvalue(self, call_rvalue):
+        for arg in call_rvalue.args:
+            arg.accept(self)
+        fun_id = call_rvalue.fun
+        # declared functions take precedence over most built-ins
+        built_in = self.built_ins.lookup(fun_id.lexeme, self.functions)
+        call_rvalue.built_in = built_in
+        if built_in is not None:
+            arity = built_in.arity()
+        else:
+            self.__bind_global(call_rvalue, FUNCTION, fun_id)
+            arity = len(self.functions[fun_id.lexeme].params)
+        if len(call_rvalue.args) != arity:
+            self.__error('wrong number of arguments to "%s"' %
+                         fun_id.lexeme, fun_id)
+
+    def visit_id_rvalue(self, id_rvalue):
+        self.__resolve(id_rvalue, id_rvalue.path[0])
+        id_rvalue.field_slots = [(None, 0)] * (len(id_rvalue.path) - 1)
+        if id_rvalue.index is not None:
+            id_rvalue.index.accept(self)
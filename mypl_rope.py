@@ -0,0 +1,115 @@
+import mypl_token as token
+
+# strings at least this long become ropes when something is appended
+MIN_LENGTH = 256
+
+
+class Rope(object):
+    """A string built by concatenation, kept as its pieces until the
+    characters are needed.
+
+    A rope is a prefix (count pieces) of a piece list that ropes built
+    from it share. Appending to the rope that last grew the list adds a
+    piece to it in place, so building a string with 'set s = s + ...'
+    takes time linear in its length; appending to any other rope copies
+    its prefix first, which leaves the ropes sharing the list unchanged.
+    The string is joined (once) when the rope is printed, indexed,
+    compared or passed to a built-in; its length is known without that.
+    """
+    __slots__ = ('pieces', 'count', 'length', 'text')
+
+    def __init__(self, pieces, length):
+        self.pieces = pieces        # [str], shared with other ropes
+        self.count = len(pieces)    # the pieces of this rope
+        self.length = length
+        self.text = None            # the joined string, once needed
+
+    def __add__(self, other):
+        if other.__class__ is not str:
+            if other.__class__ is not Rope:
+                return NotImplemented
+            other = str(other)
+        pieces = self.pieces
+        if len(pieces) != self.count:
+            # a rope built from this one already grew the list
+            pieces = pieces[:self.count]
+        pieces.append(other)
+        return Rope(pieces, self.length + len(other))
+
+    def __radd__(self, other):
+        if other.__class__ is not str:
+            return NotImplemented
+        return Rope([other, str(self)], len(other) + self.length)
+
+    def __str__(self):
+        text = self.text
+        if text is None:
+            pieces = self.pieces
+            if len(pieces) != self.count:
+                pieces = pieces[:self.count]
+            text = self.text = ''.join(pieces)
+        return text
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __eq__(self, other):
+        if other.__class__ is str or other.__class__ is Rope:
+            return str(self) == str(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        if other.__class__ is str or other.__class__ is Rope:
+            return str(self) != str(other)
+        return NotImplemented
+
+    def __lt__(self, other):
+        if other.__class__ is str or other.__class__ is Rope:
+            return str(self) < str(other)
+        return NotImplemented
+
+    def __le__(self, other):
+        if other.__class__ is str or other.__class__ is Rope:
+            return str(self) <= str(other)
+        return NotImplemented
+
+    def __gt__(self, other):
+        if other.__class__ is str or other.__class__ is Rope:
+            return str(self) > str(other)
+        return NotImplemented
+
+    def __ge__(self, other):
+        if other.__class__ is str or other.__class__ is Rope:
+            return str(self) >= str(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return 'Rope(%r)' % str(self)
+
+
+def rope(s):
+    """returns the string s as a rope if it is at least MIN_LENGTH long,
+    else s itself (so appending to it is left to Python)"""
+    if len(s) >= MIN_LENGTH:
+        return Rope([s], len(s))
+    return s
+
+def string_params(param_types):
+    """returns the positions of the parameters of a built-in that take
+    strings (alone or among other types)"""
+    return tuple(i for i in range(len(param_types))
+                 if param_types[i] == token.STRINGTYPE or
+                 (isinstance(param_types[i], tuple) and
+                  token.STRINGTYPE in param_types[i]))
+
+def materialize(args, positions):
+    """replaces the ropes at positions of the list args by strings"""
+    for i in positions:
+        if i < len(args) and args[i].__class__ is Rope:
+            args[i] = str(args[i])
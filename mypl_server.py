@@ -0,0 +1,258 @@
+#!/usr/bin/python3
+#
+# Description:
+#   A long-lived process that runs MyPL programs for mypl_client.py, so
+#   a run skips starting Python, importing the toolchain and (for an
+#   unchanged file) lexing, parsing and compiling the program.
+#----------------------------------------------------------------------
+import execute
+import mypl_cache as cache
+import mypl_client
+import argparse
+import collections
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+
+# compiled programs kept by each worker, unless configured otherwise
+DEFAULT_PROGRAMS = 64
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# the longest request (a command line) a client sends
+MAX_REQUEST = 64 * 1024
+
+def exit_status(code):
+    """returns the exit status of a SystemExit with code, writing a
+    message code to stderr as Python would on exit"""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+def listen(path, backlog=64):
+    """returns a socket listening on the Unix socket path (which only its
+    owner may connect to), replacing the socket file of a server that
+    is gone"""
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+        else:
+            raise FileExistsError(0, 'a server is already listening')
+        finally:
+            probe.close()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o077)
+    try:
+        listener.bind(path)
+        listener.listen(backlog)
+    except OSError:
+        listener.close()
+        raise
+    finally:
+        os.umask(umask)
+    return listener
+
+def run(request, fds, programs):
+    """runs the execute.py command line of a request with stdin, stdout
+    and stderr on the file descriptors fds; returns the exit status"""
+    streams = (os.fdopen(fds[0], 'r'), os.fdopen(fds[1], 'w'),
+               os.fdopen(fds[2], 'w'))
+    saved = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin, sys.stdout, sys.stderr = streams
+    try:
+        os.chdir(request['cwd'])
+        execute.cli(request['argv'], programs, request.get('prog'))
+        status = 0
+    except SystemExit as e:
+        status = exit_status(e.code)
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved
+        for stream in streams:
+            try:
+                stream.close()
+            except OSError:
+                pass
+    return status
+
+def watch(conn):
+    """ends the process if the client on conn hangs up (it was stopped)
+    before the event returned is set; returns the event and the thread
+    waiting for the client"""
+    finished = threading.Event()
+    def wait():
+        try:
+            while conn.recv(1):
+                pass
+        except OSError:
+            pass
+        if not finished.is_set():
+            os._exit(1)
+    thread = threading.Thread(target=wait, daemon=True)
+    thread.start()
+    return finished, thread
+
+
+class ProgramCache(object):
+    """Compiled programs by path and back end, reused while the file
+    keeps its modification time and size. Once it holds size programs,
+    adding another evicts the least recently used one. Programs missing
+    from it are looked up in the on-disk cache (the_cache) first."""
+
+    def __init__(self, size=DEFAULT_PROGRAMS, the_cache=None):
+        self.size = size
+        self.the_cache = the_cache
+        # (path, backend) -> ((mtime, size), source, artifact)
+        self.programs = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, filename, backend):
+        """returns the source of the file filename and the program
+        compiled from it for backend"""
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        key = (path, backend)
+        entry = self.programs.get(key)
+        if entry is not None and entry[0] == stamp:
+            self.hits += 1
+            self.programs.move_to_end(key)
+            return entry[1], entry[2]
+        self.misses += 1
+        with open(path, 'r') as file_stream:
+            source = file_stream.read()
+        artifact = execute.compile_source(source, backend, self.the_cache)
+        self.programs[key] = (stamp, source, artifact)
+        self.programs.move_to_end(key)
+        if len(self.programs) > self.size:
+            self.programs.popitem(last=False)
+        return source, artifact
+
+
+class Server(object):
+    """Runs the programs mypl_client.py sends to the Unix socket path in
+    a pool of worker processes, forked once the toolchain is imported.
+    Each worker accepts one client at a time and runs its command line
+    as execute.py would, with the client's stdin, stdout and stderr
+    (passed over the socket), keeping the programs it compiled in a
+    ProgramCache. A worker whose client hangs up early (or that dies)
+    is replaced.
+    """
+
+    def __init__(self, path, workers=DEFAULT_WORKERS,
+                 size=DEFAULT_PROGRAMS):
+        self.path = path
+        self.workers = workers
+        self.programs = ProgramCache(size, cache.Cache())
+        self.listener = None
+        self.pids = set()       # the running workers
+
+    def listen(self):
+        self.listener = listen(self.path)
+
+    def serve_forever(self):
+        try:
+            for _ in range(self.workers):
+                self.__spawn()
+            while True:
+                pid, _ = os.wait()
+                if pid in self.pids:
+                    self.pids.discard(pid)
+                    self.__spawn()
+        finally:
+            for pid in self.pids:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            self.listener.close()
+            os.unlink(self.path)
+
+    def __spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                while True:
+                    conn, _ = self.listener.accept()
+                    with conn:
+                        self.__handle(conn)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        self.pids.add(pid)
+
+    def __handle(self, conn):
+        try:
+            message, fds, _, _ = socket.recv_fds(conn, MAX_REQUEST, 3)
+            while message and not message.endswith(b'\n'):
+                chunk = conn.recv(MAX_REQUEST)
+                if not chunk:
+                    break
+                message += chunk
+            request = json.loads(message)
+        except OSError:
+            return
+        except ValueError:
+            request = None
+        if not isinstance(request, dict) or len(fds) != 3:
+            for fd in fds:
+                os.close(fd)
+            return
+        finished, thread = watch(conn)
+        status = run(request, fds, self.programs)
+        finished.set()
+        try:
+            conn.sendall(b'%d\n' % status)
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        thread.join()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Run MyPL programs for mypl_client.py.')
+    arg_parser.add_argument('--socket', metavar='PATH',
+                            default=mypl_client.default_socket(),
+                            help='the Unix socket to listen on (default: '
+                            '$MYPL_SOCKET or %(default)s)')
+    arg_parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                            metavar='N', help='programs run at the same '
+                            'time (default: %(default)s)')
+    arg_parser.add_argument('--programs', type=int,
+                            default=DEFAULT_PROGRAMS, metavar='N',
+                            help='compiled programs kept by each worker '
+                            '(default: %(default)s)')
+    args = arg_parser.parse_args()
+    if args.workers < 1 or args.programs < 1:
+        arg_parser.error('--workers and --programs must be at least 1')
+    server = Server(args.socket, args.workers, args.programs)
+    try:
+        server.listen()
+    except OSError as e:
+        sys.exit('cannot listen on %s: %s' % (args.socket, e.strerror))
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print('listening on %s with %d workers' % (args.socket, args.workers),
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
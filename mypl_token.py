@@ -11,6 +11,8 @@ LESS_THAN_EQUAL = 'LESS_THAN_EQUAL'
 NOT_EQUAL = 'NOT_EQUAL'
 LPAREN = 'LPAREN'     
 RPAREN = 'RPAREN'           
+LBRACKET = 'LBRACKET'
+RBRACKET = 'RBRACKET'
 MINUS = 'MINUS'    
 MODULO = 'MODULO'
 MULTIPLY = 'MULTIPLY'
@@ -21,6 +23,9 @@ INTTYPE = 'INTTYPE'
 FLOATTYPE  = 'FLOATTYPE' 
 STRINGTYPE = 'STRINGTYPE'
 STRUCTTYPE = 'STRUCTTYPE'        
+INTARRAYTYPE = 'INTARRAYTYPE'       # int[] (made by the parser)
+FLOATARRAYTYPE = 'FLOATARRAYTYPE'   # float[]
+MAPTYPE = 'MAPTYPE'                 # map[key, value] (MapType)
 AND = 'AND'       
 OR = 'OR'
 NOT = 'NOT'     
@@ -54,4 +59,23 @@ class Token(object):
     def __str__(self):
         """returns a string to diplay elements of a token"""
         output = self.tokentype + " '" + self.lexeme + "' " + str(self.line) + ':' + str(self.column)
-        return output
\ No newline at end of file
+        return output
+
+    def __reduce__(self):
+        """pickles a token as its constructor arguments (much smaller
+        and faster to load than its attribute dict)"""
+        return (Token, (self.tokentype, self.lexeme, self.line, self.column))
+
+
+class MapType(Token):
+    """The type map[key_type, value_type], made by the parser from a map
+    keyword token and the two type tokens"""
+    def __init__(self, key_type, value_type, line, column):
+        lexeme = 'map[%s, %s]' % (key_type.lexeme, value_type.lexeme)
+        Token.__init__(self, MAPTYPE, lexeme, line, column)
+        self.key_type = key_type
+        self.value_type = value_type
+
+    def __reduce__(self):
+        return (MapType, (self.key_type, self.value_type, self.line,
+                          self.column))
\ No newline at end of file
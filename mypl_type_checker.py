@@ -10,15 +10,26 @@ import mypl_token as token
 import mypl_ast as ast
 import mypl_error as error
 import mypl_symbol_table as symbol_table
+import mypl_builtins as builtins
+import mypl_array
+
+# the type of a value of each declared type (as literals are typed)
+VALUE_TYPES = {token.INTTYPE: token.INTVAL, token.FLOATTYPE: token.FLOATVAL,
+               token.BOOLTYPE: token.BOOLVAL, token.STRINGTYPE: token.STRINGVAL}
 
 class TypeChecker(ast.Visitor):
     """A MyPL type checker visitor implementation where struct types
     take the form: type_id -> {v1:t1, ..., vn:tn} and function types
-    take the form: fun_id -> [[t1, t2, ..., tn,], return_type]
+    take the form: fun_id -> [[t1, t2, ..., tn,], return_type]. A map
+    type is the tuple (MAPTYPE, key type, value type).
     """
     
-    def __init__(self):# initialize the symbol table (for ids -> types)
+    def __init__(self, built_ins=None):# initialize the symbol table (for ids -> types)
         self.sym_table = symbol_table.SymbolTable()
+        self.built_ins = built_ins or builtins.default
+        # names of the functions declared (they replace most built-ins),
+        # collected from the program before it is checked
+        self.functions = None
         # current_type holds the type of the last expression type
         self.current_type = None
         # global env (for return)
@@ -26,29 +37,18 @@ class TypeChecker(ast.Visitor):
         # set global return type to int
         self.sym_table.add_id('return')
         self.sym_table.set_info('return', token.INTTYPE)
-        # load in built-in function types
-        self.sym_table.add_id('print')
-        self.sym_table.set_info('print', [[token.STRINGTYPE], token.NIL]) 
-        self.sym_table.add_id('length')
-        self.sym_table.set_info('length', [[token.STRINGTYPE], token.INTTYPE])
-        self.sym_table.add_id('reads')
-        self.sym_table.set_info('reads', [[], token.STRINGVAL])
-        self.sym_table.add_id('readi')
-        self.sym_table.set_info('readi', [[], token.INTVAL])
-        self.sym_table.add_id('readf')
-        self.sym_table.set_info('readf', [[], token.FLOATVAL])
-        self.sym_table.add_id('get')
-        self.sym_table.set_info('get', [[token.INTVAL, token.STRINGVAL], token.STRINGVAL])
-        self.sym_table.add_id('itos')
-        self.sym_table.set_info('itos', [[token.INTVAL], token.STRINGVAL])
-        self.sym_table.add_id('itof')
-        self.sym_table.set_info('itof', [[token.INTVAL], token.FLOATVAL])
-        self.sym_table.add_id('ftos')
-        self.sym_table.set_info('ftos', [[token.FLOATVAL], token.STRINGVAL])
-        self.sym_table.add_id('stoi')
-        self.sym_table.set_info('stoi', [[token.STRINGVAL], token.INTVAL])
-        self.sym_table.add_id('stof')
-        self.sym_table.set_info('stof', [[token.STRINGVAL], token.FLOATVAL])
+
+    def __add_built_ins(self):
+        """loads in the types of the built-in functions not replaced by
+        a declared one from the registry"""
+        for built_in in self.built_ins:
+            if self.built_ins.lookup(built_in.name, self.functions) is None:
+                continue
+            return_type = VALUE_TYPES.get(built_in.return_type,
+                                          built_in.return_type)
+            self.sym_table.add_id(built_in.name)
+            self.sym_table.set_info(built_in.name,
+                                    [list(built_in.param_types), return_type])
 
     def __error(self, msg, the_token):
         raise error.MyPLError(msg, the_token.line, the_token.column)
@@ -71,6 +71,14 @@ class TypeChecker(ast.Visitor):
         return False
 
     def visit_stmt_list(self, stmt_list):
+        if self.functions is None:
+            # the program: which built-ins its functions replace does
+            # not depend on where they are declared
+            self.functions = set()
+            for stmt in stmt_list.stmts:
+                if isinstance(stmt, ast.FunDeclStmt):
+                    self.functions.add(stmt.fun_name.lexeme)
+            self.__add_built_ins()
         # add new block (scope)
         self.sym_table.push_environment()
         for stmt in stmt_list.stmts:
@@ -81,11 +89,21 @@ class TypeChecker(ast.Visitor):
     def visit_expr_stmt(self, expr_stmt):
         expr_stmt.expr.accept(self)
 
+    def __declared_type(self, type_token):
+        """returns the type named by a type token"""
+        if(type_token.tokentype is token.ID):
+            return type_token.lexeme
+        if(type_token.tokentype == token.MAPTYPE):
+            return (token.MAPTYPE, self.__declared_type(type_token.key_type),
+                    self.__declared_type(type_token.value_type))
+        return type_token.tokentype
+
     def visit_var_decl_stmt(self, var_decl):
         self.sym_table.add_id(var_decl.var_id.lexeme)
         var_decl.var_expr.accept(self)
         if(var_decl.var_type != None):
-            if(not self.doTypesMatch(var_decl.var_type.tokentype)):
+            declared_type = self.__declared_type(var_decl.var_type)
+            if(not self.doTypesMatch(declared_type)):
                 if(var_decl.var_type.tokentype is token.ID):
                     if(self.sym_table.id_exists(var_decl.var_type.lexeme)):
                         if(var_decl.var_type.lexeme == self.current_type):
@@ -100,10 +118,7 @@ class TypeChecker(ast.Visitor):
                 else:
                     msg = 'mismatch type in assignment'
                     self.__error(msg, var_decl.var_id)
-            if(var_decl.var_type.tokentype is token.ID):
-                self.sym_table.set_info(var_decl.var_id.lexeme,var_decl.var_type.lexeme)
-            else:
-                self.sym_table.set_info(var_decl.var_id.lexeme, var_decl.var_type.tokentype)
+            self.sym_table.set_info(var_decl.var_id.lexeme, declared_type)
         elif(self.current_type is token.NIL):
             msg = 'Nil and no type defined'
             self.__error(msg, var_decl.var_id)
@@ -132,9 +147,7 @@ class TypeChecker(ast.Visitor):
         if(fun_decl.return_type is None):
             return_type = token.NIL
         else:
-            return_type = fun_decl.return_type
-            if(not return_type is str):
-                return_type = return_type.tokentype
+            return_type = self.__declared_type(fun_decl.return_type)
         self.sym_table.push_environment()
         self.sym_table.add_id('return')
         self.sym_table.set_info('return', return_type)
@@ -235,14 +248,48 @@ class TypeChecker(ast.Visitor):
                 msg = 'ID not declared'
                 self.__error(msg, i)
         self.current_type = self.sym_table.get_info(lval.path[-1].lexeme)
+        if(lval.index != None):
+            self.current_type = self.__element_type(self.current_type,
+                                                    lval.index, lval.path[0])
+
+    def __element_type(self, array_type, index, the_token):
+        """checks an array index and returns the array's element type"""
+        if(array_type not in mypl_array.ELEMENT_TYPES):
+            msg = 'index of a non-array'
+            self.__error(msg, the_token)
+        index.accept(self)
+        if(not self.doTypesMatch(token.INTTYPE)):
+            msg = 'mismatch type in array index'
+            self.__error(msg, the_token)
+        return mypl_array.ELEMENT_TYPES[array_type]
+
+    def __argument_types(self, param_type, first):
+        """returns the types a built-in parameter accepts, given the type
+        of the first argument (the last one is the type of a result)"""
+        if(param_type == builtins.ARGUMENT):
+            return (first,)
+        if(param_type == token.MAPTYPE):
+            return (first,) if self.__is_map(first) else (token.MAPTYPE,)
+        if(param_type == builtins.ELEMENT):
+            the_type = mypl_array.ELEMENT_TYPES.get(first)
+        elif(param_type == builtins.KEY and self.__is_map(first)):
+            the_type = first[1]
+        elif(param_type == builtins.VALUE and self.__is_map(first)):
+            the_type = first[2]
+        elif(isinstance(param_type, tuple)):
+            return param_type
+        else:
+            return (param_type,)
+        return (the_type, VALUE_TYPES.get(the_type, the_type))
+
+    def __is_map(self, the_type):
+        return isinstance(the_type, tuple) and the_type[0] == token.MAPTYPE
 
     def visit_fun_param(self, fun_param): 
         self.sym_table.add_id(fun_param.param_name.lexeme)
-        if(fun_param.param_type.tokentype is token.ID):
-            self.sym_table.set_info(fun_param.param_name.lexeme, fun_param.param_type.lexeme)
-        else:
-            self.sym_table.set_info(fun_param.param_name.lexeme, fun_param.param_type.tokentype)
-        self.current_type = fun_param.param_type.tokentype
+        param_type = self.__declared_type(fun_param.param_type)
+        self.sym_table.set_info(fun_param.param_name.lexeme, param_type)
+        self.current_type = param_type
 
     def visit_simple_rvalue(self, simple_rvalue):
         self.current_type = simple_rvalue.val.tokentype
@@ -252,19 +299,58 @@ class TypeChecker(ast.Visitor):
                 msg = 'Struct ID not declared'
                 self.__error(msg, new_rvalue)
         self.current_type = new_rvalue.struct_type.lexeme
+
+    def visit_new_map_rvalue(self, new_rvalue):
+        self.current_type = self.__declared_type(new_rvalue.map_type)
+
+    def visit_new_array_rvalue(self, new_rvalue):
+        new_rvalue.length.accept(self)
+        if(not self.doTypesMatch(token.INTTYPE)):
+            msg = 'mismatch type in array length'
+            self.__error(msg, new_rvalue.elem_type)
+        elem_type = new_rvalue.elem_type.tokentype
+        self.current_type = mypl_array.ARRAY_TYPES[elem_type]
         
     def visit_call_rvalue(self, call_rvalue):
         if(not self.sym_table.id_exists(call_rvalue.fun.lexeme)):
                 msg = 'ID not declared'
                 self.__error(msg, call_rvalue.fun)
-        for expr in call_rvalue.args:
+        built_in = self.built_ins.lookup(call_rvalue.fun.lexeme,
+                                         self.functions)
+        if built_in is not None and \
+           len(call_rvalue.args) != built_in.arity():
+            msg = 'wrong number of arguments to ' + built_in.name
+            self.__error(msg, call_rvalue.fun)
+        first = None
+        for i, expr in enumerate(call_rvalue.args):
             expr.accept(self)
-        info = self.sym_table.get_info(call_rvalue.fun.lexeme)
-        self.current_type = info[1]
+            if i == 0:
+                first = self.current_type
+            if built_in is None:
+                continue
+            types = self.__argument_types(built_in.param_types[i], first)
+            if not any(self.doTypesMatch(t) for t in types):
+                msg = 'mismatch type in argument to ' + built_in.name
+                self.__error(msg, call_rvalue.fun)
+        if built_in is None:
+            info = self.sym_table.get_info(call_rvalue.fun.lexeme)
+            self.current_type = info[1]
+        else:
+            self.current_type = VALUE_TYPES.get(built_in.return_type,
+                                                built_in.return_type)
+        if built_in is not None and \
+           built_in.return_type in (builtins.ELEMENT, builtins.ARGUMENT,
+                                    builtins.VALUE):
+            self.current_type = self.__argument_types(built_in.return_type,
+                                                      first)[-1]
 
     def visit_id_rvalue(self, id_rvalue):
         for i in id_rvalue.path:
             if(not self.sym_table.id_exists(i.lexeme)):
                 msg = 'ID not declared in id_rval'
                 self.__error(msg, i)
-        self.current_type = self.sym_table.get_info(id_rvalue.path[-1].lexeme)
\ No newline at end of file
+        self.current_type = self.sym_table.get_info(id_rvalue.path[-1].lexeme)
+        if(id_rvalue.index != None):
+            elem_type = self.__element_type(self.current_type,
+                                            id_rvalue.index, id_rvalue.path[0])
+            self.current_type = VALUE_TYPES[elem_type]
\ No newline at end of file
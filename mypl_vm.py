@@ -0,0 +1,301 @@
+import mypl_error as error
+import mypl_heap as heap
+import mypl_builtins as builtins
+import mypl_memo
+import mypl_rope
+import mypl_array
+import mypl_io
+from mypl_bytecode import *
+
+# calls (and struct initializers) that may be active at once
+DEFAULT_MAX_DEPTH = 100000
+
+class VM(object):
+    """A stack-based virtual machine for compiled MyPL programs.
+
+    Calls do not use the Python stack: the caller's code, program
+    counter and locals are saved on a call stack (a list), and all calls
+    share one operand stack. Recursion is limited by max_depth, not by
+    Python's recursion limit.
+
+    A memoized function's result is looked up before it is called, and
+    stored when the call returns.
+    """
+
+    def __init__(self, built_ins=None, output=None, input=None,
+                 max_depth=DEFAULT_MAX_DEPTH,
+                 memo_size=mypl_memo.DEFAULT_SIZE):
+        self.program = None
+        self.globals = []       # frame of the main program
+        self.heap = heap.Heap()
+        self.layouts = []       # StructLayout per compiled struct
+        self.built_ins = built_ins or builtins.default
+        self.linked = []        # BuiltIn (or None) per program built-in
+        self.output = output or mypl_io.Output()
+        self.input = input or mypl_io.Input()
+        self.max_depth = max_depth
+        self.memo_size = memo_size  # 0 turns memoizing off
+        self.memos = []
+
+    def run(self, program):
+        self.program = program
+        self.layouts = []
+        for struct_info in program.structs:
+            self.layouts.append(heap.StructLayout(struct_info.name,
+                                                  struct_info.fields))
+        # bind the program's built-ins once, before it runs
+        self.linked = []
+        for name in program.built_ins:
+            self.linked.append(self.built_ins.lookup(name))
+        self.memos = []
+        self.memo_of = []       # Memo (or None) per program function
+        for fun in program.functions:
+            memo = None
+            if fun.memoize and self.memo_size > 0:
+                memo = mypl_memo.Memo(fun.name, self.memo_size)
+                self.memos.append(memo)
+            self.memo_of.append(memo)
+        self.globals = [None] * program.main.nlocals
+        try:
+            self.__execute(program.main, self.globals)
+        finally:
+            self.output.flush()
+
+    def __error(self, msg, line, column):
+        raise error.MyPLError(msg, line, column)
+
+    def __execute(self, code, local_vars):
+        """runs code in the frame local_vars and returns its result"""
+        ops = code.ops
+        consts = code.consts
+        field_slots = code.field_slots
+        global_vars = self.globals
+        functions = self.program.functions
+        linked = self.linked
+        max_depth = self.max_depth
+        calls = []      # (code, pc, local_vars) of each suspended caller
+        memo_of = self.memo_of
+        memo_calls = [] # (local_vars, memo, key) of active memoized calls
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        while True:
+            op = ops[pc]
+            arg = ops[pc + 1]
+            pc += 2
+            if op == LOAD_LOCAL:
+                push(local_vars[arg])
+            elif op == LOAD_CONST:
+                push(consts[arg])
+            elif op == STORE_LOCAL:
+                local_vars[arg] = pop()
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == ADD:
+                rhs = pop()
+                lhs = stack[-1]
+                # appending to a long string builds a rope instead
+                if lhs.__class__ is str and len(lhs) >= mypl_rope.MIN_LENGTH:
+                    stack[-1] = mypl_rope.rope(lhs) + rhs
+                else:
+                    stack[-1] = lhs + rhs
+            elif op == SUB:
+                rhs = pop()
+                stack[-1] = stack[-1] - rhs
+            elif op == MUL:
+                rhs = pop()
+                stack[-1] = stack[-1] * rhs
+            elif op == DIV:
+                rhs = pop()
+                lhs = stack[-1]
+                if isinstance(lhs, int):
+                    stack[-1] = lhs // rhs
+                else:
+                    stack[-1] = lhs / rhs
+            elif op == MOD:
+                rhs = pop()
+                stack[-1] = stack[-1] % rhs
+            elif op == LT:
+                rhs = pop()
+                stack[-1] = stack[-1] < rhs
+            elif op == LE:
+                rhs = pop()
+                stack[-1] = stack[-1] <= rhs
+            elif op == GT:
+                rhs = pop()
+                stack[-1] = stack[-1] > rhs
+            elif op == GE:
+                rhs = pop()
+                stack[-1] = stack[-1] >= rhs
+            elif op == EQ:
+                rhs = pop()
+                stack[-1] = stack[-1] == rhs
+            elif op == NE:
+                rhs = pop()
+                stack[-1] = stack[-1] != rhs
+            elif op == JUMP_IF_FALSE_OR_POP:
+                if stack[-1]:
+                    pop()
+                else:
+                    pc = arg
+            elif op == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = arg
+                else:
+                    pop()
+            elif op == LOAD_GLOBAL:
+                push(global_vars[arg])
+            elif op == STORE_GLOBAL:
+                global_vars[arg] = pop()
+            elif op == LOAD_FIELD:
+                obj = stack[-1]
+                layout, index = field_slots[arg]
+                if obj is None or obj.layout is not layout:
+                    index = self.__field_slot(obj, code, pc, arg)
+                stack[-1] = obj.values[index]
+            elif op == STORE_FIELD:
+                obj = pop()
+                layout, index = field_slots[arg]
+                if obj is None or obj.layout is not layout:
+                    index = self.__field_slot(obj, code, pc, arg)
+                obj.values[index] = pop()
+            elif op == LOAD_INDEX:
+                index = pop()
+                try:
+                    stack[-1] = mypl_array.load(stack[-1], index)
+                except mypl_array.ArrayError as e:
+                    self.__array_error(e, code, pc)
+            elif op == STORE_INDEX:
+                index = pop()
+                array = pop()
+                try:
+                    mypl_array.store(array, index, pop())
+                except mypl_array.ArrayError as e:
+                    self.__array_error(e, code, pc)
+            elif op == CALL:
+                fun = functions[arg]
+                nparams = fun.nparams
+                if nparams:
+                    frame = stack[-nparams:]
+                    del stack[-nparams:]
+                else:
+                    frame = []
+                memo = memo_of[arg]
+                if memo is not None:
+                    args_key = mypl_memo.key(frame)
+                    value = memo.get(args_key)
+                    if value is not mypl_memo.MISSING:
+                        push(value)
+                        continue
+                    memo_calls.append((frame, memo, args_key))
+                if fun.nlocals > nparams:
+                    frame.extend([None] * (fun.nlocals - nparams))
+                if len(calls) >= max_depth:
+                    self.__overflow(code, pc)
+                calls.append((code, pc, local_vars))
+                code = fun
+                ops = code.ops
+                consts = code.consts
+                field_slots = code.field_slots
+                local_vars = frame
+                pc = 0
+            elif op == RETURN:
+                # the result stays on the stack for the caller
+                if not calls:
+                    return pop()
+                if memo_calls and memo_calls[-1][0] is local_vars:
+                    frame, memo, args_key = memo_calls.pop()
+                    memo.put(args_key, stack[-1])
+                code, pc, local_vars = calls.pop()
+                ops = code.ops
+                consts = code.consts
+                field_slots = code.field_slots
+            elif op == POP:
+                pop()
+            elif op == CALL_BUILTIN:
+                index, argc, line, column = consts[arg]
+                built_in = linked[index]
+                if argc:
+                    args = stack[-argc:]
+                    del stack[-argc:]
+                else:
+                    args = []
+                if built_in is None:
+                    name = self.program.built_ins[index]
+                    self.__error('undeclared function "%s"' % name, line,
+                                 column)
+                if built_in.check_nil and None in args:
+                    self.__error('NIL value found in argument', line, column)
+                if built_in.string_params:
+                    mypl_rope.materialize(args, built_in.string_params)
+                try:
+                    if built_in.runtime:
+                        push(built_in.function(self, *args))
+                    else:
+                        push(built_in.function(*args))
+                except builtins.BuiltInError as e:
+                    self.__error(str(e), line, column)
+            elif op == NOT:
+                stack[-1] = not stack[-1]
+            elif op == NEW:
+                struct = self.program.structs[arg]
+                if struct.init is None:
+                    # every field starts as in the prototype
+                    push(self.heap.allocate(self.layouts[arg],
+                                            struct.prototype[:]))
+                    continue
+                # the initializer runs like a call
+                if len(calls) >= max_depth:
+                    self.__overflow(code, pc)
+                calls.append((code, pc, local_vars))
+                code = struct.init
+                ops = code.ops
+                consts = code.consts
+                field_slots = code.field_slots
+                local_vars = [None] * code.nlocals
+                pc = 0
+            elif op == MAKE_STRUCT:
+                # the computed fields replace those of the prototype
+                struct = self.program.structs[arg]
+                values = struct.prototype[:]
+                computed = struct.computed
+                ncomputed = len(computed)
+                for i in range(ncomputed):
+                    values[computed[i]] = stack[i - ncomputed]
+                del stack[-ncomputed:]
+                push(self.heap.allocate(self.layouts[arg], values))
+            elif op == NEW_MAP:
+                push({})
+            elif op == NEW_ARRAY:
+                try:
+                    stack[-1] = mypl_array.new(ARRAY_ELEMENT_TYPES[arg],
+                                               stack[-1])
+                except mypl_array.ArrayError as e:
+                    self.__array_error(e, code, pc)
+
+    def __overflow(self, code, pc):
+        line, column = code.position(pc - 2)
+        self.__error('call stack overflow (more than %d nested calls)' %
+                     self.max_depth, line, column)
+
+    def __array_error(self, e, code, pc):
+        line, column = code.position(pc - 2)
+        self.__error(str(e), line, column)
+
+    def __field_slot(self, obj, code, pc, name_index):
+        """looks up the slot of a field when the cached slot is for a
+        different struct layout (or not cached yet)"""
+        line, column = code.position(pc - 2)
+        if obj is None:
+            self.__error('nil reference in path expression', line, column)
+        name = code.names[name_index]
+        if name not in obj.layout.index:
+            msg = 'struct %s has no field %s' % (obj.layout.name, name)
+            self.__error(msg, line, column)
+        index = obj.layout.index[name]
+        code.field_slots[name_index] = (obj.layout, index)
+        return index